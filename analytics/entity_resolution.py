@@ -0,0 +1,118 @@
+# analytics/entity_resolution.py
+from collections import defaultdict
+import numpy as np
+from rapidfuzz import fuzz, process
+from db import SessionLocal
+from api.models import Workflow
+
+THRESHOLD = 88
+# tokens carried by more than this share of rows ("n8n", "tutorial"...) do not form blocks
+MAX_TOKEN_SHARE = 0.05
+# blocks larger than this are skipped: they are too generic to mean "same workflow"
+MAX_BLOCK_SIZE = 2000
+MIN_TOKEN_LEN = 3
+
+def _tokens(name):
+    return {t for t in (name or "").split() if len(t) >= MIN_TOKEN_LEN}
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        parent.setdefault(x, x)
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # smallest id wins so canonical ids stay stable as clusters grow
+            if rb < ra:
+                ra, rb = rb, ra
+            self.parent[rb] = ra
+
+def build_blocks(names):
+    """Inverted index token -> row positions, keeping only selective tokens."""
+    index = defaultdict(list)
+    for pos, name in enumerate(names):
+        for tok in _tokens(name):
+            index[tok].append(pos)
+    max_df = max(2, int(len(names) * MAX_TOKEN_SHARE))
+    return {tok: np.asarray(rows) for tok, rows in index.items()
+            if 1 < len(rows) <= min(max_df, MAX_BLOCK_SIZE)}
+
+def match_pairs(names, blocks, query_mask=None, threshold=THRESHOLD, workers=-1):
+    """
+    Score candidates block by block with process.cdist (vectorized, all cores) and
+    yield (pos_a, pos_b) pairs at or above `threshold`. With query_mask only rows
+    flagged True are scored against their blocks (incremental mode).
+    """
+    for rows in blocks.values():
+        queries = rows if query_mask is None else rows[query_mask[rows]]
+        if len(queries) == 0:
+            continue
+        scores = process.cdist([names[i] for i in queries], [names[i] for i in rows],
+                               scorer=fuzz.token_sort_ratio, score_cutoff=threshold,
+                               dtype=np.uint8, workers=workers)
+        qi, ci = np.nonzero(scores)
+        for a, b in zip(queries[qi], rows[ci]):
+            # full mode scores the block against itself: report each pair once
+            if a < b or (query_mask is not None and a != b):
+                yield int(a), int(b)
+
+def resolve_entities(incremental=True, threshold=THRESHOLD):
+    """
+    Link Workflow rows that describe the same workflow across YouTube / Forum / Google
+    by writing a shared canonical_id (the smallest member id). In incremental mode only
+    rows without a canonical_id yet are matched against the index of all rows.
+    Returns the number of rows whose canonical_id changed.
+    """
+    session = SessionLocal()
+    try:
+        rows = session.query(Workflow.id, Workflow.normalized_name, Workflow.canonical_id).all()
+        if not rows:
+            return 0
+        ids = np.fromiter((r.id for r in rows), dtype=np.int64, count=len(rows))
+        names = [r.normalized_name or "" for r in rows]
+        current = {r.id: r.canonical_id for r in rows}
+        query_mask = None
+        if incremental:
+            query_mask = np.fromiter((r.canonical_id is None for r in rows), dtype=bool, count=len(rows))
+            if not query_mask.any():
+                return 0
+
+        uf = _UnionFind()
+        if incremental:
+            # keep existing clusters together; a full run rebuilds them from scratch
+            for wid, cid in current.items():
+                if cid is not None and cid != wid:
+                    uf.union(wid, cid)
+        blocks = build_blocks(names)
+        pairs = 0
+        for a, b in match_pairs(names, blocks, query_mask=query_mask, threshold=threshold):
+            uf.union(int(ids[a]), int(ids[b]))
+            pairs += 1
+
+        updates = []
+        for wid, cid in current.items():
+            canonical = uf.find(wid)
+            if canonical != cid:
+                updates.append({"id": wid, "canonical_id": canonical})
+        for i in range(0, len(updates), 5000):
+            session.bulk_update_mappings(Workflow, updates[i:i + 5000])
+        session.commit()
+        print(f"[entity resolution] {len(rows)} rows, {len(blocks)} blocks, {pairs} matched pairs, "
+              f"{len(updates)} canonical ids updated.")
+        return len(updates)
+    except Exception as e:
+        session.rollback()
+        print("Error in resolve_entities:", repr(e))
+        raise
+    finally:
+        session.close()
@@ -0,0 +1,131 @@
+# analytics/history.py
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func, case, literal
+from sqlalchemy.dialects.mysql import insert
+from db import engine
+from api.models import Workflow, WorkflowSnapshot, WorkflowRollup
+
+HISTORY_METRICS = ("views", "likes", "comments", "replies")
+
+def _utc_today():
+    return datetime.now(timezone.utc).date()
+
+def _merge_max(stmt, table):
+    return {c: func.greatest(getattr(table, c), getattr(stmt.inserted, c)) for c in HISTORY_METRICS}
+
+def record_snapshots(conn, rows, ts=None):
+    """
+    Append one snapshot per written row and fold it into today's daily rollup.
+    Called inside the collector upsert transaction with the merged workflow rows.
+    """
+    if not rows:
+        return 0
+    ts = int(ts or time.time())
+    day = datetime.fromtimestamp(ts, tz=timezone.utc).date()
+    snaps = [{"workflow_id": r.id, "ts": ts, "views": int(r.views or 0), "likes": int(r.likes or 0),
+              "comments": int(r.comments or 0), "replies": int(r.replies or 0)} for r in rows]
+    stmt = insert(WorkflowSnapshot).values(snaps)
+    conn.execute(stmt.on_duplicate_key_update(**_merge_max(stmt, WorkflowSnapshot)))
+    stmt = insert(WorkflowRollup).values(
+        [dict({k: v for k, v in s.items() if k != "ts"}, granularity="day", bucket=day) for s in snaps])
+    conn.execute(stmt.on_duplicate_key_update(**_merge_max(stmt, WorkflowRollup)))
+    return len(snaps)
+
+def merge_history(conn, dup_id, keep_id):
+    """
+    Move the snapshots and rollups of a row merged away (rekey_workflows) onto the
+    row it was folded into; where both have the same ts / bucket, metrics take the max.
+    """
+    for table, keys in ((WorkflowSnapshot, ("ts",)), (WorkflowRollup, ("granularity", "bucket"))):
+        cols = keys + HISTORY_METRICS
+        # the source is aliased so the UPDATE clause's columns can only mean the target row
+        src = table.__table__.alias("src")
+        stmt = insert(table).from_select(
+            ("workflow_id",) + cols,
+            select(literal(keep_id), *[src.c[c] for c in cols]).where(src.c.workflow_id == dup_id))
+        conn.execute(stmt.on_duplicate_key_update(**_merge_max(stmt, table)))
+        conn.execute(table.__table__.delete().where(table.workflow_id == dup_id))
+
+def compact_history(raw_retention_days=14, daily_retention_days=180, chunk=50000):
+    """
+    Downsample old history: raw snapshots older than raw_retention_days are dropped
+    (their daily rollups already exist), and daily rollups older than
+    daily_retention_days are folded into weekly rollups and dropped.
+    """
+    cutoff_ts = int(time.time()) - raw_retention_days * 86400
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            n = conn.execute(WorkflowSnapshot.__table__.delete()
+                             .where(WorkflowSnapshot.ts < cutoff_ts).with_dialect_options(mysql_limit=chunk)).rowcount
+        deleted += n
+        if n < chunk:
+            break
+
+    cutoff_day = _utc_today() - timedelta(days=daily_retention_days)
+    week = func.subdate(WorkflowRollup.bucket, func.weekday(WorkflowRollup.bucket))
+    with engine.begin() as conn:
+        weekly = select(literal("week"), week, WorkflowRollup.workflow_id,
+                        *[func.max(getattr(WorkflowRollup, c)) for c in HISTORY_METRICS]) \
+            .where(WorkflowRollup.granularity == "day", WorkflowRollup.bucket < cutoff_day) \
+            .group_by(week, WorkflowRollup.workflow_id).subquery("w")
+        # select from a derived table so the UPDATE clause only sees the target table's columns
+        stmt = insert(WorkflowRollup).from_select(["granularity", "bucket", "workflow_id", *HISTORY_METRICS],
+                                                  select(weekly))
+        conn.execute(stmt.on_duplicate_key_update(**_merge_max(stmt, WorkflowRollup)))
+        folded = conn.execute(WorkflowRollup.__table__.delete().where(
+            WorkflowRollup.granularity == "day", WorkflowRollup.bucket < cutoff_day)).rowcount
+    print(f"[history] dropped {deleted} raw snapshots, folded {folded} daily rollups into weeks.")
+    return deleted, folded
+
+def trending(window_days=7, platform=None, country=None, limit=50):
+    """
+    Rank workflows by views gained per day over the window, straight from the daily
+    rollups. Acceleration compares the views/day of the second half of the window
+    with the first half (positive = climbing faster).
+    """
+    today = _utc_today()
+    start = today - timedelta(days=window_days)
+    mid = today - timedelta(days=window_days // 2)
+    r = WorkflowRollup
+    days = func.greatest(1, func.datediff(func.max(r.bucket), func.min(r.bucket)))
+    gained = func.max(r.views) - func.min(r.views)
+    velocity = (gained / days).label("views_per_day")
+    q = select(
+        r.workflow_id, Workflow.workflow_name, Workflow.platform, Workflow.country, Workflow.source_url,
+        func.min(r.bucket).label("first_day"), func.max(r.bucket).label("last_day"),
+        func.min(r.views).label("views_start"), func.max(r.views).label("views_end"),
+        func.max(case((r.bucket < mid, r.views))).label("views_mid"),
+        func.max(case((r.bucket < mid, r.bucket))).label("mid_day"),
+        velocity,
+    ).join(Workflow, Workflow.id == r.workflow_id) \
+        .where(r.granularity == "day", r.bucket >= start) \
+        .group_by(r.workflow_id, Workflow.workflow_name, Workflow.platform, Workflow.country, Workflow.source_url) \
+        .having(func.count() >= 2) \
+        .order_by(velocity.desc()).limit(limit)
+    if platform:
+        q = q.where(Workflow.platform == platform)
+    if country:
+        q = q.where(Workflow.country == country)
+    with engine.connect() as conn:
+        rows = conn.execute(q).all()
+
+    res = []
+    for row in rows:
+        acceleration = 0.0
+        if row.views_mid is not None and row.mid_day is not None:
+            early_days = max(1, (row.mid_day - row.first_day).days)
+            late_days = max(1, (row.last_day - row.mid_day).days)
+            acceleration = (row.views_end - row.views_mid) / late_days - (row.views_mid - row.views_start) / early_days
+        res.append({
+            "workflow_id": row.workflow_id,
+            "workflow": row.workflow_name,
+            "platform": row.platform,
+            "country": row.country,
+            "source_url": row.source_url,
+            "views_gained": int(row.views_end - row.views_start),
+            "views_per_day": float(row.views_per_day or 0),
+            "acceleration": float(acceleration),
+        })
+    return res
@@ -0,0 +1,130 @@
+# analytics/rankings.py
+import math
+from sqlalchemy import select, func
+from sqlalchemy.dialects.mysql import insert
+from db import engine
+from api.models import Workflow, WorkflowRanking, PlatformScoreStats
+from api.cache import bump_data_version
+
+# How much each component counts per platform. Google only has a trends index in `views`.
+WEIGHTS = {
+    "YouTube": {"reach": 0.6, "engagement": 0.3, "discussion": 0.1},
+    "Forum": {"reach": 0.5, "engagement": 0.2, "discussion": 0.3},
+    "Google": {"reach": 1.0, "engagement": 0.0, "discussion": 0.0},
+}
+# (likes + comments) / views at which the engagement component saturates
+ENGAGEMENT_REF = 0.05
+
+ROW_COLUMNS = (Workflow.id, Workflow.platform, Workflow.country, Workflow.workflow_name, Workflow.source_url,
+               Workflow.views, Workflow.likes, Workflow.comments, Workflow.replies, Workflow.contributors)
+
+def _components(row):
+    views = int(row.views or 0)
+    likes, comments, replies = int(row.likes or 0), int(row.comments or 0), int(row.replies or 0)
+    engagement = (likes + comments) / views if views else 0.0
+    return math.log1p(views), min(1.0, engagement / ENGAGEMENT_REF), math.log1p(comments + replies + int(row.contributors or 0))
+
+def score_row(row, stats):
+    """Composite 0..1 score, normalized within the row's platform so platforms are comparable."""
+    weights = WEIGHTS.get(row.platform, WEIGHTS["YouTube"])
+    max_views, max_disc = stats.get(row.platform, (0.0, 0.0))
+    reach, engagement, discussion = _components(row)
+    return (weights["reach"] * (reach / max_views if max_views else 0.0)
+            + weights["engagement"] * engagement
+            + weights["discussion"] * (discussion / max_disc if max_disc else 0.0))
+
+def _load_stats(conn, lock=False):
+    q = select(PlatformScoreStats)
+    rows = conn.execute(q.with_for_update(read=True) if lock else q).all()
+    return {r.platform: (r.max_log_views, r.max_log_discussion) for r in rows}
+
+def _write(conn, rows, stats):
+    values = [{
+        "workflow_id": r.id, "platform": r.platform, "country": r.country,
+        "workflow_name": r.workflow_name, "source_url": r.source_url,
+        "views": int(r.views or 0), "likes": int(r.likes or 0),
+        "comments": int(r.comments or 0), "replies": int(r.replies or 0),
+        "score": score_row(r, stats),
+    } for r in rows]
+    if not values:
+        return 0
+    stmt = insert(WorkflowRanking).values(values)
+    new = stmt.inserted
+    conn.execute(stmt.on_duplicate_key_update(
+        platform=new.platform, country=new.country, workflow_name=new.workflow_name, source_url=new.source_url,
+        views=new.views, likes=new.likes, comments=new.comments, replies=new.replies, score=new.score,
+        updated_at=func.now()))
+    return len(values)
+
+def _rescore_platform(conn, platform, stats, batch_size=5000):
+    """Rescore every workflow of one platform against its current scale."""
+    total = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(select(*ROW_COLUMNS).where(Workflow.platform == platform, Workflow.id > last_id)
+                            .order_by(Workflow.id).limit(batch_size)).all()
+        if not rows:
+            return total
+        total += _write(conn, rows, stats)
+        last_id = rows[-1].id
+
+def refresh_rows(conn, rows):
+    """
+    Incremental refresh for rows a collector just wrote (called inside the upsert
+    transaction). When a row raises its platform's scale, the whole platform is
+    rescored in the same transaction, so no score stays computed against an older,
+    smaller scale. The scale rows are read with a shared lock: a concurrent writer
+    waits for a growing one to commit and then scores against the new scale.
+    rebuild_rankings re-bases scales from scratch (they only ever grow here).
+    """
+    if not rows:
+        return 0
+    stats = _load_stats(conn, lock=True)
+    grown = {}
+    for r in rows:
+        reach, _, discussion = _components(r)
+        cur = grown.get(r.platform) or stats.get(r.platform, (0.0, 0.0))
+        if reach > cur[0] or discussion > cur[1]:
+            grown[r.platform] = (max(reach, cur[0]), max(discussion, cur[1]))
+    if grown:
+        stmt = insert(PlatformScoreStats).values(
+            [{"platform": p, "max_log_views": v, "max_log_discussion": d} for p, (v, d) in grown.items()])
+        conn.execute(stmt.on_duplicate_key_update(
+            max_log_views=func.greatest(PlatformScoreStats.max_log_views, stmt.inserted.max_log_views),
+            max_log_discussion=func.greatest(PlatformScoreStats.max_log_discussion, stmt.inserted.max_log_discussion)))
+        stats.update(grown)
+    total = sum(_rescore_platform(conn, p, stats) for p in grown)
+    return total + _write(conn, [r for r in rows if r.platform not in grown], stats)
+
+def rebuild_rankings(batch_size=5000):
+    """Recompute platform scales from scratch and rescore every workflow."""
+    with engine.begin() as conn:
+        conn.execute(PlatformScoreStats.__table__.delete())
+        agg = conn.execute(select(
+            Workflow.platform,
+            func.max(func.ln(1 + func.coalesce(Workflow.views, 0))),
+            func.max(func.ln(1 + func.coalesce(Workflow.comments, 0) + func.coalesce(Workflow.replies, 0)
+                             + func.coalesce(Workflow.contributors, 0))),
+        ).group_by(Workflow.platform)).all()
+        if agg:
+            conn.execute(insert(PlatformScoreStats).values(
+                [{"platform": p, "max_log_views": float(v or 0), "max_log_discussion": float(d or 0)} for p, v, d in agg]))
+        stats = _load_stats(conn)
+    total = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select(*ROW_COLUMNS).where(Workflow.id > last_id)
+                                .order_by(Workflow.id).limit(batch_size)).all()
+            if not rows:
+                break
+            total += _write(conn, rows, stats)
+        last_id = rows[-1].id
+    with engine.begin() as conn:
+        # drop rankings whose workflow row no longer exists
+        conn.execute(WorkflowRanking.__table__.delete().where(
+            ~WorkflowRanking.workflow_id.in_(select(Workflow.id))))
+        # readers keyed on the data version (the /search index) pick up the new scores
+        bump_data_version(conn)
+    print(f"[rankings] rescored {total} workflows.")
+    return total
@@ -0,0 +1,86 @@
+# analytics/refresh_planner.py
+import heapq
+import math
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func, literal_column
+from db import engine
+from api.models import Workflow, WorkflowRollup
+from collectors.sync_state import load_state, save_state
+
+# evidence key holding the id the source API needs to refetch a row
+SOURCE_ID_KEYS = {"Forum": "$.topic_id", "YouTube": "$.video_id"}
+GROWTH_WINDOW_DAYS = 7
+GROWTH_WEIGHT = 1.0
+POPULARITY_WEIGHT = 0.25
+
+def priority(hours_stale, views_per_day, views):
+    """
+    Expected value of refetching a row: how long it has gone unrefreshed, boosted by
+    how fast it has been growing and by how popular it already is. Dead, unpopular
+    rows still age upwards so every row is eventually revisited.
+    """
+    return (hours_stale
+            * (1.0 + GROWTH_WEIGHT * math.log1p(max(views_per_day, 0.0)))
+            * (1.0 + POPULARITY_WEIGHT * math.log1p(max(views, 0))))
+
+def plan_refresh(platform, max_items, exclude=()):
+    """
+    Score every known Workflow of `platform` and return up to `max_items` refetch targets,
+    best first: [{"source_id", "countries", "priority", "hours_stale"}]. Rows sharing a
+    source id (the same video in several regions) are merged into one target.
+    """
+    start = datetime.now(timezone.utc).date() - timedelta(days=GROWTH_WINDOW_DAYS)
+    r = WorkflowRollup
+    growth = select(
+        r.workflow_id,
+        ((func.max(r.views) - func.min(r.views))
+         / func.greatest(1, func.datediff(func.max(r.bucket), func.min(r.bucket)))).label("views_per_day"),
+    ).where(r.granularity == "day", r.bucket >= start).group_by(r.workflow_id).subquery()
+    source_id = func.json_unquote(func.json_extract(Workflow.evidence, SOURCE_ID_KEYS[platform]))
+    q = select(
+        source_id.label("source_id"), Workflow.country, Workflow.views,
+        func.timestampdiff(literal_column("SECOND"), Workflow.updated_at, func.now()).label("age_seconds"),
+        func.coalesce(growth.c.views_per_day, 0).label("views_per_day"),
+    ).outerjoin(growth, growth.c.workflow_id == Workflow.id).where(Workflow.platform == platform)
+
+    targets = {}
+    exclude = {str(x) for x in exclude}
+    with engine.connect() as conn:
+        for row in conn.execute(q):
+            sid = row.source_id
+            if not sid or sid == "null" or sid in exclude:
+                continue
+            hours = max(float(row.age_seconds or 0), 0.0) / 3600.0
+            p = priority(hours, float(row.views_per_day or 0), int(row.views or 0))
+            t = targets.get(sid)
+            if t is None:
+                targets[sid] = {"source_id": sid, "countries": {row.country}, "priority": p, "hours_stale": hours}
+            else:
+                t["countries"].add(row.country)
+                if p > t["priority"]:
+                    t["priority"], t["hours_stale"] = p, hours
+    return heapq.nlargest(max_items, targets.values(), key=lambda t: t["priority"])
+
+def record_refresh(platform, refreshed, requests_spent):
+    """
+    Track how much staleness each request bought back: the hours-since-update of the
+    rows we refreshed, summed, per request spent. Kept per platform in collector_state.
+    """
+    key = f"refresh:{platform}"
+    state = load_state(key)
+    hours = sum(t["hours_stale"] for t in refreshed)
+    state["runs"] = state.get("runs", 0) + 1
+    state["requests"] = state.get("requests", 0) + requests_spent
+    state["items"] = state.get("items", 0) + len(refreshed)
+    state["stale_hours_recovered"] = state.get("stale_hours_recovered", 0.0) + hours
+    state["last"] = {
+        "at": datetime.now(timezone.utc).isoformat(),
+        "requests": requests_spent,
+        "items": len(refreshed),
+        "stale_hours_per_request": hours / requests_spent if requests_spent else 0.0,
+    }
+    save_state(key, state)
+    print(f"[refresh {platform}] {len(refreshed)} items for {requests_spent} requests, "
+          f"{state['last']['stale_hours_per_request']:.1f} stale hours recovered per request "
+          f"(lifetime {state['stale_hours_recovered'] / max(state['requests'], 1):.1f}).")
+    return state
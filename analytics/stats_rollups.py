@@ -0,0 +1,243 @@
+# analytics/stats_rollups.py
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func
+from sqlalchemy.dialects.mysql import insert
+from db import engine
+from api.models import Workflow, StatsRollup, StatsTotal, StatsSketch
+
+DELTA_METRICS = ("views", "likes", "comments", "replies", "contributors")
+SKETCH_METRICS = ("views", "like_ratio")
+QUANTILES = (0.5, 0.9, 0.99)
+
+# sketch quantiles are within SKETCH_ALPHA (relative) of a value of the distribution
+SKETCH_ALPHA = 0.02
+_GAMMA = (1 + SKETCH_ALPHA) / (1 - SKETCH_ALPHA)
+_LOG_GAMMA = math.log(_GAMMA)
+# 0 views / 0 likes share one bucket that reads back as 0
+ZERO_BUCKET = -2 ** 31
+_MIN_VALUE = 1e-9
+
+BEFORE_COLUMNS = (Workflow.id, Workflow.platform, Workflow.country, Workflow.normalized_name,
+                  *[getattr(Workflow, c) for c in DELTA_METRICS])
+
+def sketch_bucket(x):
+    return ZERO_BUCKET if x <= _MIN_VALUE else math.ceil(math.log(x) / _LOG_GAMMA)
+
+def bucket_value(b):
+    return 0.0 if b == ZERO_BUCKET else 2 * _GAMMA ** b / (_GAMMA + 1)
+
+def sketch_quantiles(buckets, qs=QUANTILES):
+    """Quantiles of a (merged) sketch {bucket: count}; None for an empty sketch."""
+    items = sorted((b, c) for b, c in buckets.items() if c > 0)
+    n = sum(c for _, c in items)
+    out = dict.fromkeys(qs)
+    if not n:
+        return out
+    for q in qs:
+        rank, seen = q * (n - 1), 0
+        for b, c in items:
+            seen += c
+            if seen > rank:
+                out[q] = bucket_value(b)
+                break
+    return out
+
+def _values(m):
+    views, likes = m["views"], m["likes"]
+    return {"views": views, "like_ratio": likes / views if views else 0.0}
+
+def _metrics(row):
+    return {c: int(getattr(row, c) or 0) for c in DELTA_METRICS}
+
+def _add(stmt, table, columns):
+    return {c: getattr(table, c) + getattr(stmt.inserted, c) for c in columns}
+
+def rows_before(conn, records):
+    """
+    Current metrics ({id: row}) of the rows a batch is about to write. Read inside
+    the upsert transaction *before* the INSERT, as a locking read, so no other writer
+    can move these rows between this read and the commit. The transaction runs at
+    READ COMMITTED: only the rows found are locked, never the gaps of the keys that
+    are not there yet (collectors.bulk_upsert inserts those without merging).
+    """
+    keys = sorted({r["name_key"] for r in records})
+    rows = conn.execute(select(*BEFORE_COLUMNS).where(Workflow.name_key.in_(keys)).with_for_update()).all()
+    return {r.id: r for r in rows}
+
+def apply_deltas(conn, before, rows, day=None):
+    """
+    Fold what each written row changed (rows_before -> merged row) into the UTC day's
+    stats_rollups row, the running stats_totals and the sketches of its platform x
+    country. Called inside the collector upsert transaction. Returns the rows that changed.
+    """
+    day = day or datetime.now(timezone.utc).date()
+    segments = {}
+    sketch = defaultdict(int)
+    changed = 0
+    for r in rows:
+        new = _metrics(r)
+        old = before.get(r.id)
+        old = _metrics(old) if old is not None else None
+        if old == new:
+            continue
+        changed += 1
+        seg = segments.get((r.platform, r.country))
+        if seg is None:
+            seg = segments[(r.platform, r.country)] = dict.fromkeys(
+                ("workflows_added", "rows_changed", "like_ratio_sum") + DELTA_METRICS, 0)
+        seg["rows_changed"] += 1
+        new_v = _values(new)
+        if old is None:
+            seg["workflows_added"] += 1
+            old, old_v = dict.fromkeys(DELTA_METRICS, 0), None
+        else:
+            old_v = _values(old)
+        for c in DELTA_METRICS:
+            seg[c] += new[c] - old[c]
+        seg["like_ratio_sum"] += new_v["like_ratio"] - (old_v["like_ratio"] if old_v else 0.0)
+        for m in SKETCH_METRICS:
+            b = sketch_bucket(new_v[m])
+            if old_v is not None:
+                ob = sketch_bucket(old_v[m])
+                if ob == b:
+                    continue
+                sketch[(r.platform, r.country, m, ob)] -= 1
+            sketch[(r.platform, r.country, m, b)] += 1
+    if not segments:
+        return 0
+    _write_deltas(conn, day, segments, sketch)
+    return changed
+
+def _write_deltas(conn, day, segments, sketch):
+    # every statement writes its rows in key order so concurrent batches lock in the same order
+    keys = sorted(segments)
+    rollup_columns = ("workflows_added", "rows_changed") + DELTA_METRICS
+    stmt = insert(StatsRollup).values([dict({c: segments[k][c] for c in rollup_columns},
+                                            day=day, platform=k[0], country=k[1]) for k in keys])
+    conn.execute(stmt.on_duplicate_key_update(**_add(stmt, StatsRollup, rollup_columns)))
+
+    total_columns = ("workflows", "like_ratio_sum") + DELTA_METRICS
+    stmt = insert(StatsTotal).values([dict({c: segments[k][c] for c in DELTA_METRICS + ("like_ratio_sum",)},
+                                           workflows=segments[k]["workflows_added"], platform=k[0], country=k[1])
+                                      for k in keys])
+    conn.execute(stmt.on_duplicate_key_update(**_add(stmt, StatsTotal, total_columns), updated_at=func.now()))
+
+    buckets = [{"platform": p, "country": c, "metric": m, "bucket": b, "count": n}
+               for (p, c, m, b), n in sorted(sketch.items()) if n]
+    if buckets:
+        stmt = insert(StatsSketch).values(buckets)
+        conn.execute(stmt.on_duplicate_key_update(count=StatsSketch.count + stmt.inserted.count))
+
+def rebuild_stats(batch_size=5000):
+    """
+    Recompute stats_totals and the sketches from workflows (after a rekey merge, or to
+    fill them for existing data). Daily rollups are kept: past days cannot be recovered.
+    Run it while collectors are stopped; their deltas would be lost in the swap.
+    """
+    totals = {}
+    sketch = defaultdict(int)
+    last_id = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(select(Workflow.id, Workflow.platform, Workflow.country,
+                                       *[getattr(Workflow, c) for c in DELTA_METRICS])
+                                .where(Workflow.id > last_id).order_by(Workflow.id).limit(batch_size)).all()
+        if not rows:
+            break
+        for r in rows:
+            m = _metrics(r)
+            v = _values(m)
+            t = totals.get((r.platform, r.country))
+            if t is None:
+                t = totals[(r.platform, r.country)] = dict.fromkeys(("workflows", "like_ratio_sum") + DELTA_METRICS, 0)
+            t["workflows"] += 1
+            t["like_ratio_sum"] += v["like_ratio"]
+            for c in DELTA_METRICS:
+                t[c] += m[c]
+            for name in SKETCH_METRICS:
+                sketch[(r.platform, r.country, name, sketch_bucket(v[name]))] += 1
+        last_id = rows[-1].id
+    with engine.begin() as conn:
+        conn.execute(StatsTotal.__table__.delete())
+        conn.execute(StatsSketch.__table__.delete())
+        if totals:
+            conn.execute(insert(StatsTotal).values(
+                [dict(t, platform=p, country=c) for (p, c), t in sorted(totals.items())]))
+        values = [{"platform": p, "country": c, "metric": m, "bucket": b, "count": n}
+                  for (p, c, m, b), n in sorted(sketch.items())]
+        for i in range(0, len(values), batch_size):
+            conn.execute(insert(StatsSketch).values(values[i:i + batch_size]))
+    print(f"[stats] rebuilt totals for {len(totals)} platform/country pairs, {len(sketch)} sketch buckets.")
+    return len(totals)
+
+def _filtered(q, table, platform, country):
+    if platform:
+        q = q.where(table.platform == platform)
+    if country:
+        q = q.where(table.country == country)
+    return q
+
+def stats(platform=None, country=None, window_days=7, movers=10):
+    """
+    Totals, means, sketch percentiles and the platform x country segments that gained
+    the most views over the window. Reads only the rollup tables, so the cost depends
+    on the number of segments, days and buckets, never on the number of workflows.
+    """
+    since = datetime.now(timezone.utc).date() - timedelta(days=window_days - 1)
+    sums = [func.coalesce(func.sum(getattr(StatsTotal, c)), 0).label(c)
+            for c in ("workflows", "like_ratio_sum") + DELTA_METRICS]
+    gained = [func.sum(getattr(StatsRollup, c)).label(c) for c in ("workflows_added",) + DELTA_METRICS]
+    with engine.connect() as conn:
+        t = conn.execute(_filtered(select(*sums), StatsTotal, platform, country)).one()
+        buckets = conn.execute(_filtered(
+            select(StatsSketch.metric, StatsSketch.bucket, func.sum(StatsSketch.count)),
+            StatsSketch, platform, country).group_by(StatsSketch.metric, StatsSketch.bucket)).all()
+        window = conn.execute(_filtered(
+            select(StatsRollup.platform, StatsRollup.country, *gained).where(StatsRollup.day >= since),
+            StatsRollup, platform, country).group_by(StatsRollup.platform, StatsRollup.country)).all()
+        seg_totals = dict(((r.platform, r.country), int(r.views)) for r in conn.execute(_filtered(
+            select(StatsTotal.platform, StatsTotal.country, StatsTotal.views), StatsTotal, platform, country)))
+
+    n = int(t.workflows)
+    totals = {"workflows": n, **{c: int(getattr(t, c)) for c in DELTA_METRICS}}
+    means = {c: totals[c] / n if n else 0.0 for c in DELTA_METRICS}
+    means["like_to_view_ratio"] = float(t.like_ratio_sum) / n if n else 0.0
+    means["pooled_like_to_view_ratio"] = totals["likes"] / totals["views"] if totals["views"] else 0.0
+
+    merged = defaultdict(dict)
+    for metric, bucket, count in buckets:
+        merged[metric][bucket] = int(count)
+    percentiles = {}
+    for metric, label in (("views", "views"), ("like_ratio", "like_to_view_ratio")):
+        qs = sketch_quantiles(merged.get(metric, {}))
+        percentiles[label] = {f"p{round(q * 100)}": v for q, v in qs.items()}
+
+    window_totals = dict.fromkeys(("workflows_added",) + DELTA_METRICS, 0)
+    segments = []
+    for r in window:
+        for c in window_totals:
+            window_totals[c] += int(getattr(r, c) or 0)
+        views_total = seg_totals.get((r.platform, r.country), 0)
+        before = views_total - int(r.views or 0)
+        segments.append({
+            "platform": r.platform,
+            "country": r.country,
+            "views_gained": int(r.views or 0),
+            "likes_gained": int(r.likes or 0),
+            "workflows_added": int(r.workflows_added or 0),
+            "views_growth": int(r.views or 0) / before if before > 0 else None,
+        })
+    segments.sort(key=lambda s: s["views_gained"], reverse=True)
+    return {
+        "platform": platform,
+        "country": country,
+        "window_days": window_days,
+        "totals": totals,
+        "means": means,
+        "percentiles": percentiles,
+        "percentile_relative_error": SKETCH_ALPHA,
+        "window": window_totals,
+        "top_movers": segments[:movers],
+    }
@@ -0,0 +1,100 @@
+# analytics/trend_analytics.py
+import numpy as np
+from sqlalchemy import select
+from db import engine
+from api.models import TrendSeries
+
+RECENT_WINDOW = 30
+Z_THRESHOLD = 3.0
+
+def pack_series(values):
+    """Raw Google Trends interest (0..100) as one uint8 per point."""
+    return np.clip(np.rint(np.asarray(values, dtype=np.float64)), 0, 255).astype(np.uint8).tobytes()
+
+def unpack_series(blob):
+    return np.frombuffer(blob, dtype=np.uint8)
+
+class TrendMatrix:
+    """
+    All trend series of one timeframe in a single (queries x timestamps) float32 array.
+    Rows are right-aligned on the latest point; shorter series are NaN-padded on the left.
+    Raw uint8 interest is multiplied by each row's batch scale (see get_trends_batched).
+    """
+
+    def __init__(self, keys, rows, scales=None):
+        self.keys = list(keys)
+        width = max((len(r) for r in rows), default=0)
+        self.values = np.full((len(self.keys), width), np.nan, dtype=np.float32)
+        for i, r in enumerate(rows):
+            if len(r):
+                self.values[i, width - len(r):] = r
+        if scales is not None:
+            self.values *= np.asarray(scales, dtype=np.float32)[:, None]
+
+    @classmethod
+    def load(cls, geo=None, timeframe="today 3-m"):
+        """Build the matrix straight from the binary trend_series table."""
+        q = select(TrendSeries.query, TrendSeries.geo, TrendSeries.scale, TrendSeries.points) \
+            .where(TrendSeries.timeframe == timeframe)
+        if geo:
+            q = q.where(TrendSeries.geo == geo)
+        with engine.connect() as conn:
+            rows = conn.execute(q).all()
+        return cls([(r.query, r.geo) for r in rows], [unpack_series(r.points) for r in rows],
+                   [r.scale or 1.0 for r in rows])
+
+    def analyze(self, window=RECENT_WINDOW, z_threshold=Z_THRESHOLD):
+        """
+        One vectorized pass over every series. Returns a dict of per-row arrays:
+        avg_recent / avg_previous (means of the last / first `window` points, same rules
+        as the old per-query pandas code), change_pct, slope (least squares, interest per
+        point), zscore of the latest point against the series, and an anomaly flag.
+        """
+        m = self.values
+        n_rows, width = m.shape
+        valid = ~np.isnan(m)
+        counts = valid.sum(axis=1)
+        if n_rows == 0 or width == 0:
+            empty = np.zeros(n_rows, dtype=np.float32)
+            return {"avg_recent": empty, "avg_previous": empty, "change_pct": empty,
+                    "slope": empty, "zscore": empty, "anomaly": np.zeros(n_rows, dtype=bool)}
+
+        filled = np.where(valid, m, 0.0)
+        csum = np.cumsum(filled, axis=1)
+        # recent: the last `window` points (padding is on the left and counts as 0)
+        recent = _safe_div(filled[:, -window:].sum(axis=1), np.minimum(counts, window))
+        # previous: first 30 points if the series has 2*window, else everything before the recent window
+        start = width - counts  # index of the first valid point per row
+        prev_len = np.where(counts >= 2 * window, window, np.maximum(counts - window, 0))
+        rows_idx = np.arange(n_rows)
+        end = start + prev_len - 1
+        before = np.where(start > 0, csum[rows_idx, np.maximum(start - 1, 0)], 0.0)
+        prev_sum = np.where(prev_len > 0, csum[rows_idx, np.maximum(end, 0)] - before, 0.0)
+        previous = np.where(prev_len > 0, _safe_div(prev_sum, prev_len), recent)
+        change = np.where(previous != 0, _safe_div(recent - previous, previous) * 100.0, 0.0)
+
+        x = np.arange(width, dtype=np.float64)
+        x_mean = _safe_div((x * valid).sum(axis=1), counts)
+        y_mean = _safe_div(filled.sum(axis=1), counts)
+        dx = np.where(valid, x - x_mean[:, None], 0.0)
+        dy = np.where(valid, m - y_mean[:, None], 0.0)
+        slope = _safe_div((dx * dy).sum(axis=1), (dx * dx).sum(axis=1))
+
+        std = np.sqrt(_safe_div((dy * dy).sum(axis=1), counts))
+        last = np.where(counts > 0, filled[:, -1], 0.0)
+        z = _safe_div(last - y_mean, std)
+        return {"avg_recent": recent, "avg_previous": previous, "change_pct": change,
+                "slope": slope, "zscore": z, "anomaly": np.abs(z) >= z_threshold}
+
+    def summaries(self, **kwargs):
+        """analyze() as {key: {metric: float}} for storage or JSON."""
+        res = self.analyze(**kwargs)
+        return {key: {name: (bool(arr[i]) if arr.dtype == bool else float(arr[i])) for name, arr in res.items()}
+                for i, key in enumerate(self.keys)}
+
+def _safe_div(a, b):
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    out = np.zeros(np.broadcast(a, b).shape, dtype=np.float64)
+    np.divide(a, b, out=out, where=b != 0)
+    return out
@@ -0,0 +1,66 @@
+# api/cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert
+from db import engine
+from api.models import DataVersion
+
+# how often the API re-reads the data version written by the collectors
+VERSION_POLL_SECONDS = float(os.getenv("DATA_VERSION_POLL_SECONDS", "1.0"))
+
+def bump_data_version(conn, name="workflows"):
+    """Called inside a collector write transaction: invalidates API caches for `name`."""
+    stmt = insert(DataVersion).values(name=name, version=1)
+    conn.execute(stmt.on_duplicate_key_update(version=DataVersion.version + 1))
+
+_version_lock = threading.Lock()
+_versions = {}
+
+def current_data_version(name="workflows"):
+    """Latest data version, re-read from the DB at most every VERSION_POLL_SECONDS."""
+    now = time.monotonic()
+    cached = _versions.get(name)
+    if cached and now - cached[1] < VERSION_POLL_SECONDS:
+        return cached[0]
+    with _version_lock:
+        cached = _versions.get(name)
+        if cached and now - cached[1] < VERSION_POLL_SECONDS:
+            return cached[0]
+        with engine.connect() as conn:
+            version = conn.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar() or 0
+        _versions[name] = (version, now)
+        return version
+
+class ResponseCache:
+    """
+    In-process TTL + LRU cache. Each entry remembers the data version it was built
+    from and is treated as a miss once the collectors have bumped the version.
+    """
+
+    def __init__(self, max_entries=256, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            entry_version, expires, value = entry
+            if entry_version != version or expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._data[key] = (version, time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
@@ -1,40 +1,251 @@
-# api/main.py
-from fastapi import FastAPI, Query
-from db import SessionLocal
-from api.models import Workflow
-from fastapi.responses import JSONResponse
-
-app = FastAPI(title="n8n Workflow Popularity API")
-
-@app.get("/health")
-def health():
-    return {"status": "ok"}
-
-@app.get("/workflows")
-def list_workflows(platform: str = Query(None), country: str = Query(None), limit: int = 50, offset: int = 0):
-    session = SessionLocal()
-    q = session.query(Workflow)
-    if platform:
-        q = q.filter(Workflow.platform == platform)
-    if country:
-        q = q.filter(Workflow.country == country)
-    items = q.order_by(Workflow.views.desc()).offset(offset).limit(limit).all()
-    res = []
-    for it in items:
-        res.append({
-            "workflow": it.workflow_name,
-            "platform": it.platform,
-            "popularity_metrics": {
-                "views": int(it.views or 0),
-                "likes": int(it.likes or 0),
-                "comments": int(it.comments or 0),
-                "replies": int(it.replies or 0),
-                "contributors": int(it.contributors or 0),
-                "like_to_view_ratio": float((it.likes or 0) / (it.views or 1)) if (it.views or 0) else 0,
-                "comment_to_view_ratio": float((it.comments or 0) / (it.views or 1)) if (it.views or 0) else 0
-            },
-            "country": it.country,
-            "source_url": it.source_url
-        })
-    session.close()
-    return JSONResponse({"count": len(res), "data": res})
+# api/main.py
+import base64
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+import zlib
+from contextlib import asynccontextmanager
+import orjson
+from fastapi import FastAPI, Query, HTTPException, Request
+from sqlalchemy import select, and_, or_
+from db import SessionLocal, engine
+from api.models import Workflow, WorkflowRanking
+from api.cache import ResponseCache, current_data_version
+from analytics.history import trending
+from analytics.stats_rollups import stats
+from api import search
+import metrics
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+@asynccontextmanager
+async def lifespan(app):
+    # load the /search index from its snapshot in the background; requests never wait on it
+    search.start()
+    yield
+
+app = FastAPI(title="n8n Workflow Popularity API", lifespan=lifespan)
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+def encode_cursor(views, wid):
+    raw = json.dumps([int(views), int(wid)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        views, wid = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return int(views), int(wid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+# columns /workflows actually returns; `evidence` is never loaded on the read path
+WORKFLOW_LIST_COLUMNS = (Workflow.id, Workflow.workflow_name, Workflow.platform, Workflow.country,
+                         Workflow.views, Workflow.likes, Workflow.comments, Workflow.replies,
+                         Workflow.contributors, Workflow.source_url)
+
+_workflows_cache = ResponseCache(max_entries=int(os.getenv("API_CACHE_ENTRIES", "256")),
+                                 ttl=float(os.getenv("API_CACHE_TTL", "60")))
+
+def _query_workflows(platform, country, limit, offset, cursor):
+    q = select(*WORKFLOW_LIST_COLUMNS)
+    if platform:
+        q = q.where(Workflow.platform == platform)
+    if country:
+        q = q.where(Workflow.country == country)
+    q = q.order_by(Workflow.views.desc(), Workflow.id.desc())
+    if cursor:
+        # seek past the last row of the previous page instead of counting offset rows
+        views, wid = decode_cursor(cursor)
+        q = q.where(or_(Workflow.views < views, and_(Workflow.views == views, Workflow.id < wid)))
+    else:
+        q = q.offset(offset)
+    with engine.connect() as conn:
+        items = conn.execute(q.limit(limit)).all()
+    next_cursor = encode_cursor(items[-1].views, items[-1].id) if items and len(items) == limit else None
+    res = []
+    for it in items:
+        views, likes, comments = int(it.views or 0), int(it.likes or 0), int(it.comments or 0)
+        res.append({
+            "workflow": it.workflow_name,
+            "platform": it.platform,
+            "popularity_metrics": {
+                "views": views,
+                "likes": likes,
+                "comments": comments,
+                "replies": int(it.replies or 0),
+                "contributors": int(it.contributors or 0),
+                "like_to_view_ratio": likes / views if views else 0,
+                "comment_to_view_ratio": comments / views if views else 0
+            },
+            "country": it.country,
+            "source_url": it.source_url
+        })
+    return {"count": len(res), "data": res, "next_cursor": next_cursor}
+
+@app.get("/workflows")
+def list_workflows(request: Request, platform: str = Query(None), country: str = Query(None),
+                   limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0),
+                   cursor: str = Query(None, description="next_cursor from the previous page; replaces offset")):
+    start = time.perf_counter()
+    version = current_data_version()
+    key = (platform, country, limit, offset, cursor)
+    cached = _workflows_cache.get(key, version)
+    outcome = "hit"
+    if cached is None:
+        outcome = "miss"
+        body = orjson.dumps(_query_workflows(platform, country, limit, offset, cursor))
+        cached = (body, '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest())
+        _workflows_cache.put(key, version, cached)
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        response = Response(status_code=304, headers=headers)
+        outcome = "not_modified"
+    else:
+        response = Response(content=body, media_type="application/json", headers=headers)
+    metrics.API_SECONDS.labels("/workflows", _filter_label(platform, country, cursor), outcome) \
+        .observe(time.perf_counter() - start)
+    return response
+
+def _filter_label(platform, country, cursor):
+    # which filters were given, never their values, to keep the label set small
+    used = [name for name, value in (("platform", platform), ("country", country), ("cursor", cursor)) if value]
+    return "+".join(used) or "none"
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text exposition (set PROMETHEUS_MULTIPROC_DIR to include the collector processes)."""
+    body, content_type = metrics.exposition()
+    return Response(content=body, media_type=content_type)
+
+EXPORT_COLUMNS = WORKFLOW_LIST_COLUMNS + (Workflow.canonical_id, Workflow.updated_at)
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "2000"))
+
+def _export_batches(q):
+    """
+    Pages of EXPORT_BATCH rows by id (WHERE id > last ORDER BY id LIMIT n). The
+    mysqlconnector driver has no server-side cursors, so one big SELECT would be
+    buffered whole; each page is a short primary-key range read on its own connection.
+    """
+    last_id = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(q.where(Workflow.id > last_id).order_by(Workflow.id).limit(EXPORT_BATCH)).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < EXPORT_BATCH:
+            return
+        last_id = rows[-1].id
+
+def _export_chunks(q, fmt):
+    """Encode the export page by page."""
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow([c.name for c in EXPORT_COLUMNS])
+        yield buf.getvalue().encode()
+    for rows in _export_batches(q):
+        if fmt == "csv":
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows(rows)
+            yield buf.getvalue().encode()
+        else:
+            yield b"".join(orjson.dumps(row._asdict()) + b"\n" for row in rows)
+
+def _gzip_chunks(chunks):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+@app.get("/workflows/export")
+def export_workflows(request: Request, platform: str = Query(None), country: str = Query(None),
+                     fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+                     compress: bool = Query(False, alias="gzip",
+                                            description="gzip the stream (also used when Accept-Encoding allows it)")):
+    """Stream every matching row as NDJSON or CSV with flat memory, for bulk/warehouse loads."""
+    q = select(*EXPORT_COLUMNS)
+    if platform:
+        q = q.where(Workflow.platform == platform)
+    if country:
+        q = q.where(Workflow.country == country)
+    chunks = _export_chunks(q, fmt)
+    headers = {"Content-Disposition": f'attachment; filename="workflows.{fmt}"'}
+    if compress or "gzip" in request.headers.get("accept-encoding", ""):
+        chunks = _gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+@app.get("/rankings")
+def list_rankings(platform: str = Query(None), country: str = Query(None), limit: int = Query(50, ge=1, le=500)):
+    """Top-N workflows by composite popularity score, served from the materialized ranking table."""
+    session = SessionLocal()
+    q = session.query(WorkflowRanking)
+    if platform:
+        q = q.filter(WorkflowRanking.platform == platform)
+    if country:
+        q = q.filter(WorkflowRanking.country == country)
+    items = q.order_by(WorkflowRanking.score.desc(), WorkflowRanking.workflow_id.desc()).limit(limit).all()
+    res = []
+    for rank, it in enumerate(items, start=1):
+        res.append({
+            "rank": rank,
+            "workflow": it.workflow_name,
+            "platform": it.platform,
+            "country": it.country,
+            "score": round(float(it.score), 6),
+            "popularity_metrics": {
+                "views": int(it.views or 0),
+                "likes": int(it.likes or 0),
+                "comments": int(it.comments or 0),
+                "replies": int(it.replies or 0)
+            },
+            "source_url": it.source_url
+        })
+    session.close()
+    return JSONResponse({"count": len(res), "data": res})
+
+@app.get("/trending")
+def list_trending(platform: str = Query(None), country: str = Query(None),
+                  window_days: int = Query(7, ge=2, le=90), limit: int = Query(50, ge=1, le=500)):
+    """Workflows gaining views fastest over the window (views/day and acceleration), from daily rollups."""
+    res = trending(window_days=window_days, platform=platform, country=country, limit=limit)
+    return JSONResponse({"count": len(res), "window_days": window_days, "data": res})
+
+_stats_cache = ResponseCache(max_entries=64, ttl=float(os.getenv("API_CACHE_TTL", "60")))
+
+@app.get("/stats")
+def get_stats(platform: str = Query(None), country: str = Query(None),
+              window_days: int = Query(7, ge=1, le=90), movers: int = Query(10, ge=0, le=100)):
+    """Totals, means, percentiles and top-moving platform/country segments, from the incremental rollups."""
+    version = current_data_version()
+    key = (platform, country, window_days, movers)
+    body = _stats_cache.get(key, version)
+    if body is None:
+        body = orjson.dumps(stats(platform=platform, country=country, window_days=window_days, movers=movers))
+        _stats_cache.put(key, version, body)
+    return Response(content=body, media_type="application/json")
+
+@app.get("/search")
+def search_workflows(q: str = Query(..., min_length=1, max_length=200), platform: str = Query(None),
+                     country: str = Query(None), limit: int = Query(10, ge=1, le=100)):
+    """Typeahead / fuzzy search over workflow names, ranked by name match and popularity."""
+    start = time.perf_counter()
+    index = search.current_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="search index is loading", headers={"Retry-After": "5"})
+    hits = index.search(q, limit=limit, platform=platform, country=country)
+    body = orjson.dumps({"count": len(hits), "query": q, "data": [index.result(*h) for h in hits]})
+    metrics.API_SECONDS.labels("/search", _filter_label(platform, country, None), "none") \
+        .observe(time.perf_counter() - start)
+    return Response(content=body, media_type="application/json")
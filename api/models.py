@@ -1,20 +1,212 @@
-# api/models.py
-from sqlalchemy import Column, BigInteger, String, Enum, JSON, Integer, TIMESTAMP, func, BigInteger as BigInt
-from db import Base
-
-class Workflow(Base):
-    __tablename__ = "workflows"
-    id = Column(BigInt, primary_key=True, autoincrement=True)
-    workflow_name = Column(String(512), nullable=False)
-    normalized_name = Column(String(512), nullable=False)
-    platform = Column(Enum('YouTube','Forum','Google'), nullable=False)
-    country = Column(String(8), nullable=False)
-    evidence = Column(JSON, nullable=False)
-    views = Column(BigInt, default=0)
-    likes = Column(BigInt, default=0)
-    comments = Column(BigInt, default=0)
-    replies = Column(BigInt, default=0)
-    contributors = Column(Integer, default=0)
-    source_url = Column(String(1024))
-    created_at = Column(TIMESTAMP, server_default=func.now())
-    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+# api/models.py
+from sqlalchemy import Column, BigInteger, String, Enum, JSON, Integer, Float, Date, LargeBinary, TIMESTAMP, Index, UniqueConstraint, func, BigInteger as BigInt
+from sqlalchemy.dialects import mysql
+from db import Base
+
+class Workflow(Base):
+    __tablename__ = "workflows"
+    __table_args__ = (
+        # one row per workflow per platform/country; the bulk upsert's ON DUPLICATE KEY relies on it
+        UniqueConstraint("platform", "country", "normalized_name", name="uq_workflows_identity"),
+        # 64-bit hash of the same three (normalization.name_key): narrows the upsert's re-reads to a
+        # BIGINT probe, but only the unique key above decides which row a record is, so a hash
+        # collision never merges two workflows
+        Index("ix_workflows_name_key", "name_key"),
+        # (views, id) seek keys for keyset pagination on /workflows, per filter combination
+        Index("ix_workflows_views_id", "views", "id"),
+        Index("ix_workflows_platform_views_id", "platform", "views", "id"),
+        Index("ix_workflows_country_views_id", "country", "views", "id"),
+        Index("ix_workflows_platform_country_views_id", "platform", "country", "views", "id"),
+        # incremental refresh of the /search index
+        Index("ix_workflows_updated_at", "updated_at"),
+    )
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    workflow_name = Column(String(512), nullable=False)
+    # binary collation: the unique key compares names exactly as normalization does
+    normalized_name = Column(String(512).with_variant(mysql.VARCHAR(512, collation="utf8mb4_bin"), "mysql"),
+                             nullable=False)
+    name_key = Column(BigInt, nullable=False)
+    platform = Column(Enum('YouTube','Forum','Google'), nullable=False)
+    country = Column(String(8), nullable=False)
+    evidence = Column(JSON, nullable=False)
+    # NOT NULL: the /workflows cursor seeks on (views, id)
+    views = Column(BigInt, nullable=False, default=0, server_default="0")
+    likes = Column(BigInt, default=0)
+    comments = Column(BigInt, default=0)
+    replies = Column(BigInt, default=0)
+    contributors = Column(Integer, default=0)
+    source_url = Column(String(1024))
+    # id of the representative row for the same workflow across platforms (analytics.entity_resolution)
+    canonical_id = Column(BigInt, index=True)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+class CollectorState(Base):
+    """Small per-source key/value state persisted between collector runs (watermarks, quotas...)."""
+    __tablename__ = "collector_state"
+    source = Column(String(64), primary_key=True)
+    state = Column(JSON, nullable=False)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+class ForumTopicState(Base):
+    """Last list-payload fingerprint seen for each forum topic, used to skip unchanged topics."""
+    __tablename__ = "forum_topic_state"
+    topic_id = Column(BigInt, primary_key=True, autoincrement=False)
+    bumped_at = Column(String(32))
+    views = Column(BigInt, default=0)
+    posts_count = Column(Integer, default=0)
+    synced_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+class WorkflowRanking(Base):
+    """
+    Materialized leaderboard: one row per workflow with its composite popularity score
+    (analytics.rankings). Every (platform, country) slice has an index ordered by score,
+    so top-N is an index range scan.
+    """
+    __tablename__ = "workflow_rankings"
+    __table_args__ = (
+        Index("ix_rankings_platform_country_score", "platform", "country", "score"),
+        Index("ix_rankings_platform_score", "platform", "score"),
+        Index("ix_rankings_country_score", "country", "score"),
+        Index("ix_rankings_score", "score"),
+        # rescored rows, for the /search index refresh
+        Index("ix_rankings_updated_at", "updated_at"),
+    )
+    workflow_id = Column(BigInt, primary_key=True, autoincrement=False)
+    platform = Column(Enum('YouTube','Forum','Google'), nullable=False)
+    country = Column(String(8), nullable=False)
+    workflow_name = Column(String(512), nullable=False)
+    source_url = Column(String(1024))
+    views = Column(BigInt, default=0)
+    likes = Column(BigInt, default=0)
+    comments = Column(BigInt, default=0)
+    replies = Column(BigInt, default=0)
+    score = Column(Float, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+class PlatformScoreStats(Base):
+    """Per-platform scale used to normalize ranking scores (largest log views / discussion seen)."""
+    __tablename__ = "platform_score_stats"
+    platform = Column(Enum('YouTube','Forum','Google'), primary_key=True)
+    max_log_views = Column(Float, nullable=False, default=0)
+    max_log_discussion = Column(Float, nullable=False, default=0)
+
+class DataVersion(Base):
+    """Monotonic counter per dataset, bumped by every collector write; API caches key on it."""
+    __tablename__ = "data_versions"
+    name = Column(String(64), primary_key=True)
+    version = Column(BigInt, nullable=False, default=0)
+
+class WorkflowSnapshot(Base):
+    """Append-only metrics history: one narrow row per workflow per collector write (unix seconds)."""
+    __tablename__ = "workflow_snapshots"
+    __table_args__ = (
+        Index("ix_snapshots_ts", "ts"),
+    )
+    # primary key doubles as the (workflow_id, ts) index
+    workflow_id = Column(BigInt, primary_key=True, autoincrement=False)
+    ts = Column(BigInt, primary_key=True, autoincrement=False)
+    views = Column(BigInt, nullable=False, default=0)
+    likes = Column(BigInt, nullable=False, default=0)
+    comments = Column(BigInt, nullable=False, default=0)
+    replies = Column(BigInt, nullable=False, default=0)
+
+class WorkflowRollup(Base):
+    """Downsampled history: the highest metrics seen per workflow per day / week (analytics.history)."""
+    __tablename__ = "workflow_rollups"
+    __table_args__ = (
+        Index("ix_rollups_workflow", "workflow_id", "granularity", "bucket"),
+    )
+    # (granularity, bucket) first so a trending window is one range scan
+    granularity = Column(Enum('day','week'), primary_key=True)
+    bucket = Column(Date, primary_key=True)
+    workflow_id = Column(BigInt, primary_key=True, autoincrement=False)
+    views = Column(BigInt, nullable=False, default=0)
+    likes = Column(BigInt, nullable=False, default=0)
+    comments = Column(BigInt, nullable=False, default=0)
+    replies = Column(BigInt, nullable=False, default=0)
+
+class StatsRollup(Base):
+    """Per platform x country x UTC day: what collector writes added that day (analytics.stats_rollups)."""
+    __tablename__ = "stats_rollups"
+    # day first so a window is one range scan
+    day = Column(Date, primary_key=True)
+    platform = Column(Enum('YouTube','Forum','Google'), primary_key=True)
+    country = Column(String(8), primary_key=True)
+    workflows_added = Column(Integer, nullable=False, default=0)
+    rows_changed = Column(Integer, nullable=False, default=0)
+    views = Column(BigInt, nullable=False, default=0)
+    likes = Column(BigInt, nullable=False, default=0)
+    comments = Column(BigInt, nullable=False, default=0)
+    replies = Column(BigInt, nullable=False, default=0)
+    contributors = Column(BigInt, nullable=False, default=0)
+
+class StatsTotal(Base):
+    """Running totals per platform x country: the sum of every stats_rollups delta."""
+    __tablename__ = "stats_totals"
+    platform = Column(Enum('YouTube','Forum','Google'), primary_key=True)
+    country = Column(String(8), primary_key=True)
+    workflows = Column(BigInt, nullable=False, default=0)
+    views = Column(BigInt, nullable=False, default=0)
+    likes = Column(BigInt, nullable=False, default=0)
+    comments = Column(BigInt, nullable=False, default=0)
+    replies = Column(BigInt, nullable=False, default=0)
+    contributors = Column(BigInt, nullable=False, default=0)
+    # sum of per-workflow likes/views, for the mean ratio
+    like_ratio_sum = Column(Float(precision=53), nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+class StatsSketch(Base):
+    """
+    Mergeable quantile sketch per platform x country x metric: workflow counts in
+    log-spaced buckets (relative-error, DDSketch-style). Counts are added and removed
+    as values move, and sketches merge by summing buckets.
+    """
+    __tablename__ = "stats_sketches"
+    platform = Column(Enum('YouTube','Forum','Google'), primary_key=True)
+    country = Column(String(8), primary_key=True)
+    metric = Column(String(16), primary_key=True)
+    bucket = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(BigInt, nullable=False, default=0)
+
+class TrendSeries(Base):
+    """
+    Google Trends interest series stored as fixed-width binary: one uint8 (0..100) per
+    point, `step_seconds` apart from `start_ts`. `scale` is the batch rescaling factor.
+    """
+    __tablename__ = "trend_series"
+    query = Column(String(255), primary_key=True)
+    geo = Column(String(8), primary_key=True)
+    timeframe = Column(String(32), primary_key=True)
+    start_ts = Column(BigInt)
+    step_seconds = Column(Integer)
+    length = Column(Integer, nullable=False, default=0)
+    scale = Column(Float, nullable=False, default=1.0)
+    points = Column(LargeBinary, nullable=False)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+class FetchTask(Base):
+    """
+    One unit of collector work (a forum topic, a batch of video IDs, a trends query batch)
+    claimed by workers through a time-limited lease (collectors.work_queue).
+    """
+    __tablename__ = "fetch_tasks"
+    __table_args__ = (
+        UniqueConstraint("kind", "task_key", name="uq_fetch_tasks_key"),
+        # claim scans: next ready task of a kind, and expired leases
+        Index("ix_fetch_tasks_ready", "kind", "status", "available_at"),
+        Index("ix_fetch_tasks_lease", "kind", "status", "lease_expires_at"),
+    )
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    kind = Column(String(32), nullable=False)
+    task_key = Column(String(191), nullable=False)
+    payload = Column(JSON)
+    status = Column(Enum('pending','leased','done','failed'), nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    lease_owner = Column(String(64))
+    lease_expires_at = Column(TIMESTAMP, nullable=True)
+    available_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    last_error = Column(String(512))
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    completed_at = Column(TIMESTAMP, nullable=True)
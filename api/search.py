@@ -0,0 +1,603 @@
+# api/search.py
+import os
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+import numpy as np
+from rapidfuzz import fuzz, process
+from sqlalchemy import select, func
+from db import engine
+from api.models import Workflow, WorkflowRanking
+from api.cache import current_data_version
+from normalization import normalize_name
+
+SNAPSHOT_PATH = os.getenv("SEARCH_SNAPSHOT_PATH", ".cache/search_index.npz")
+REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", "5"))
+# how often the id list is re-read to drop rows deleted from MySQL (rekey_workflows merges)
+PRUNE_SECONDS = float(os.getenv("SEARCH_PRUNE_SECONDS", "600"))
+# share of the final rank that comes from popularity (the rankings score) rather than the name match
+POPULARITY_WEIGHT = float(os.getenv("SEARCH_POPULARITY_WEIGHT", "0.25"))
+MIN_SIMILARITY = int(os.getenv("SEARCH_MIN_SIMILARITY", "60"))
+# the query's shortest posting lists are read in full, up to this many postings in total;
+# the longer (common) ones are only probed, and walked from their popular head
+SCAN_POSTINGS = 1 << 16
+WALK_CHUNK = 4096
+# a walk stops after this many postings of one list (a filter that matches almost nothing)
+MAX_WALK = 1 << 18
+# grams on more than 1/BITMAP_SHARE of the rows are probed through a cached bitmap (smaller than their list)
+BITMAP_SHARE = 16
+# candidates (by grams matched, then popularity) re-scored with rapidfuzz
+MAX_CANDIDATES = 200
+# plus the best matched rows closest in length to the query, so an unpopular exact title is re-scored too
+NEAR_CANDIDATES = 20
+# a slow collector transaction can commit an updated_at older than the watermark: re-read a margin
+REFRESH_OVERLAP = timedelta(seconds=60)
+BUILD_BATCH = 20000
+PRUNE_BATCH = 100000
+SNAPSHOT_FORMAT = 2
+
+ROW_COLUMNS = (Workflow.id, Workflow.normalized_name, Workflow.workflow_name, Workflow.platform, Workflow.country,
+               Workflow.views, Workflow.source_url, func.coalesce(WorkflowRanking.score, 0).label("score"),
+               Workflow.updated_at, WorkflowRanking.updated_at.label("ranked_at"))
+
+def _max_time(current, value):
+    return value if value is not None and (current is None or value > current) else current
+
+def _pages(q, batch=BUILD_BATCH):
+    """
+    Rows of q (which must select Workflow.id) in id order, one short query per page:
+    the mysqlconnector driver has no server-side cursors, so one big SELECT would be
+    buffered whole.
+    """
+    last_id = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(q.where(Workflow.id > last_id).order_by(Workflow.id).limit(batch)).all()
+        if rows:
+            yield rows
+        if len(rows) < batch:
+            return
+        last_id = rows[-1].id
+
+def _trigrams(padded):
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def name_grams(name):
+    """Trigrams of " name " plus " x" for each word start, so one typed letter already matches."""
+    grams = _trigrams(f" {name} ")
+    grams.update(" " + w[0] for w in name.split())
+    return grams
+
+def _member(lst, pos):
+    """Mask of sorted positions `pos` present in the sorted posting list `lst`."""
+    # same dtype as the list, or numpy converts the whole list on every call
+    pos = pos.astype(lst.dtype, copy=False)
+    i = np.searchsorted(lst, pos)
+    return lst[np.minimum(i, len(lst) - 1)] == pos
+
+def _counted(positions):
+    """Distinct positions (int64, ascending) and how many times each occurs."""
+    flat = np.sort(positions).astype(np.int64)
+    if not len(flat):
+        return flat, flat
+    starts = np.flatnonzero(np.concatenate(([True], flat[1:] != flat[:-1])))
+    return flat[starts], np.diff(np.append(starts, len(flat)))
+
+def query_grams(q):
+    # no padding after the query: its last word is usually still being typed
+    return _trigrams(" " + q) or {" " + w[0] for w in q.split()}
+
+class _Column:
+    """Growable numpy column. Only the refresh thread writes; readers see a consistent prefix."""
+
+    def __init__(self, values, dtype):
+        self.data = np.array(values, dtype=dtype)
+        self.n = len(self.data)
+
+    def append(self, value):
+        if self.n == len(self.data):
+            grown = np.empty(max(16, self.n + self.n // 2), dtype=self.data.dtype)
+            grown[:self.n] = self.data[:self.n]
+            self.data = grown
+        self.data[self.n] = value
+        self.n += 1
+
+class _Strings:
+    """Row strings: the snapshot's UTF-8 blob + offsets, rows appended since, and per-row replacements."""
+
+    def __init__(self, blob=b"", offsets=None):
+        self.blob = blob
+        self.offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self.base = len(self.offsets) - 1
+        self.extra = []
+        self.changed = {}
+
+    @staticmethod
+    def pack(strings):
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return b"".join(encoded), offsets
+
+    def __getitem__(self, i):
+        s = self.changed.get(i)
+        if s is not None:
+            return s
+        if i < self.base:
+            return self.blob[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+        return self.extra[i - self.base]
+
+    def set(self, i, s):
+        if i >= self.base:
+            self.extra[i - self.base] = s
+        elif s != self[i]:
+            self.changed[i] = s
+
+    def append(self, s):
+        self.extra.append(s)
+
+class SearchIndex:
+    """
+    Trigram inverted index over workflows.normalized_name, held in process. Rows are
+    numbered by popularity (rankings score) when the index is built, so every posting
+    list runs from the most to the least popular row. A lookup counts the grams each
+    row matches (rare grams in full, common ones from their popular end), applies the
+    filters, and re-scores the best candidates with rapidfuzz. The rank mixes the
+    match with popularity.
+    Rows written after the build are appended (with their own small postings),
+    existing rows are updated in place (rescored ones too), and rows deleted from
+    MySQL are marked dead by prune().
+    """
+
+    def __init__(self, ids, names, display, urls, platforms, countries, views, scores,
+                 grams, postings, watermark=None, platform_labels=(), country_labels=(), rank_watermark=None):
+        self.ids = _Column(ids, np.int64)
+        self.names, self.display, self.urls = names, display, urls
+        self.platform_labels = list(platform_labels)
+        self.country_labels = list(country_labels)
+        self.platforms = _Column(platforms, np.int16)
+        self.countries = _Column(countries, np.int16)
+        self.views = _Column(views, np.int64)
+        self.scores = _Column(scores, np.float32)
+        # UTF-8 length of each name, to find the rows closest to a whole-title query
+        self.lengths = _Column(np.diff(names.offsets), np.int32)
+        self.alive = _Column(np.ones(len(ids), dtype=bool), bool)
+        self.grams = grams  # gram -> (start, end) in postings
+        self.postings = postings
+        self.extra_postings = {}
+        self._bitmaps = {}
+        # newest workflows.updated_at / workflow_rankings.updated_at applied
+        self.watermark = watermark
+        self.rank_watermark = rank_watermark
+        # rows after the base are not written to snapshots: a reload must catch up from here
+        self.base_watermark = watermark
+        self.base_rank_watermark = rank_watermark
+        order = np.argsort(self.ids.data, kind="stable")
+        self._sorted_ids = self.ids.data[order]
+        self._sorted_pos = order.astype(np.int64)
+        self._extra_pos = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return int(self.alive.data[:self.alive.n].sum())
+
+    # ---- build / snapshot ----
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from ROW_COLUMNS-shaped rows (any order)."""
+        rows = sorted(rows, key=lambda r: (-float(r.score or 0), r.id))
+        platform_labels, country_labels = {}, {}
+        postings = {}
+        for pos, r in enumerate(rows):
+            for g in name_grams(r.normalized_name or ""):
+                lst = postings.get(g)
+                if lst is None:
+                    lst = postings[g] = array("i")
+                lst.append(pos)
+        keys = sorted(postings)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum([len(postings[k]) for k in keys], out=offsets[1:])
+        flat = np.empty(int(offsets[-1]), dtype=np.int32)
+        for k, start, end in zip(keys, offsets[:-1], offsets[1:]):
+            flat[start:end] = np.frombuffer(postings.pop(k), dtype=np.int32)
+        names = _Strings(*_Strings.pack([r.normalized_name or "" for r in rows]))
+        display = _Strings(*_Strings.pack([r.workflow_name or "" for r in rows]))
+        urls = _Strings(*_Strings.pack([r.source_url or "" for r in rows]))
+        return cls(
+            ids=[r.id for r in rows], names=names, display=display, urls=urls,
+            platforms=[platform_labels.setdefault(r.platform, len(platform_labels)) for r in rows],
+            countries=[country_labels.setdefault(r.country, len(country_labels)) for r in rows],
+            views=[int(r.views or 0) for r in rows], scores=[float(r.score or 0) for r in rows],
+            grams={k: (int(s), int(e)) for k, s, e in zip(keys, offsets[:-1], offsets[1:])}, postings=flat,
+            watermark=max((r.updated_at for r in rows if r.updated_at is not None), default=None),
+            rank_watermark=max((r.ranked_at for r in rows if getattr(r, "ranked_at", None) is not None),
+                               default=None),
+            platform_labels=platform_labels, country_labels=country_labels)
+
+    @classmethod
+    def build(cls):
+        """Full build from MySQL, read in id pages."""
+        q = select(*ROW_COLUMNS).outerjoin(WorkflowRanking, WorkflowRanking.workflow_id == Workflow.id)
+        rows = []
+        for page in _pages(q):
+            rows.extend(page)
+        return cls.from_rows(rows)
+
+    def save(self, path=SNAPSHOT_PATH):
+        """Write the base rows as a compact snapshot (numpy arrays, no pickles); appended rows wait for the next build."""
+        n = self.names.base
+        names = _Strings.pack(self.names[i] for i in range(n))
+        display = _Strings.pack(self.display[i] for i in range(n))
+        urls = _Strings.pack(self.urls[i] for i in range(n))
+        keys = sorted(self.grams)
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, format=np.array(SNAPSHOT_FORMAT),
+                     ids=self.ids.data[:n], platforms=self.platforms.data[:n], countries=self.countries.data[:n],
+                     views=self.views.data[:n], scores=self.scores.data[:n], alive=self.alive.data[:n],
+                     names=np.frombuffer(names[0], dtype=np.uint8), names_off=names[1],
+                     display=np.frombuffer(display[0], dtype=np.uint8), display_off=display[1],
+                     urls=np.frombuffer(urls[0], dtype=np.uint8), urls_off=urls[1],
+                     gram_keys=np.array(keys, dtype="<U3"),
+                     gram_spans=np.array([self.grams[k] for k in keys], dtype=np.int64).reshape(-1, 2),
+                     postings=self.postings,
+                     platform_labels=np.array(self.platform_labels[:], dtype=str),
+                     country_labels=np.array(self.country_labels[:], dtype=str),
+                     watermark=np.array(self.base_watermark.isoformat() if self.base_watermark else ""),
+                     rank_watermark=np.array(self.base_rank_watermark.isoformat()
+                                             if self.base_rank_watermark else ""))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=SNAPSHOT_PATH):
+        """Load a snapshot written by save(); None if it is missing or from another format."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as z:
+            if int(z["format"]) != SNAPSHOT_FORMAT:
+                return None
+            spans = z["gram_spans"]
+            index = cls(
+                ids=z["ids"], names=_Strings(z["names"].tobytes(), z["names_off"]),
+                display=_Strings(z["display"].tobytes(), z["display_off"]),
+                urls=_Strings(z["urls"].tobytes(), z["urls_off"]),
+                platforms=z["platforms"], countries=z["countries"], views=z["views"], scores=z["scores"],
+                grams=dict(zip(z["gram_keys"].tolist(), zip(spans[:, 0].tolist(), spans[:, 1].tolist()))),
+                postings=z["postings"],
+                watermark=datetime.fromisoformat(str(z["watermark"])) if str(z["watermark"]) else None,
+                rank_watermark=(datetime.fromisoformat(str(z["rank_watermark"]))
+                                if str(z["rank_watermark"]) else None),
+                platform_labels=z["platform_labels"].tolist(), country_labels=z["country_labels"].tolist())
+            index.alive.data[:] = z["alive"]
+        return index
+
+    # ---- incremental refresh ----
+
+    def position(self, wid):
+        pos = self._extra_pos.get(wid)
+        if pos is not None:
+            return pos
+        i = int(np.searchsorted(self._sorted_ids, wid))
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == wid:
+            return int(self._sorted_pos[i])
+        return None
+
+    def _code(self, labels, value):
+        if value not in labels:
+            labels.append(value)
+        return labels.index(value)
+
+    def apply_rows(self, rows):
+        """Upsert ROW_COLUMNS rows: update metrics in place, append new rows (and renamed ones). Returns rows added."""
+        added = 0
+        with self._lock:
+            for r in rows:
+                name = r.normalized_name or ""
+                pos = self.position(r.id)
+                if pos is not None and self.names[pos] != name:
+                    # re-normalized by rekey_workflows: index it under its new name
+                    self.alive.data[pos] = False
+                    pos = None
+                if pos is None:
+                    pos = self.ids.n
+                    self.names.append(name)
+                    self.display.append(r.workflow_name or "")
+                    self.urls.append(r.source_url or "")
+                    self.platforms.append(self._code(self.platform_labels, r.platform))
+                    self.countries.append(self._code(self.country_labels, r.country))
+                    self.views.append(int(r.views or 0))
+                    self.scores.append(float(r.score or 0))
+                    self.lengths.append(len(name.encode("utf-8")))
+                    self.alive.append(True)
+                    for g in name_grams(name):
+                        self.extra_postings.setdefault(g, []).append(pos)
+                    self._extra_pos[r.id] = pos
+                    # ids last: a reader only sees the row once every column has it
+                    self.ids.append(r.id)
+                    added += 1
+                else:
+                    self.views.data[pos] = int(r.views or 0)
+                    self.scores.data[pos] = float(r.score or 0)
+                    self.display.set(pos, r.workflow_name or "")
+                    self.urls.set(pos, r.source_url or "")
+                    self.alive.data[pos] = True
+                self.watermark = _max_time(self.watermark, r.updated_at)
+                self.rank_watermark = _max_time(self.rank_watermark, getattr(r, "ranked_at", None))
+        return added
+
+    def refresh(self):
+        """
+        Apply every row written since the watermark, and every row rescored since the
+        rankings watermark (rebuild_rankings does not touch workflows.updated_at), both
+        minus REFRESH_OVERLAP. Returns rows read.
+        """
+        written = select(*ROW_COLUMNS).outerjoin(WorkflowRanking, WorkflowRanking.workflow_id == Workflow.id)
+        if self.watermark is not None:
+            written = written.where(Workflow.updated_at >= self.watermark - REFRESH_OVERLAP)
+        rescored = select(*ROW_COLUMNS).join(WorkflowRanking, WorkflowRanking.workflow_id == Workflow.id)
+        if self.rank_watermark is not None:
+            rescored = rescored.where(WorkflowRanking.updated_at >= self.rank_watermark - REFRESH_OVERLAP)
+        n = 0
+        for q in (written, rescored):
+            for page in _pages(q):
+                self.apply_rows(page)
+                n += len(page)
+        return n
+
+    def prune(self):
+        """Mark rows whose id is gone from workflows (merged away by rekey_workflows) dead. Returns rows marked."""
+        # only rows already applied when the scan starts: a later one may commit behind the scan
+        n = self.ids.n
+        live = [np.fromiter((r.id for r in page), dtype=np.int64, count=len(page))
+                for page in _pages(select(Workflow.id), PRUNE_BATCH)]
+        live = np.concatenate(live) if live else np.empty(0, dtype=np.int64)
+        ids = self.ids.data[:n]
+        with self._lock:
+            gone = np.flatnonzero(self.alive.data[:n] & ~np.isin(ids, live))
+            self.alive.data[gone] = False
+        return len(gone)
+
+    # ---- lookup ----
+
+    def _postings(self, g):
+        """Every position carrying gram g, ascending: the snapshot's list, then rows appended since."""
+        span = self.grams.get(g)
+        base = self.postings[span[0]:span[1]] if span is not None else None
+        extra = self.extra_postings.get(g)
+        if not extra:
+            return base
+        extra = np.asarray(extra, dtype=np.int32)
+        return extra if base is None else np.concatenate((base, extra))
+
+    def _visible(self, pos, n, platform, country):
+        """Mask of positions a reader may return: fully appended, alive and inside the filters."""
+        safe = np.minimum(pos, n - 1)
+        keep = (pos < n) & self.alive.data[safe]
+        if platform is not None:
+            keep &= self.platforms.data[safe] == platform
+        if country is not None:
+            keep &= self.countries.data[safe] == country
+        return keep
+
+    def _walk(self, lst, want, visible, within=()):
+        """
+        Visible rows of a posting list that also carry every (gram, postings) of
+        `within`, most popular first, until `want` (read in doubling chunks).
+        """
+        out, found, start, size = [], 0, 0, WALK_CHUNK
+        end = min(len(lst), MAX_WALK)
+        while start < end:
+            pos = lst[start:min(start + size, end)].astype(np.int64)
+            start, size = start + size, size * 2
+            pos = pos[visible(pos)]
+            for g, other in within:
+                pos = pos[self._has(g, other, pos)]
+            pos = pos[:want - found]
+            if len(pos):
+                out.append(pos)
+                found += len(pos)
+                if found >= want:
+                    break
+        return out
+
+    def _bitmap(self, g):
+        """Packed bitmap of the snapshot rows carrying a very common gram (built on first use), else None."""
+        bits = self._bitmaps.get(g)
+        if bits is None:
+            span = self.grams.get(g)
+            base = self.names.base
+            if span is None or (span[1] - span[0]) * BITMAP_SHARE < base:
+                return None
+            dense = np.zeros(base, dtype=bool)
+            dense[self.postings[span[0]:span[1]]] = True
+            bits = self._bitmaps[g] = np.packbits(dense, bitorder="little")
+        return bits
+
+    def _has(self, g, lst, pos):
+        """Mask of positions carrying gram g, whose full postings are `lst`."""
+        bits = self._bitmap(g)
+        if bits is None:
+            return _member(lst, pos)
+        base = self.names.base
+        inside = pos < base
+        if inside.all():
+            return ((bits[pos >> 3] >> (pos & 7)) & 1).astype(bool)
+        out = np.zeros(len(pos), dtype=bool)
+        p = pos[inside]
+        out[inside] = (bits[p >> 3] >> (p & 7)) & 1
+        out[~inside] = _member(lst, pos[~inside])
+        return out
+
+    def _candidates(self, grams, n, size, platform=None, country=None):
+        """
+        Positions of the rows matching the most query grams, filtered before any cut.
+        The shortest lists are read in full, so a row carrying a rare gram is always
+        counted. A row with none of them matches at most the common grams: those lists
+        are only probed, and walked from their most popular end (for rows carrying all of
+        them, then any) while the rare ones leave fewer than MAX_CANDIDATES better rows.
+        """
+        lists = sorted(((g, lst) for g, lst in ((g, self._postings(g)) for g in grams)
+                        if lst is not None and len(lst)), key=lambda gl: len(gl[1]))
+        scanned = total = 0
+        while scanned < len(lists) and total + len(lists[scanned][1]) <= SCAN_POSTINGS:
+            total += len(lists[scanned][1])
+            scanned += 1
+        common = lists[scanned:]
+
+        def visible(pos):
+            return self._visible(pos, n, platform, country)
+
+        def common_hits(pos):
+            hits = np.zeros(len(pos), dtype=np.int64)
+            for g, lst in common:
+                hits += self._has(g, lst, pos)
+            return hits
+
+        pos, hits = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        if scanned:
+            pos, hits = _counted(np.concatenate([lst for _, lst in lists[:scanned]]))
+            keep = visible(pos)
+            pos, hits = pos[keep], hits[keep] + common_hits(pos[keep])
+        if common and np.count_nonzero(hits > len(common)) < MAX_CANDIDATES:
+            # rows carrying every common gram, then rows carrying any of them
+            walked = self._walk(common[0][1], MAX_CANDIDATES, visible, common[1:])
+            if sum(map(len, walked)) < MAX_CANDIDATES:
+                walked += [p for _, lst in common for p in self._walk(lst, MAX_CANDIDATES, visible)]
+            if walked:
+                more = np.unique(np.concatenate(walked))
+                more = more[~np.isin(more, pos)]
+                pos, hits = np.concatenate((pos, more)), np.concatenate((hits, common_hits(more)))
+        if len(pos) <= MAX_CANDIDATES + NEAR_CANDIDATES:
+            return pos
+        # most grams matched, then the most popular now (positions follow the build's scores)
+        popular = np.argpartition(-(hits * 4.0 + self.scores.data[pos]), MAX_CANDIDATES)[:MAX_CANDIDATES]
+        near = np.argpartition(-(hits * 4096.0 - np.abs(self.lengths.data[pos] - size)), NEAR_CANDIDATES)
+        return pos[np.union1d(popular, near[:NEAR_CANDIDATES])]
+
+    def search(self, query, limit=10, platform=None, country=None):
+        """[(row position, similarity 0..100, rank 0..1)], best first."""
+        q = normalize_name(query or "")
+        n = self.ids.n
+        if not q or not n:
+            return []
+        codes = []
+        for value, labels in ((platform, self.platform_labels), (country, self.country_labels)):
+            if value and value not in labels:
+                return []
+            codes.append(labels.index(value) if value else None)
+        pos = self._candidates(query_grams(q), n, len(q.encode("utf-8")), *codes)
+        if not len(pos):
+            return []
+        names = [self.names[int(p)] for p in pos]
+        # each query word scored on its own (word order and typos in one word do not sink a name), then averaged
+        words = process.cdist(q.split(), names, scorer=fuzz.partial_ratio, dtype=np.uint8, workers=1).mean(axis=0)
+        ok = words >= MIN_SIMILARITY
+        pos, words = pos[ok], words[ok]
+        # half of the similarity is the whole name, so the exact title beats longer names holding the same words
+        whole = process.cdist([q], [name for name, k in zip(names, ok) if k], scorer=fuzz.ratio,
+                              dtype=np.uint8, workers=1)[0] if len(pos) else np.empty(0)
+        sims = (words + whole) / 2
+        rank = (1 - POPULARITY_WEIGHT) * sims / 100.0 + POPULARITY_WEIGHT * self.scores.data[pos]
+        best = np.argsort(-rank, kind="stable")[:limit]
+        return [(int(pos[i]), round(float(sims[i]), 1), float(rank[i])) for i in best]
+
+    def result(self, pos, similarity, rank):
+        return {
+            "workflow_id": int(self.ids.data[pos]),
+            "workflow": self.display[pos],
+            "platform": self.platform_labels[self.platforms.data[pos]],
+            "country": self.country_labels[self.countries.data[pos]],
+            "views": int(self.views.data[pos]),
+            "popularity": round(float(self.scores.data[pos]), 6),
+            "similarity": similarity,
+            "rank": round(rank, 6),
+            "source_url": self.urls[pos] or None,
+        }
+
+_index = None
+_started = False
+_start_lock = threading.Lock()
+
+def current_index():
+    """The process-wide index, or None while it is still loading."""
+    start()
+    return _index
+
+def start():
+    """Load (or build and snapshot) the index on a background thread, then keep it fresh. Idempotent."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=_run, name="search-index", daemon=True).start()
+
+def _snapshot_mtime(path=SNAPSHOT_PATH):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def _load_or_build():
+    t0 = time.perf_counter()
+    mtime = _snapshot_mtime()
+    index = SearchIndex.load()
+    if index is None:
+        print("[search] no snapshot, building from MySQL...")
+        index = SearchIndex.build()
+        index.save()
+        mtime = _snapshot_mtime()
+    print(f"[search] {len(index)} rows ready in {time.perf_counter() - t0:.2f}s")
+    return index, mtime
+
+def _run():
+    """
+    Background loop: load the index, apply writes whenever the data version moves,
+    prune deleted rows every PRUNE_SECONDS, and swap in a newer snapshot (written by
+    scripts.build_search_index, re-sorted by current popularity) once it is caught up.
+    """
+    global _index
+    while _index is None:
+        try:
+            _index, mtime = _load_or_build()
+        except Exception as e:
+            print("[search] index load failed:", repr(e))
+            time.sleep(30)
+    version = None
+    pruned_at = time.monotonic()
+    while True:
+        try:
+            newer = _snapshot_mtime()
+            if newer is not None and newer != mtime:
+                index = SearchIndex.load()
+                if index is not None:
+                    index.refresh()
+                    index.prune()
+                    _index = index
+                    print(f"[search] reloaded snapshot: {len(index)} rows")
+                mtime = newer
+            v = current_data_version()
+            if v != version:
+                _index.refresh()
+                version = v
+            if time.monotonic() - pruned_at >= PRUNE_SECONDS:
+                pruned_at = time.monotonic()
+                gone = _index.prune()
+                if gone:
+                    print(f"[search] {gone} deleted rows dropped")
+        except Exception as e:
+            print("[search] refresh failed:", repr(e))
+        time.sleep(REFRESH_SECONDS)
+
+def build_snapshot(path=SNAPSHOT_PATH):
+    """Rebuild the snapshot from MySQL (folds in appended rows, re-sorts by popularity)."""
+    t0 = time.perf_counter()
+    index = SearchIndex.build()
+    index.save(path)
+    print(f"[search] snapshot of {len(index)} rows written to {path} in {time.perf_counter() - t0:.1f}s")
+    return len(index)
@@ -0,0 +1,299 @@
+# bench/run.py — offline benchmarks: collectors against the local stub server, upserts and
+# /workflows against a scratch MySQL database
+# usage: python -m bench.run [--quick] [--out bench_results.json] [--baseline old.json] [--max-regression 0.2]
+#
+# MySQL benchmarks use BENCH_DB_NAME (default n8n_popularity_bench) on the DB_HOST/DB_USER
+# server from .env; its tables are truncated. They are reported as skipped if MySQL is down.
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from bench.stub_server import StubServer
+
+FULL = {"topics": 300, "posts_per_topic": 40, "videos": 1000, "sync_topics": 40,
+        "upsert_rows": 20000, "api_requests": 400, "search_rows": 1000000, "search_queries": 2000}
+QUICK = {"topics": 60, "posts_per_topic": 40, "videos": 200, "sync_topics": 10,
+         "upsert_rows": 2000, "api_requests": 100, "search_rows": 50000, "search_queries": 500}
+
+LATENCY_MS = float(os.getenv("BENCH_LATENCY_MS", "20"))
+RATE_429 = float(os.getenv("BENCH_RATE_429", "0.02"))
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "n8n_popularity_bench")
+
+def _configure(stub):
+    """Point every collector at the stub and the scratch database; must run before they are imported."""
+    if os.getenv("DB_NAME") == BENCH_DB_NAME:
+        raise SystemExit("BENCH_DB_NAME must differ from DB_NAME: the benchmark truncates its tables.")
+    os.environ.update({
+        "DISCOURSE_BASE": stub.url,
+        "YOUTUBE_API_BASE": f"{stub.url}/youtube/v3",
+        "YOUTUBE_API_KEY": "bench",
+        "DISCOURSE_RPS": os.getenv("BENCH_DISCOURSE_RPS", "500"),
+        "HTTP_CACHE": "0",
+        "ARCHIVE": "0",
+        "DB_NAME": BENCH_DB_NAME,
+    })
+
+def _percentiles(samples_ms):
+    q = statistics.quantiles(samples_ms, n=100, method="inclusive")
+    return {"p50_ms": round(q[49], 3), "p99_ms": round(q[98], 3), "mean_ms": round(statistics.fmean(samples_ms), 3)}
+
+def _timed(stub, fn):
+    stub.reset_counters()
+    start = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - start, stub.counters()
+
+# ---- collector benchmarks (stub server only) ----
+
+def bench_forum_async(stub, cfg):
+    from collectors.discourse_async import run_collect_topics
+    from collectors.discourse_collector import topic_metrics_record
+    records = []
+    (ok, failed), secs, http = _timed(stub, lambda: run_collect_topics(
+        stub.topic_ids(), lambda m: records.append(topic_metrics_record(m))))
+    return {"topics": ok, "failed": len(failed), "seconds": round(secs, 3),
+            "topics_per_sec": round(ok / secs, 2), **http}
+
+def bench_forum_sync(stub, cfg):
+    from collectors.discourse_stream import get_topic_metrics
+    ids = stub.topic_ids()[:cfg["sync_topics"]]
+    metrics, secs, http = _timed(stub, lambda: [get_topic_metrics(tid) for tid in ids])
+    return {"topics": len(metrics), "seconds": round(secs, 3), "topics_per_sec": round(len(metrics) / secs, 2), **http}
+
+def bench_forum_listing(stub, cfg):
+    from collectors.discourse_collector import iter_latest_topics
+    topics, secs, http = _timed(stub, lambda: list(iter_latest_topics(max_pages=1000)))
+    return {"topics": len(topics), "seconds": round(secs, 3), "topics_per_sec": round(len(topics) / secs, 2), **http}
+
+def bench_youtube(stub, cfg):
+    from collectors.youtube_collector import search_video_page, fetch_video_stats, video_records
+
+    def run():
+        ids, token = [], None
+        while True:
+            page, token = search_video_page("n8n gmail", region_code="US", page_token=token)
+            ids.extend(page)
+            if not token:
+                break
+        return video_records(fetch_video_stats(ids), {vid: ("US",) for vid in ids})
+
+    records, secs, http = _timed(stub, run)
+    return {"videos": len(records), "seconds": round(secs, 3), "videos_per_sec": round(len(records) / secs, 2), **http}
+
+# ---- in-process benchmarks ----
+
+SEARCH_QUERIES = ["g", "gm", "gmail", "gmail sl", "gmail slack", "gmial slak", "slack webhook", "google sheets sync",
+                  "openai chat", "notion backup", "whatsapp ai agent", "n8n", "hubspot crm", "xyzzy"]
+
+def bench_search(cfg):
+    """/search index over synthetic names: snapshot size, cold load time, query p50/p99."""
+    import random
+    import tempfile
+    from collections import namedtuple
+    from api.search import SearchIndex
+    from normalization import normalize_name
+    Row = namedtuple("Row", "id normalized_name workflow_name platform country views source_url score updated_at")
+    rnd = random.Random(7)
+    services = ["gmail", "slack", "google sheets", "whatsapp", "airtable", "notion", "telegram", "openai",
+                "hubspot", "stripe", "postgres", "github"] + [f"app{i}" for i in range(3000)]
+    verbs = ["sync", "automation", "tutorial", "trigger", "webhook", "backup", "ai agent", "chatbot", "crm"]
+    rows = []
+    for i in range(1, cfg["search_rows"] + 1):
+        title = f"n8n {rnd.choice(services)} {rnd.choice(verbs)} {rnd.choice(services)} {rnd.choice(verbs)}"
+        rows.append(Row(i, normalize_name(title), title, rnd.choice(("YouTube", "Forum", "Google")),
+                        rnd.choice(("US", "IN", "global")), rnd.randrange(10 ** 6), None, rnd.random() ** 3, None))
+    start = time.perf_counter()
+    index = SearchIndex.from_rows(rows)
+    build = time.perf_counter() - start
+    del rows
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "search_index.npz")
+        index.save(path)
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        index = SearchIndex.load(path)
+        load = time.perf_counter() - start
+    samples = []
+    for i in range(cfg["search_queries"]):
+        start = time.perf_counter()
+        index.search(SEARCH_QUERIES[i % len(SEARCH_QUERIES)], limit=10)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return {"rows": len(index), "build_seconds": round(build, 2), "load_seconds": round(load, 3),
+            "snapshot_mb": round(size / 2 ** 20, 1), **_percentiles(samples)}
+
+# ---- database benchmarks ----
+
+def _prepare_database():
+    """Create the scratch database and empty tables; returns None or the reason MySQL is unusable."""
+    from sqlalchemy import create_engine, text
+    from db import DB_USER, DB_PASS, DB_HOST, DB_PORT
+    try:
+        server = create_engine(f"mysql+mysqlconnector://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/")
+        with server.begin() as conn:
+            conn.execute(text(f"CREATE DATABASE IF NOT EXISTS `{BENCH_DB_NAME}` CHARACTER SET utf8mb4"))
+        server.dispose()
+        from db import engine, Base
+        import api.models  # noqa: F401  register tables
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                conn.execute(text(f"TRUNCATE TABLE `{table.name}`"))
+    except Exception as e:
+        return repr(e)
+    return None
+
+def _synthetic_records(n, bump=0):
+    from collectors.bulk_upsert import make_record
+    platforms = ("YouTube", "Forum", "Google")
+    countries = ("US", "IN", "global")
+    return [make_record(platforms[i % 3], f"n8n workflow {i} gmail slack sheets", countries[i % 3],
+                        {"bench": i}, source_url=f"https://example.com/{i}",
+                        views=1000 + i + bump, likes=i % 97, comments=i % 13, replies=i % 7, contributors=i % 5)
+            for i in range(n)]
+
+def bench_upsert(cfg):
+    from collectors.bulk_upsert import BulkWriter
+    out = {}
+    for phase, bump in (("insert", 0), ("update", 500)):
+        records = _synthetic_records(cfg["upsert_rows"], bump)
+        with BulkWriter(label=f"bench {phase}") as w:
+            for r in records:
+                w.add(r)
+        out[f"{phase}_rows_per_sec"] = round(w.rows_per_sec, 1)
+        out[f"{phase}_batches"] = w.batches
+    out["rows"] = cfg["upsert_rows"]
+    return out
+
+def _api_paths(client, n):
+    """A request mix over every filter combination, following next_cursor like a pager does."""
+    filters = ["", "platform=YouTube&", "country=US&", "platform=Forum&country=global&"]
+    paths = []
+    for f in filters:
+        cursor = None
+        for _ in range(max(1, n // (2 * len(filters)))):
+            path = f"/workflows?{f}limit=50" + (f"&cursor={cursor}" if cursor else "")
+            paths.append(path)
+            cursor = client.get(path).json().get("next_cursor")
+            if not cursor:
+                break
+    return paths
+
+def bench_workflows_api(cfg):
+    from fastapi.testclient import TestClient
+    import api.main as main
+    from api.cache import ResponseCache
+    client = TestClient(main.app)
+    cache = main._workflows_cache
+    main._workflows_cache = ResponseCache(max_entries=0)  # every request misses
+    try:
+        paths = _api_paths(client, cfg["api_requests"])
+        out = {}
+        for label, store in (("miss", main._workflows_cache), ("hit", ResponseCache(max_entries=1024))):
+            main._workflows_cache = store
+            if label == "hit":
+                for p in paths:
+                    client.get(p)
+            samples = []
+            for i in range(cfg["api_requests"]):
+                start = time.perf_counter()
+                r = client.get(paths[i % len(paths)])
+                samples.append((time.perf_counter() - start) * 1000.0)
+                r.raise_for_status()
+            out.update({f"{label}_{k}": v for k, v in _percentiles(samples).items()})
+        out["requests"] = cfg["api_requests"]
+        return out
+    finally:
+        main._workflows_cache = cache
+
+# ---- report ----
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def compare(results, baseline, max_regression):
+    """Metrics that got worse than `max_regression` (a share): *_per_sec down, *_ms up."""
+    regressions = []
+    for name, metrics in results.items():
+        old = baseline.get(name) or {}
+        for key, value in metrics.items():
+            before = old.get(key)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                continue
+            if key.endswith("_per_sec"):
+                change = (before - value) / before
+            elif key.endswith("_ms"):
+                change = (value - before) / before
+            else:
+                continue
+            if change > max_regression:
+                regressions.append(f"{name}.{key}: {before} -> {value} ({change:+.0%} worse)")
+    return regressions
+
+def _option(args, name, default=None):
+    if name in args:
+        i = args.index(name)
+        value = args[i + 1]
+        del args[i:i + 2]
+        return value
+    return default
+
+def main(args):
+    cfg = QUICK if "--quick" in args else FULL
+    out_path = _option(args, "--out", "bench_results.json")
+    baseline_path = _option(args, "--baseline")
+    max_regression = float(_option(args, "--max-regression", "0.2"))
+
+    stub = StubServer(topics=cfg["topics"], posts_per_topic=cfg["posts_per_topic"], videos=cfg["videos"],
+                      latency_ms=LATENCY_MS, rate_429=RATE_429).start()
+    _configure(stub)
+    results = {}
+    try:
+        for name, fn in (("forum_async", bench_forum_async), ("forum_sync", bench_forum_sync),
+                         ("forum_listing", bench_forum_listing), ("youtube", bench_youtube)):
+            print(f"[bench] {name}...")
+            results[name] = fn(stub, cfg)
+    finally:
+        stub.stop()
+
+    print("[bench] search...")
+    results["search"] = bench_search(cfg)
+
+    skipped = _prepare_database()
+    for name, fn in (("upsert", bench_upsert), ("workflows_api", bench_workflows_api)):
+        print(f"[bench] {name}...")
+        results[name] = {"skipped": skipped} if skipped else fn(cfg)
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": dict(cfg, latency_ms=LATENCY_MS, rate_429=RATE_429, discourse_rps=os.environ["DISCOURSE_RPS"]),
+        "results": results,
+    }
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"[bench] results written to {out_path}")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], max_regression)
+        for line in regressions:
+            print("[bench] REGRESSION", line)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
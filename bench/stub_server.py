@@ -0,0 +1,187 @@
+# bench/stub_server.py — local stand-in for the Discourse forum and the YouTube Data API
+import copy
+import json
+import os
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+PAGE_SIZE = 30
+EMBEDDED_POSTS = 20
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return json.load(f)
+
+class StubServer:
+    """
+    Serves the recorded fixtures, expanded to `topics` forum topics of `posts_per_topic`
+    posts and `videos` YouTube videos, on 127.0.0.1. Every response waits `latency_ms`
+    (+/- 20% jitter) and a `rate_429` share of forum requests answers 429 with Retry-After
+    (YouTube signals quota with 403s, which the collectors do not retry).
+    Counts requests, 429s and bytes sent for the benchmark report.
+    """
+
+    def __init__(self, topics=200, posts_per_topic=40, videos=500, latency_ms=20.0, rate_429=0.0,
+                 retry_after=0, seed=42):
+        self.topics = topics
+        self.posts_per_topic = posts_per_topic
+        self.videos = videos
+        self.latency_ms = latency_ms
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = self.throttled = self.bytes_sent = 0
+        self._latest = _fixture("latest.json")
+        self._topic = _fixture("topic.json")
+        self._search = _fixture("youtube_search.json")
+        self._videos = _fixture("youtube_videos.json")
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._httpd.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = self.throttled = self.bytes_sent = 0
+
+    def counters(self):
+        with self._lock:
+            return {"requests": self.requests, "throttled_429": self.throttled, "bytes_sent": self.bytes_sent}
+
+    # ---- payloads ----
+
+    def topic_ids(self):
+        return list(range(1, self.topics + 1))
+
+    def _list_topic(self, tid):
+        t = copy.deepcopy(self._latest["topic_list"]["topics"][0])
+        t.update(id=tid, title=f"{t['title']} #{tid}", slug=f"{t['slug']}-{tid}", views=100 + tid * 7,
+                 posts_count=self.posts_per_topic, bumped_at=f"2026-10-01T10:{tid % 60:02d}:00.000Z")
+        return t
+
+    def latest(self, page):
+        ids = self.topic_ids()[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+        body = copy.deepcopy(self._latest)
+        body["topic_list"]["topics"] = [self._list_topic(tid) for tid in ids]
+        if not ids:
+            body["topic_list"].pop("more_topics_url", None)
+        return body
+
+    def _post(self, tid, pid):
+        template = self._topic["post_stream"]["posts"]
+        p = copy.deepcopy(template[pid % len(template)])
+        p.update(id=tid * 100000 + pid, post_number=pid, topic_id=tid)
+        p["actions_summary"] = [{"id": 2, "count": pid % 3}]
+        return p
+
+    def topic(self, tid):
+        body = copy.deepcopy(self._topic)
+        n = self.posts_per_topic
+        body.update(id=tid, title=f"{body['title']} #{tid}", slug=f"{body['slug']}-{tid}",
+                    views=100 + tid * 7, posts_count=n, highest_post_number=n)
+        body["post_stream"] = {"posts": [self._post(tid, i) for i in range(1, min(n, EMBEDDED_POSTS) + 1)],
+                               "stream": [tid * 100000 + i for i in range(1, n + 1)]}
+        return body
+
+    def posts(self, tid, post_ids):
+        return {"post_stream": {"posts": [self._post(tid, pid - tid * 100000) for pid in post_ids]}, "id": tid}
+
+    def search(self, page_token):
+        page = int(page_token or 0)
+        body = copy.deepcopy(self._search)
+        template = body["items"][0]
+        start = page * 50
+        body["items"] = []
+        for i in range(start, min(start + 50, self.videos)):
+            it = copy.deepcopy(template)
+            it["id"]["videoId"] = f"vid{i:08d}"
+            body["items"].append(it)
+        if start + 50 < self.videos:
+            body["nextPageToken"] = str(page + 1)
+        else:
+            body.pop("nextPageToken", None)
+        return body
+
+    def video_list(self, ids):
+        body = copy.deepcopy(self._videos)
+        template = body["items"][0]
+        body["items"] = []
+        for n, vid in enumerate(ids):
+            it = copy.deepcopy(template)
+            it["id"] = vid
+            it["snippet"]["title"] = f"{template['snippet']['title']} {vid}"
+            it["statistics"]["viewCount"] = str(1000 + n * 13)
+            body["items"].append(it)
+        return body
+
+    # ---- HTTP ----
+
+    def _route(self, path, query):
+        if path == "/latest.json":
+            return self.latest(int(query.get("page", ["0"])[0]))
+        if path.startswith("/t/") and path.endswith("/posts.json"):
+            return self.posts(int(path.split("/")[2]), [int(p) for p in query.get("post_ids[]", [])])
+        if path.startswith("/t/") and path.endswith(".json"):
+            tid = int(path[3:-5])
+            return self.topic(tid) if 1 <= tid <= self.topics else None
+        if path.endswith("/youtube/v3/search"):
+            return self.search(query.get("pageToken", [None])[0])
+        if path.endswith("/youtube/v3/videos"):
+            return self.video_list(query.get("id", [""])[0].split(","))
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, body=b"", headers=()):
+                self.send_response(code)
+                for k, v in headers:
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.bytes_sent += len(body)
+
+            def do_GET(self):
+                u = urlparse(self.path)
+                with server._lock:
+                    server.requests += 1
+                    throttle = "/youtube/" not in u.path and server._random.random() < server.rate_429
+                    jitter = server._random.uniform(0.8, 1.2)
+                if server.latency_ms:
+                    time.sleep(server.latency_ms * jitter / 1000.0)
+                if throttle:
+                    with server._lock:
+                        server.throttled += 1
+                    return self._send(429, b'{"errors":["rate limited"]}',
+                                      [("Retry-After", str(server.retry_after)), ("Content-Type", "application/json")])
+                body = server._route(u.path, parse_qs(u.query))
+                if body is None:
+                    return self._send(404, b'{"errors":["not found"]}', [("Content-Type", "application/json")])
+                self._send(200, json.dumps(body).encode("utf-8"), [("Content-Type", "application/json")])
+
+        return Handler
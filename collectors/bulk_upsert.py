@@ -0,0 +1,252 @@
+# collectors/bulk_upsert.py
+import random
+import time
+from sqlalchemy import func, select, update, bindparam
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects.mysql import insert
+from db import engine
+from api.models import Workflow, WorkflowRanking
+from normalization import normalize_name, normalize_many, name_key
+from analytics import rankings, history, stats_rollups
+from api.cache import bump_data_version
+import metrics
+
+METRIC_COLUMNS = ("views", "likes", "comments", "replies", "contributors")
+# MySQL deadlock / lock wait timeout, or a new key another writer inserted first (_upsert_batch):
+# concurrent writers (queue workers) retry the batch
+RETRY_ERRNOS = (1213, 1205, 1062)
+WRITE_RETRIES = 4
+# how an existing row's metrics take a record's: "max" (collectors) or "replace" (archive replay)
+MERGES = ("max", "replace")
+
+def make_record(platform, title, country, evidence, source_url=None,
+                views=0, likes=0, comments=0, replies=0, contributors=0, normalized=None):
+    """Build one normalized record; every record has the same keys so batches can be multi-row."""
+    if normalized is None:
+        normalized = normalize_name(title)
+    return {
+        "workflow_name": title,
+        "normalized_name": normalized,
+        "name_key": name_key(platform, country, normalized),
+        "platform": platform,
+        "country": country,
+        "evidence": evidence,
+        "source_url": source_url,
+        "views": int(views or 0),
+        "likes": int(likes or 0),
+        "comments": int(comments or 0),
+        "replies": int(replies or 0),
+        "contributors": int(contributors or 0),
+    }
+
+def make_records(fields):
+    """make_record over a collector page ([make_record kwargs]), the titles normalized as one batch."""
+    fields = list(fields)
+    names = normalize_many(f["title"] for f in fields)
+    return [make_record(normalized=name, **f) for f, name in zip(fields, names)]
+
+def identity(row):
+    """What makes a workflows row unique (uq_workflows_identity); name_key is only its hash."""
+    return row["platform"], row["country"], row["normalized_name"]
+
+def upsert_records(records, history_snapshots=True, merge="max"):
+    """
+    Write a batch of normalized workflow records (see video_record / topic_metrics_record /
+    trend_record) as one multi-row INSERT ... ON DUPLICATE KEY UPDATE on (platform, country,
+    normalized_name); lookups go through name_key, its hash. Metrics only ever grow, the same
+    max() merge the per-row upserts used; name, evidence and url take the latest value.
+    merge="replace" overwrites the metrics instead, so a corrected extraction replayed
+    from the archive can lower them. Returns the number of records sent.
+
+    Rows are sent in key order so concurrent writers take index locks in the same
+    order, and a batch that still hits a deadlock is retried with backoff. The
+    transaction runs at READ COMMITTED, so reading the rows a batch is about to
+    change (stats_rollups.rows_before) takes no gap locks.
+    history_snapshots=False skips the metrics history (archive replay re-derives
+    current values; a snapshot stamped "now" would misdate them).
+    """
+    if merge not in MERGES:
+        raise ValueError(f"merge must be one of {MERGES}, not {merge!r}")
+    if not records:
+        return 0
+    records = sorted(records, key=lambda r: r["name_key"])
+    start = time.perf_counter()
+    metrics.DB_UPSERT_ROWS.labels("workflows").observe(len(records))
+    for attempt in range(WRITE_RETRIES):
+        try:
+            n = _upsert_batch(records, history_snapshots, merge)
+            metrics.DB_UPSERT_SECONDS.labels("workflows").observe(time.perf_counter() - start)
+            return n
+        except DBAPIError as e:
+            if getattr(e.orig, "errno", None) not in RETRY_ERRNOS or attempt == WRITE_RETRIES - 1:
+                raise
+            metrics.DB_WRITE_RETRIES.labels("workflows").inc()
+            time.sleep(0.05 * 2 ** attempt + random.random() * 0.05)
+
+def _merge_upsert(records, merge="max"):
+    stmt = insert(Workflow).values(records)
+    new = stmt.inserted
+    if merge == "replace":
+        update = {c: getattr(new, c) for c in METRIC_COLUMNS}
+    else:
+        update = {c: func.greatest(func.coalesce(getattr(Workflow, c), 0), getattr(new, c)) for c in METRIC_COLUMNS}
+    update["workflow_name"] = new.workflow_name
+    update["evidence"] = new.evidence
+    update["source_url"] = func.coalesce(new.source_url, Workflow.source_url)
+    update["updated_at"] = func.now()
+    return stmt.on_duplicate_key_update(**update)
+
+def _upsert_batch(records, history_snapshots, merge):
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="READ COMMITTED")
+        with conn.begin():
+            before = stats_rollups.rows_before(conn, records)
+            # keys the locking read did not find are inserted with a plain INSERT: if another
+            # writer created one since, it fails with 1062 and the batch is retried, now
+            # reading that row, instead of merging into it as if it were new
+            known = {identity(r._mapping) for r in before.values()}
+            fresh, merged = [], []
+            for r in records:
+                if identity(r) in known:
+                    merged.append(r)
+                else:
+                    fresh.append(r)
+                    known.add(identity(r))
+            if fresh:
+                conn.execute(insert(Workflow).values(fresh))
+            if merged:
+                conn.execute(_merge_upsert(merged, merge))
+            rows = _written_rows(conn, records)
+            rankings.refresh_rows(conn, rows)
+            if history_snapshots:
+                history.record_snapshots(conn, rows)
+            stats_rollups.apply_deltas(conn, before, rows)
+            bump_data_version(conn)
+    return len(records)
+
+def _written_rows(conn, records):
+    """Re-read the merged rows for a batch (ids + current metrics) for derived tables."""
+    keys = list({r["name_key"] for r in records})
+    idents = {identity(r) for r in records}
+    rows = conn.execute(select(*rankings.ROW_COLUMNS, Workflow.normalized_name)
+                        .where(Workflow.name_key.in_(keys))).all()
+    # a row that only shares a name_key with the batch (hash collision) was not written
+    return [r for r in rows if identity(r._mapping) in idents]
+
+def rekey_workflows(batch_size=5000):
+    """
+    Recompute normalized_name and name_key for every existing row (after a change to
+    normalization). Rows that now have the same (platform, country, normalized_name)
+    as an older row are folded into it and deleted: metrics merged with max(), history
+    moved over (analytics.history.merge_history), canonical_id references re-pointed.
+    Rebuild rankings and stats afterwards (scripts.rekey_workflows does).
+    Returns (rows rekeyed, rows merged).
+    """
+    seen = {}
+    merges = []
+    rekeyed = 0
+    last_id = 0
+    stmt = update(Workflow).where(Workflow.id == bindparam("b_id")) \
+        .values(normalized_name=bindparam("b_name"), name_key=bindparam("b_key"))
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select(Workflow.id, Workflow.platform, Workflow.country, Workflow.workflow_name)
+                                .where(Workflow.id > last_id).order_by(Workflow.id).limit(batch_size)).all()
+            if not rows:
+                break
+            values = []
+            for r, name in zip(rows, normalize_many(r.workflow_name for r in rows)):
+                key = name_key(r.platform, r.country, name)
+                keep = seen.setdefault((r.platform, r.country, name), r.id)
+                if keep != r.id:
+                    merges.append((r.id, keep))
+                else:
+                    values.append({"b_id": r.id, "b_name": name, "b_key": key})
+            if values:
+                conn.execute(stmt, values)
+            rekeyed += len(values)
+        last_id = rows[-1].id
+
+    for dup, keep in merges:
+        with engine.begin() as conn:
+            d = conn.execute(select(*[getattr(Workflow, c) for c in METRIC_COLUMNS]).where(Workflow.id == dup)).one()
+            conn.execute(update(Workflow).where(Workflow.id == keep).values(
+                {c: func.greatest(func.coalesce(getattr(Workflow, c), 0), int(getattr(d, c) or 0)) for c in METRIC_COLUMNS}))
+            history.merge_history(conn, dup, keep)
+            # rows resolved to dup (analytics.entity_resolution) now resolve to keep's entity
+            canonical = conn.execute(select(Workflow.canonical_id).where(Workflow.id == keep)).scalar()
+            moved = conn.execute(update(Workflow).where(Workflow.canonical_id == dup, Workflow.id != dup)
+                                 .values(canonical_id=canonical or keep)).rowcount
+            if moved and canonical is None:
+                conn.execute(update(Workflow).where(Workflow.id == keep).values(canonical_id=keep))
+            conn.execute(WorkflowRanking.__table__.delete().where(WorkflowRanking.workflow_id == dup))
+            conn.execute(Workflow.__table__.delete().where(Workflow.id == dup))
+    print(f"[rekey] {rekeyed} rows rekeyed, {len(merges)} duplicates merged.")
+    return rekeyed, len(merges)
+
+class BulkWriter:
+    """
+    Buffers records and flushes them through upsert_records in batches.
+    Use as a context manager so the tail batch is flushed and throughput is reported:
+
+        with BulkWriter(label="youtube") as w:
+            for item in items:
+                w.add(video_record(item, country="US"))
+    """
+
+    def __init__(self, batch_size=500, label="bulk", history_snapshots=True, merge="max"):
+        self.batch_size = batch_size
+        self.label = label
+        self.history_snapshots = history_snapshots
+        self.merge = merge
+        self.rows = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self._buf = []
+
+    def add(self, record):
+        self._buf.append(record)
+        if len(self._buf) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffer. If the upsert raises, the records go back to the front of the
+        buffer before the error propagates: a caller that sees flush() (or the add() that
+        triggered it) fail knows nothing since its last successful flush is in MySQL.
+        """
+        if not self._buf:
+            return 0
+        buf, self._buf = self._buf, []
+        start = time.perf_counter()
+        try:
+            n = upsert_records(buf, history_snapshots=self.history_snapshots, merge=self.merge)
+        except Exception:
+            self._buf[:0] = buf
+            raise
+        self.seconds += time.perf_counter() - start
+        self.rows += n
+        self.batches += 1
+        return n
+
+    def discard(self):
+        """Drop buffered records (after a failed flush, once their work is handed back for a retry)."""
+        n, self._buf = len(self._buf), []
+        return n
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def report(self):
+        return (f"[{self.label}] {self.rows} rows in {self.batches} batches, "
+                f"{self.seconds:.2f}s ({self.rows_per_sec:.0f} rows/s)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # flush what we have even on error so completed fetches are not lost
+        self.flush()
+        print(self.report())
+        return False
@@ -0,0 +1,121 @@
+# collectors/discourse_async.py
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from collectors.discourse_collector import BASE, HEADERS, _limiter
+from collectors.discourse_stream import (
+    TopicMetricsParser, TopicArchiver, posts_batches, conditional, revalidated, CHUNK_BYTES
+)
+from collectors.payload_archive import ARCHIVE_ENABLED
+import metrics
+
+CONCURRENCY = int(os.getenv("DISCOURSE_CONCURRENCY", "8"))
+
+async def _aget_with_retries(client, url, params=None, max_retries=5, headers=None):
+    # returns an open streamed response (a 304 as it is); the caller closes it
+    attempt = 0
+    while attempt < max_retries:
+        attempt += 1
+        await _limiter.acquire_async()
+        start = time.perf_counter()
+        try:
+            request = client.build_request("GET", url, params=params, headers=headers)
+            resp = await client.send(request, stream=True)
+        except httpx.HTTPError as e:
+            metrics.observe_http("forum", url, start, "error")
+            print(f"[discourse aGET] attempt {attempt} failed for {url}: {repr(e)}")
+            if attempt < max_retries:
+                metrics.retried("forum", "error")
+            _limiter.penalize(min(2 ** attempt, 30))
+            continue
+        pause = _limiter.on_response(resp.status_code, resp.headers)
+        metrics.observe_http("forum", url, start, resp.status_code)
+        if resp.status_code < 400:
+            return resp
+        code = resp.status_code
+        await resp.aclose()
+        print(f"[discourse aGET] attempt {attempt} failed for {url}: HTTP {code}")
+        if 400 <= code < 500 and code != 429:
+            print(f"[discourse] non-retriable HTTP {code} for {url}")
+            break
+        if attempt < max_retries:
+            metrics.retried("forum", code)
+        if not pause:
+            _limiter.penalize(min(2 ** attempt, 30))
+    return None
+
+async def _astream_parse(client, url, params=None):
+    key, entry, headers = conditional(url, params)
+    resp = await _aget_with_retries(client, url, params=params, headers=headers)
+    if resp is None:
+        raise RuntimeError(f"Failed to fetch {url} after retries.")
+    if resp.status_code == 304:
+        await resp.aclose()
+        return revalidated(key, entry)
+    parser = TopicMetricsParser(keep_raw=ARCHIVE_ENABLED)
+    try:
+        async for chunk in resp.aiter_bytes(CHUNK_BYTES):
+            parser.feed(chunk)
+    finally:
+        await resp.aclose()
+    metrics.count_bytes("forum", url, parser.bytes)
+    return parser.close().cacheable(key, url, resp.headers)
+
+async def get_topic_metrics_async(client, topic_id):
+    """Async discourse_stream.get_topic_metrics: the topic, then its unembedded posts, conditionally."""
+    topic = await _astream_parse(client, f"{BASE}/t/{topic_id}.json")
+    if topic.from_cache:
+        return topic.metrics()
+    batches = list(posts_batches(topic.missing_post_ids()))
+    archiver = TopicArchiver(topic_id)
+    archiver.topic(topic, len(batches))
+    for params in batches:
+        part = await _astream_parse(client, f"{BASE}/t/{topic_id}/posts.json", params=params)
+        archiver.posts(part)
+        if not part.from_cache:
+            part.remember()
+        topic.absorb(part)
+    topic.remember()
+    return topic.metrics()
+
+async def collect_topics(topic_ids, handle, concurrency=CONCURRENCY):
+    """
+    Fetch topic metrics (get_topic_metrics_async) concurrently over one pooled client
+    and pass each to handle(). handle runs on a single writer thread so DB writes stay serial and
+    never block the event loop. Returns (ok_count, failed_topic_ids).
+    """
+    queue = asyncio.Queue()
+    for tid in topic_ids:
+        queue.put_nowait(tid)
+    loop = asyncio.get_running_loop()
+    writer = ThreadPoolExecutor(max_workers=1)
+    ok, failed = 0, []
+
+    async def worker(client):
+        nonlocal ok
+        while True:
+            try:
+                tid = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                m = await get_topic_metrics_async(client, tid)
+                await loop.run_in_executor(writer, handle, m)
+                ok += 1
+            except Exception as ex:
+                print(f"Forum topic error for ID {tid}:", ex)
+                failed.append(tid)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    try:
+        async with httpx.AsyncClient(headers=HEADERS, limits=limits, timeout=40) as client:
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    finally:
+        writer.shutdown(wait=True)
+    return ok, failed
+
+def run_collect_topics(topic_ids, handle, concurrency=CONCURRENCY):
+    """Blocking entry point for scripts."""
+    return asyncio.run(collect_topics(topic_ids, handle, concurrency=concurrency))
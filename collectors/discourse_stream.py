@@ -0,0 +1,256 @@
+# collectors/discourse_stream.py
+import os
+import json
+import uuid
+from array import array
+import ijson
+from collectors.discourse_collector import BASE, _get_with_retries
+from collectors.payload_archive import ARCHIVE_ENABLED, archive_payload
+from collectors.http_cache import HttpCache, default_cache
+import metrics
+
+# post ids per /t/{id}/posts.json request (Discourse serves 20 posts per chunk by default)
+POSTS_BATCH = int(os.getenv("DISCOURSE_POSTS_BATCH", "20"))
+CHUNK_BYTES = 64 * 1024
+
+_TOPIC_FIELDS = {"id", "title", "slug", "views", "posts_count", "participant_count"}
+_POST = "post_stream.posts.item"
+_LIKE_ACTION = 2
+
+class TopicMetricsParser:
+    """
+    Push parser for a /t/{id}.json or /t/{id}/posts.json body: feed() it byte chunks as
+    they arrive. Only the counters we store are kept: top-level topic fields, likes per
+    post, and the ids in post_stream.stream that were not embedded in the response.
+    Nothing else of the document (cooked HTML, user objects...) is materialized, unless
+    keep_raw is set to hold this one response's bytes for the payload archive.
+    """
+
+    def __init__(self, keep_raw=False):
+        self.topic = {}
+        self.likes = 0
+        self.posts_seen = 0
+        self.posters = 0
+        self.bytes = 0
+        self._embedded = set()
+        self._stream = array("q")
+        self._post = None
+        self._action = None
+        self._raw = [] if keep_raw else None
+        self._cache = None
+        self.from_cache = False
+        # [fetch id, part] of the archived body the counters were parsed from (TopicArchiver.posts)
+        self.ref = None
+        self._events = ijson.sendable_list()
+        self._coro = ijson.parse_coro(self._events)
+
+    def feed(self, chunk):
+        self.bytes += len(chunk)
+        if self._raw is not None:
+            self._raw.append(chunk)
+        self._coro.send(chunk)
+        self._drain()
+
+    def close(self):
+        self._coro.close()
+        self._drain()
+        return self
+
+    def feed_all(self, body):
+        """Parse a complete body (archive replay)."""
+        for i in range(0, len(body), CHUNK_BYTES):
+            self.feed(body[i:i + CHUNK_BYTES])
+        return self.close()
+
+    @classmethod
+    def restore(cls, counters):
+        """A parser holding counters() stored for a response that came back 304."""
+        p = cls()
+        p.topic = counters["topic"]
+        p.likes, p.posts_seen, p.posters = counters["likes"], counters["posts"], counters["posters"]
+        p.ref = counters.get("ref")
+        p.from_cache = True
+        return p
+
+    def counters(self):
+        return {"topic": self.topic, "likes": self.likes, "posts": self.posts_seen, "posters": self.posters,
+                "ref": self.ref}
+
+    def cacheable(self, key, url, headers):
+        """Keep the response's validators so remember() can store the counters once they are final."""
+        validators = {h: headers[h] for h in ("ETag", "Last-Modified") if h in headers}
+        self._cache = (key, url, validators) if key and validators else None
+        return self
+
+    def remember(self):
+        """Store counters() under the response's validators, for the next conditional fetch."""
+        if self._cache is not None:
+            key, url, validators = self._cache
+            default_cache().store(key, url, validators, json.dumps(self.counters()).encode())
+
+    def absorb(self, other):
+        """Add the likes / posts / bytes of a follow-up posts.json parser."""
+        self.likes += other.likes
+        self.posts_seen += other.posts_seen
+        self.bytes += other.bytes
+        return self
+
+    def metrics(self):
+        """The counters topic_metrics_record takes."""
+        t = self.topic
+        return {
+            "id": t.get("id"),
+            "title": t.get("title"),
+            "slug": t.get("slug"),
+            "views": int(t.get("views") or 0),
+            "posts_count": int(t.get("posts_count") or 0),
+            "contributors": int(t.get("participant_count") or self.posters),
+            "likes": self.likes,
+            "posts_scanned": self.posts_seen,
+            "bytes": self.bytes,
+        }
+
+    def raw(self):
+        """The response bytes kept with keep_raw; the buffer is released."""
+        raw, self._raw = b"".join(self._raw or ()), None
+        return raw
+
+    def missing_post_ids(self):
+        """Ids from post_stream.stream whose posts were not in the parsed body."""
+        return [pid for pid in self._stream if pid not in self._embedded]
+
+    def _drain(self):
+        for prefix, event, value in self._events:
+            self._on(prefix, event, value)
+        del self._events[:]
+
+    def _on(self, prefix, event, value):
+        if prefix == _POST:
+            if event == "start_map":
+                self._post = {}
+            elif event == "end_map":
+                self._end_post()
+        elif prefix.startswith(_POST + "."):
+            self._on_post_field(prefix[len(_POST) + 1:], event, value)
+        elif prefix == "post_stream.stream.item":
+            self._stream.append(int(value))
+        elif prefix == "posters.item" and event == "start_map":
+            self.posters += 1
+        elif prefix in _TOPIC_FIELDS and event in ("string", "number"):
+            self.topic[prefix] = value
+
+    def _on_post_field(self, field, event, value):
+        post = self._post
+        if field == "id":
+            self._embedded.add(int(value))
+        elif field in ("like_count", "action_counts.like"):
+            post[field] = int(value or 0)
+        elif field == "actions_summary.item":
+            if event == "start_map":
+                self._action = {}
+            elif event == "end_map":
+                if self._action.get("id") == _LIKE_ACTION:
+                    post["actions_summary"] = post.get("actions_summary", 0) + int(self._action.get("count") or 0)
+                self._action = None
+        elif field in ("actions_summary.item.id", "actions_summary.item.count") and self._action is not None:
+            self._action[field.rsplit(".", 1)[1]] = value
+
+    def _end_post(self):
+        # a post counts its likes from action_counts, else like_count, else actions_summary
+        post = self._post
+        for key in ("action_counts.like", "like_count", "actions_summary"):
+            if key in post:
+                self.likes += post[key]
+                break
+        self.posts_seen += 1
+        self._post = None
+
+def posts_batches(post_ids, size=POSTS_BATCH):
+    for i in range(0, len(post_ids), size):
+        yield [("post_ids[]", pid) for pid in post_ids[i:i + size]]
+
+class TopicArchiver:
+    """
+    Archives the responses of one topic fetch: the topic page (with the number of
+    posts.json parts that follow) and each posts.json part, tied by a fetch id so
+    replay only uses fetches that completed. A part that came back 304 has no body: it
+    is archived as forum_posts_cached, holding the cached counters and the reference
+    of the archived part they were parsed from.
+    """
+
+    def __init__(self, topic_id, country="global"):
+        self.meta = {"fetch": uuid.uuid4().hex, "topic_id": topic_id, "country": country}
+        self.part = 0
+
+    def topic(self, parser, parts):
+        archive_payload("forum", "forum_topic", parser.raw(), dict(self.meta, parts=parts))
+
+    def posts(self, parser):
+        self.part += 1
+        meta = dict(self.meta, part=self.part)
+        if parser.from_cache:
+            archive_payload("forum", "forum_posts_cached", json.dumps(parser.counters()), meta)
+        else:
+            archive_payload("forum", "forum_posts", parser.raw(), meta)
+            parser.ref = [self.meta["fetch"], self.part]
+
+def conditional(url, params=None):
+    """
+    (cache key, entry, request headers) for a streamed fetch. Streamed bodies are never
+    kept: the entry holds the parser counters of the last 200 with its ETag / Last-Modified,
+    so a 304 needs no parsing at all. The key is apart from cached_get's for the same url.
+    """
+    cache = default_cache()
+    if cache is None:
+        return None, None, {}
+    key = HttpCache.key_for(url, params) + "#counters"
+    entry = cache.lookup(key)
+    return key, entry, HttpCache.validators(entry)
+
+def revalidated(key, entry):
+    default_cache().revalidated(key)
+    return TopicMetricsParser.restore(json.loads(entry.body))
+
+def _stream_parse(url, params=None):
+    key, entry, headers = conditional(url, params)
+    resp = _get_with_retries(url, params=params, max_retries=5, timeout=40, stream=True, headers=headers)
+    if resp is None:
+        raise RuntimeError(f"Failed to fetch {url} after retries.")
+    if resp.status_code == 304:
+        resp.close()
+        return revalidated(key, entry)
+    parser = TopicMetricsParser(keep_raw=ARCHIVE_ENABLED)
+    try:
+        for chunk in resp.iter_content(chunk_size=CHUNK_BYTES):
+            parser.feed(chunk)
+    finally:
+        resp.close()
+    metrics.count_bytes("forum", url, parser.bytes)
+    return parser.close().cacheable(key, url, resp.headers)
+
+def get_topic_metrics(topic_id):
+    """
+    Stream /t/{id}.json, then every post it did not embed through batched
+    /t/{id}/posts.json?post_ids[]= requests, so likes are counted on the whole thread.
+    Memory stays flat apart from the list of post ids (8 bytes per post).
+
+    Every request is conditional (conditional()). The topic's counters are stored only
+    once all its parts are absorbed, so a 304 on the topic page stands for the whole
+    thread: the page carries views, posts_count and the topic's like_count, and the
+    last archived fetch still holds them. Parts are archived whether they are 200 or
+    304 (TopicArchiver.posts), so replay can rebuild every fetch that got past the page.
+    """
+    topic = _stream_parse(f"{BASE}/t/{topic_id}.json")
+    if topic.from_cache:
+        return topic.metrics()
+    batches = list(posts_batches(topic.missing_post_ids()))
+    archiver = TopicArchiver(topic_id)
+    archiver.topic(topic, len(batches))
+    for params in batches:
+        part = _stream_parse(f"{BASE}/t/{topic_id}/posts.json", params=params)
+        archiver.posts(part)
+        if not part.from_cache:
+            part.remember()
+        topic.absorb(part)
+    topic.remember()
+    return topic.metrics()
@@ -0,0 +1,80 @@
+# collectors/forum_sync.py
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert
+from db import SessionLocal, engine
+from api.models import ForumTopicState
+from collectors.discourse_collector import get_latest_topics
+from collectors.sync_state import load_state, save_state
+
+SOURCE = "forum"
+
+def _fingerprint(t):
+    return (t.get("bumped_at"), int(t.get("views") or 0), int(t.get("posts_count") or 0))
+
+def plan_incremental(max_pages=50):
+    """
+    Page through latest.json (newest bump first) until a page reaches topics bumped at or
+    before the stored watermark, then compare each listed topic's bumped_at/views/posts_count
+    with what we stored last time. Returns (changed_topic_ids, listed) where listed maps
+    topic id -> list-payload row for mark_synced.
+    """
+    watermark = load_state(SOURCE).get("bumped_at")
+    listed = {}
+    for page in range(max_pages):
+        topics = get_latest_topics(page)
+        if not topics:
+            break
+        reached = False
+        for t in topics:
+            tid = t.get("id")
+            if not tid:
+                continue
+            listed[tid] = t
+            # pinned topics sit on page 0 regardless of bump time, so they never end the scan
+            if watermark and not t.get("pinned") and (t.get("bumped_at") or "") <= watermark:
+                reached = True
+        if reached:
+            break
+
+    session = SessionLocal()
+    try:
+        known = {}
+        ids = list(listed)
+        for i in range(0, len(ids), 1000):
+            rows = session.query(ForumTopicState).filter(ForumTopicState.topic_id.in_(ids[i:i + 1000])).all()
+            known.update({r.topic_id: (r.bumped_at, int(r.views or 0), int(r.posts_count or 0)) for r in rows})
+    finally:
+        session.close()
+
+    changed = [tid for tid, t in listed.items() if known.get(tid) != _fingerprint(t)]
+    print(f"[forum sync] {len(listed)} topics listed since watermark {watermark}, {len(changed)} changed.")
+    return changed, listed
+
+def mark_synced(listed, synced_ids, failed_ids=()):
+    """
+    Store fingerprints for topics fetched successfully and advance the watermark.
+    If some topics failed, the watermark stops at the oldest failed bump so the
+    next run pages back far enough to retry them.
+    """
+    rows = [{"topic_id": tid, "bumped_at": listed[tid].get("bumped_at"),
+             "views": int(listed[tid].get("views") or 0),
+             "posts_count": int(listed[tid].get("posts_count") or 0)}
+            for tid in synced_ids if tid in listed]
+    if rows:
+        stmt = insert(ForumTopicState).values(rows)
+        new = stmt.inserted
+        with engine.begin() as conn:
+            conn.execute(stmt.on_duplicate_key_update(
+                bumped_at=new.bumped_at, views=new.views, posts_count=new.posts_count, synced_at=func.now()))
+
+    bumps = [t.get("bumped_at") for t in listed.values() if t.get("bumped_at") and not t.get("pinned")]
+    failed_bumps = [listed[tid].get("bumped_at") for tid in failed_ids if tid in listed and listed[tid].get("bumped_at")]
+    if failed_bumps:
+        watermark = min(failed_bumps)
+    elif bumps:
+        watermark = max(bumps)
+    else:
+        return
+    state = load_state(SOURCE)
+    state["bumped_at"] = watermark
+    save_state(SOURCE, state)
@@ -0,0 +1,174 @@
+# collectors/http_cache.py
+import os
+import json
+import time
+import sqlite3
+import threading
+import zlib
+from collections import namedtuple
+from urllib.parse import urlencode
+import requests
+from requests.structures import CaseInsensitiveDict
+
+CACHE_PATH = os.getenv("HTTP_CACHE_PATH", ".cache/http_cache.sqlite")
+CACHE_ENABLED = os.getenv("HTTP_CACHE", "1") != "0"
+CACHE_TTL = int(os.getenv("HTTP_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# query params that must never end up in a cache key (or on disk)
+_SECRET_PARAMS = {"key", "api_key"}
+
+CachedEntry = namedtuple("CachedEntry", "body headers etag last_modified stored_at")
+
+class HttpCache:
+    """
+    Persistent response cache in a single SQLite file.
+
+    Stores bodies (zlib-compressed) with their ETag / Last-Modified so callers can
+    revalidate with If-None-Match / If-Modified-Since and serve 304s from disk.
+    Entries older than `ttl` are dropped, and whenever the file holds more than
+    `max_bytes` of bodies (checked when the cache is opened, then after every store)
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # bytes of bodies in the file: read by evict() on open, then kept up to date by store()
+        self._total = None
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT,
+                headers TEXT, body BLOB, size INTEGER, stored_at REAL, accessed_at REAL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_accessed ON responses(accessed_at)")
+            self._local.conn = conn
+            if self._total is None:
+                # earlier runs may have left the file over budget
+                self.evict()
+        return conn
+
+    @staticmethod
+    def key_for(url, params=None):
+        # params: a dict, or (name, value) pairs for repeated names such as post_ids[]
+        pairs = params.items() if isinstance(params, dict) else params or ()
+        items = sorted((k, str(v)) for k, v in pairs if k not in _SECRET_PARAMS)
+        return f"{url}?{urlencode(items)}" if items else url
+
+    def lookup(self, key):
+        row = self._conn().execute(
+            "SELECT body, headers, etag, last_modified, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if time.time() - row[4] > self.ttl:
+            self._conn().execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        self._conn().execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return CachedEntry(zlib.decompress(row[0]), json.loads(row[1]), row[2], row[3], row[4])
+
+    @staticmethod
+    def validators(entry):
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def store(self, key, url, headers, body):
+        headers = {k: v for k, v in dict(headers).items() if k.lower() not in ("set-cookie", "content-encoding", "content-length", "transfer-encoding")}
+        blob = zlib.compress(body, 6)
+        now = time.time()
+        conn = self._conn()
+        old = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, url, etag, last_modified, headers, body, size, stored_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, url, headers.get("ETag") or headers.get("etag"), headers.get("Last-Modified") or headers.get("last-modified"),
+             json.dumps(headers), blob, len(blob), now, now))
+        with self._lock:
+            self._total += len(blob) - (old[0] if old else 0)
+            over = self._total > self.max_bytes
+        if over:
+            self.evict()
+
+    def revalidated(self, key):
+        """A 304 confirmed the cached body: restart its TTL."""
+        now = time.time()
+        self._conn().execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+
+    def evict(self):
+        """Drop expired entries, then LRU entries down to 90% of max_bytes if the file is over it."""
+        conn = self._conn()
+        conn.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - self.ttl,))
+        # re-read the real total: other processes write to the same file
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            to_free = total - int(self.max_bytes * 0.9)
+            victims = []
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                victims.append((key,))
+                to_free -= size
+                total -= size
+                if to_free <= 0:
+                    break
+            conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        with self._lock:
+            self._total = total
+
+_default = None
+_default_lock = threading.Lock()
+
+def default_cache():
+    """Process-wide cache, or None when HTTP_CACHE=0."""
+    global _default
+    if not CACHE_ENABLED:
+        return None
+    with _default_lock:
+        if _default is None:
+            _default = HttpCache()
+    return _default
+
+def _response_from_cache(entry, url):
+    r = requests.Response()
+    r.status_code = 200
+    r._content = entry.body
+    r.headers = CaseInsensitiveDict(entry.headers)
+    r.url = url
+    r.from_cache = True
+    return r
+
+def cached_get(send, url, params=None, fresh_for=0, headers=None, **kwargs):
+    """
+    Conditional GET through the on-disk cache. `send` is requests.get or a Session.get.
+    Entries younger than `fresh_for` seconds are served without touching the network;
+    otherwise the request carries the stored validators and a 304 is answered from disk.
+    """
+    cache = default_cache()
+    if cache is None:
+        return send(url, params=params, headers=headers, **kwargs)
+    key = cache.key_for(url, params)
+    entry = cache.lookup(key)
+    if entry is not None and fresh_for and time.time() - entry.stored_at < fresh_for:
+        return _response_from_cache(entry, url)
+    req_headers = dict(headers or {})
+    req_headers.update(cache.validators(entry))
+    resp = send(url, params=params, headers=req_headers, **kwargs)
+    if resp.status_code == 304 and entry is not None:
+        cache.revalidated(key)
+        return _response_from_cache(entry, url)
+    if resp.status_code == 200 and (fresh_for or resp.headers.get("ETag") or resp.headers.get("Last-Modified")):
+        cache.store(key, url, resp.headers, resp.content)
+    return resp
@@ -0,0 +1,136 @@
+# collectors/payload_archive.py
+import atexit
+import glob
+import gzip
+import os
+import socket
+import struct
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+import orjson
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_ENABLED = os.getenv("ARCHIVE", "1") != "0"
+SEGMENT_MAX_BYTES = int(os.getenv("ARCHIVE_SEGMENT_MB", "64")) * 1024 * 1024
+
+# every record: 4-byte big-endian length, then one NDJSON line of that many bytes
+_LENGTH = struct.Struct(">I")
+
+class ArchiveWriter:
+    """
+    Appends raw API payloads to gzip segments partitioned by source and UTC day:
+    {root}/{source}/{YYYY-MM-DD}/{host}-{pid}-{token}-{seq}.seg.gz. Each process writes
+    its own segments, so concurrent collectors and queue workers never share a file.
+    A line is {"ts", "source", "kind", "meta", "body"} with the response body spliced
+    in unchanged. Segments roll over at max_bytes (uncompressed).
+    """
+
+    def __init__(self, root=ARCHIVE_DIR, max_bytes=SEGMENT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._reset()
+        atexit.register(self.close)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._prefix = f"{socket.gethostname()}-{self._pid}-{uuid.uuid4().hex[:6]}"
+        self._seq = 0
+        self._open = {}  # source -> [day, gzip file, bytes written]
+
+    def write(self, source, kind, body, meta=None, ts=None):
+        """Archive one response body (JSON bytes) with the context needed to re-extract it."""
+        ts = ts or time.time()
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        head = orjson.dumps({"ts": ts, "source": source, "kind": kind, "meta": meta or {}})
+        line = head[:-1] + b',"body":' + body.strip() + b"}\n"
+        day = datetime.fromtimestamp(ts, tz=timezone.utc).date().isoformat()
+        with self._lock:
+            if os.getpid() != self._pid:
+                # forked child: leave the parent's open segments alone
+                self._reset()
+            seg = self._open.get(source)
+            if seg is None or seg[0] != day:
+                if seg is not None:
+                    seg[1].close()
+                seg = self._open[source] = [day, self._new_segment(source, day), 0]
+            seg[1].write(_LENGTH.pack(len(line)))
+            seg[1].write(line)
+            seg[2] += len(line) + _LENGTH.size
+            if seg[2] >= self.max_bytes:
+                seg[1].close()
+                del self._open[source]
+
+    def _new_segment(self, source, day):
+        d = os.path.join(self.root, source, day)
+        os.makedirs(d, exist_ok=True)
+        self._seq += 1
+        return gzip.open(os.path.join(d, f"{self._prefix}-{self._seq:04d}.seg.gz"), "wb", compresslevel=6)
+
+    def close(self):
+        with self._lock:
+            if os.getpid() != self._pid:
+                return
+            for seg in self._open.values():
+                seg[1].close()
+            self._open = {}
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def archive_payload(source, kind, body, meta=None):
+    """Archive through the process-wide writer; a no-op when ARCHIVE=0. Never raises."""
+    global _writer
+    if not ARCHIVE_ENABLED:
+        return
+    try:
+        if _writer is None:
+            with _writer_lock:
+                _writer = _writer or ArchiveWriter()
+        _writer.write(source, kind, body, meta)
+    except Exception as e:
+        print("[archive] write failed:", repr(e))
+
+def iter_segment(path, errors=None):
+    """
+    Records of one segment. A torn tail (writer killed mid-segment) just ends it; a
+    record that does not decode is skipped, and counted in errors["corrupt"] if a dict
+    is given, so one bad record never ends the replay of the rest.
+    """
+    with gzip.open(path, "rb") as f:
+        while True:
+            try:
+                head = f.read(_LENGTH.size)
+                if len(head) < _LENGTH.size:
+                    return
+                (n,) = _LENGTH.unpack(head)
+                line = f.read(n)
+            except (EOFError, OSError, zlib.error):
+                return
+            if len(line) < n:
+                return
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                print(f"[archive] corrupt record in {path}:", repr(e))
+                if errors is not None:
+                    errors["corrupt"] = errors.get("corrupt", 0) + 1
+                continue
+            yield record
+
+def list_segments(sources=None, since=None, until=None, root=ARCHIVE_DIR):
+    """Segment paths for the given sources and inclusive YYYY-MM-DD day range, in day order per source."""
+    if not os.path.isdir(root):
+        return []
+    paths = []
+    for source in sources or sorted(os.listdir(root)):
+        for day_dir in sorted(glob.glob(os.path.join(root, source, "*"))):
+            day = os.path.basename(day_dir)
+            if (since and day < since) or (until and day > until):
+                continue
+            paths.extend(sorted(glob.glob(os.path.join(day_dir, "*.seg.gz"))))
+    return paths
@@ -0,0 +1,96 @@
+# collectors/queue_tasks.py
+import hashlib
+import math
+from collectors.work_queue import enqueue
+from collectors.discourse_collector import topic_metrics_record
+from collectors.discourse_stream import get_topic_metrics
+from collectors.forum_sync import plan_incremental, mark_synced
+from collectors.youtube_collector import fetch_video_stats, video_records, QuotaBudget, MAX_IDS_PER_CALL, VIDEOS_COST, DAILY_QUOTA
+from collectors.youtube_planner import discover, QUOTA_MARGIN, REFRESH_CALLS
+from collectors.trends_collector import build_pytrends_session, get_trends_batched, trend_record, store_trend_series
+from analytics.refresh_planner import plan_refresh, record_refresh
+
+FORUM_TOPIC = "forum_topic"
+YOUTUBE_VIDEOS = "youtube_videos"
+TRENDS = "trends"
+
+def _digest(parts):
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+# ---- producers: plan a run and enqueue its fetches ----
+
+def enqueue_forum(max_pages=50, refresh_budget=40):
+    """
+    Queue every topic changed since the last watermark plus the top refresh targets.
+    The watermark advances right away: retries of a queued topic are the queue's job.
+    """
+    topic_ids, listed = plan_incremental(max_pages=max_pages)
+    refresh = plan_refresh("Forum", refresh_budget, exclude=topic_ids) if refresh_budget else []
+    ids = topic_ids + [int(t["source_id"]) for t in refresh]
+    n = enqueue(FORUM_TOPIC, [(tid, {"topic_id": tid}) for tid in ids])
+    mark_synced(listed, topic_ids)
+    if refresh:
+        record_refresh("Forum", refresh, len(refresh))
+    return n
+
+def enqueue_youtube(queries, regions, max_pages=3, refresh_calls=REFRESH_CALLS, budget=None):
+    """
+    Run the search phase here and queue videos.list work as 50-ID batches. The stats
+    quota of every queued batch is charged to the day's budget up front, so workers
+    fetch without touching the shared quota counter.
+    """
+    budget = budget or QuotaBudget(limit=DAILY_QUOTA - QUOTA_MARGIN)
+    found = discover(queries, regions, budget, max_pages=max_pages)
+    regions_by_id = {vid: sorted(r) for vid, r in found.items()}
+    # whatever quota the new videos' stats leave over goes to refreshing known ones
+    calls = min(refresh_calls, budget.remaining // VIDEOS_COST - math.ceil(len(found) / MAX_IDS_PER_CALL))
+    refresh = plan_refresh("YouTube", calls * MAX_IDS_PER_CALL, exclude=found) if calls > 0 else []
+    for t in refresh:
+        regions_by_id[t["source_id"]] = sorted(t["countries"])
+    ids = list(regions_by_id)
+    tasks = []
+    for i in range(0, len(ids), MAX_IDS_PER_CALL):
+        batch = ids[i:i + MAX_IDS_PER_CALL]
+        tasks.append((_digest(sorted(batch)), {"ids": batch, "regions": {v: regions_by_id[v] for v in batch}}))
+    budget.spend(len(tasks) * VIDEOS_COST)
+    if refresh:
+        record_refresh("YouTube", refresh, math.ceil(len(refresh) / MAX_IDS_PER_CALL))
+    return enqueue(YOUTUBE_VIDEOS, tasks)
+
+def enqueue_trends(queries, geos, timeframe="today 3-m"):
+    """
+    One task per (geo, timeframe) holding every query: get_trends_batched rescales its
+    payloads against the first one, so a geo's queries have to be fetched together.
+    """
+    return enqueue(TRENDS, [(f"{geo}:{timeframe}:{_digest(sorted(queries))}",
+                             {"queries": list(queries), "geo": geo, "timeframe": timeframe}) for geo in geos])
+
+# ---- handlers: one task's fetch, records go to the worker's BulkWriter ----
+
+def handle_forum_topic(payload, writer):
+    writer.add(topic_metrics_record(get_topic_metrics(payload["topic_id"]), country="global"))
+
+def handle_youtube_videos(payload, writer):
+    regions = payload["regions"]
+    for r in video_records(fetch_video_stats(payload["ids"], regions=regions), regions):
+        writer.add(r)
+
+_pytrends = None
+
+def handle_trends(payload, writer):
+    global _pytrends
+    # one Trends session per worker process, reused across tasks
+    _pytrends = _pytrends or build_pytrends_session()
+    trends = get_trends_batched(payload["queries"], geo=payload["geo"], timeframe=payload["timeframe"],
+                                pytrends=_pytrends)
+    if not trends:
+        raise RuntimeError(f"no trends data for {payload['geo']}")
+    for q, tr in trends.items():
+        writer.add(trend_record(q, tr, country=payload["geo"]))
+    store_trend_series(trends.values())
+
+HANDLERS = {
+    FORUM_TOPIC: handle_forum_topic,
+    YOUTUBE_VIDEOS: handle_youtube_videos,
+    TRENDS: handle_trends,
+}
@@ -0,0 +1,97 @@
+# collectors/rate_limiter.py
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header (delta-seconds or HTTP-date) into seconds.
+    Returns None if the header is missing or unparseable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token-bucket limiter shared by every request to one host.
+
+    Tokens refill at `rate` per second up to `capacity`. A 429 (or any response
+    carrying Retry-After) pauses the whole bucket until the server says we may
+    continue and halves the refill rate; successful responses slowly raise it
+    back towards `max_rate`. Works from threads and from asyncio tasks.
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=0.2, default_penalty=20.0):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.default_penalty = default_penalty
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        # take one token (possibly going negative) and return how long to wait for it
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1.0
+            # the debt is paid off at `rate` from the end of any pause, so callers queued
+            # during a Retry-After leave it spaced out instead of all at once
+            start = max(now, self._blocked_until)
+            return start - now + max(0.0, -self._tokens) / self.rate
+
+    def _refill(self, now):
+        # nothing accrues before _last, which penalize() moves to the end of the pause
+        if now > self._last:
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def penalize(self, seconds):
+        """Block every caller for `seconds` from now; no tokens refill during the pause."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._last = max(self._last, self._blocked_until)
+
+    def on_response(self, status, headers=None):
+        """
+        Feed a response back into the limiter. Returns the pause (seconds) applied,
+        or 0.0 if the response did not ask us to slow down.
+        """
+        retry_after = parse_retry_after((headers or {}).get("Retry-After"))
+        if status == 429 or (status == 503 and retry_after is not None):
+            pause = retry_after if retry_after is not None else self.default_penalty
+            with self._lock:
+                self.rate = max(self.min_rate, self.rate / 2)
+            self.penalize(pause)
+            return pause
+        if status < 400:
+            with self._lock:
+                # additive increase: recover roughly 5% of max rate per success
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+        return 0.0
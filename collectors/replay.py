@@ -0,0 +1,128 @@
+# collectors/replay.py
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import orjson
+from collectors.payload_archive import iter_segment, list_segments
+from collectors.discourse_stream import TopicMetricsParser
+from collectors.discourse_collector import topic_metrics_record
+from collectors.youtube_collector import video_records
+from collectors.trends_collector import _series_obj, summarize, trend_record, frame_from_payload
+from collectors.bulk_upsert import BulkWriter, METRIC_COLUMNS, identity
+
+def _parse_forum_body(body):
+    return TopicMetricsParser().feed_all(orjson.dumps(body))
+
+def _youtube_records(e):
+    return video_records(e["body"].get("items", []), e["meta"]["regions"])
+
+def _trends_records(e):
+    m = e["meta"]
+    if m["scale"] is None:
+        # the anchor was all zeros: the batch could not be put on the common scale
+        return []
+    df = frame_from_payload(e["body"])
+    objs = [_series_obj(q, m["geo"], m["timeframe"], df, q, m["scale"]) for q in m["queries"] if q in df.columns]
+    summarize(objs)
+    return [trend_record(t["query"], t, country=m["geo"]) for t in objs]
+
+def _keep(merged, ts, record):
+    """Fold a record into {identity: (ts, record)}: metrics take the max, the rest the newest."""
+    key = identity(record)
+    cur = merged.get(key)
+    if cur is None:
+        merged[key] = (ts, record)
+        return
+    old_ts, old = cur
+    newer, other = (record, old) if ts >= old_ts else (old, record)
+    for c in METRIC_COLUMNS:
+        newer[c] = max(newer[c], other[c])
+    merged[key] = (max(ts, old_ts), newer)
+
+def extract_segment(path):
+    """
+    Process-pool task: run today's extraction code over one segment. Returns
+    ({identity: (ts, record)}, forum_parts, {"corrupt", "failed"} record counts); forum
+    topics are returned as per-response partial counters because a topic's parts may
+    sit in different segments. Listings (YouTube search pages, forum latest.json) are
+    archived too but carry nothing to extract.
+    """
+    merged, forum, errors = {}, [], {"corrupt": 0, "failed": 0}
+    for e in iter_segment(path, errors):
+        kind = e["kind"]
+        try:
+            if kind == "youtube_videos":
+                for r in _youtube_records(e):
+                    _keep(merged, e["ts"], r)
+            elif kind == "trends":
+                for r in _trends_records(e):
+                    _keep(merged, e["ts"], r)
+            elif kind in ("forum_topic", "forum_posts"):
+                p = _parse_forum_body(e["body"])
+                forum.append({"ts": e["ts"], "kind": kind, "meta": e["meta"], "metrics": p.metrics()})
+            elif kind == "forum_posts_cached":
+                p = TopicMetricsParser.restore(e["body"])
+                forum.append({"ts": e["ts"], "kind": kind, "meta": e["meta"], "metrics": p.metrics(), "ref": p.ref})
+        except Exception as ex:
+            print(f"[replay] skipping {kind} record in {path}:", repr(ex))
+            errors["failed"] += 1
+    return merged, forum, errors
+
+def _forum_records(parts):
+    """
+    Join topic pages with their posts.json parts; fetches missing a part are dropped. A
+    part that was a 304 (forum_posts_cached) takes the metrics re-derived from the body
+    it refers to when that is in the replayed range, else the counters cached with it.
+    """
+    parsed = {(p["meta"]["fetch"], p["meta"]["part"]): p["metrics"] for p in parts if p["kind"] == "forum_posts"}
+    fetches = {}
+    for p in parts:
+        f = fetches.setdefault(p["meta"]["fetch"], {"topic": None, "posts": []})
+        if p["kind"] == "forum_topic":
+            f["topic"] = p
+        elif p["kind"] == "forum_posts_cached" and p["ref"]:
+            f["posts"].append(parsed.get(tuple(p["ref"]), p["metrics"]))
+        else:
+            f["posts"].append(p["metrics"])
+    for f in fetches.values():
+        t = f["topic"]
+        if t is None or len(f["posts"]) != t["meta"]["parts"]:
+            continue
+        m = dict(t["metrics"])
+        for extra in f["posts"]:
+            m["likes"] += extra["likes"]
+            m["posts_scanned"] += extra["posts_scanned"]
+        yield t["ts"], topic_metrics_record(m, country=t["meta"].get("country", "global"))
+
+def replay(sources=None, since=None, until=None, processes=None, merge="replace"):
+    """
+    Re-derive workflow rows from the payload archive with no network: segments are
+    extracted in parallel, folded per row (max metrics, newest name/evidence) and
+    written through the usual upsert. The re-derived metrics replace the stored ones
+    (merge="replace"), so a fix that counts lower takes effect; the range should then
+    reach the latest fetches, or rows go back to older values. merge="max" only raises
+    them. Returns the number of rows written.
+    """
+    paths = list_segments(sources, since, until)
+    if not paths:
+        print("[replay] no archive segments match.")
+        return 0
+    start = time.perf_counter()
+    merged, forum, skipped = {}, [], {"corrupt": 0, "failed": 0}
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        futures = [pool.submit(extract_segment, p) for p in paths]
+        for fut in as_completed(futures):
+            part, topics, errors = fut.result()
+            for ts, r in part.values():
+                _keep(merged, ts, r)
+            forum.extend(topics)
+            for k, n in errors.items():
+                skipped[k] += n
+    for ts, r in _forum_records(forum):
+        _keep(merged, ts, r)
+    print(f"[replay] {len(paths)} segments -> {len(merged)} rows in {time.perf_counter() - start:.1f}s "
+          f"({skipped['corrupt']} corrupt, {skipped['failed']} unextractable records skipped)")
+    with BulkWriter(label="replay", history_snapshots=False, merge=merge) as writer:
+        for _, r in merged.values():
+            writer.add(r)
+    return len(merged)
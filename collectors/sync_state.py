@@ -0,0 +1,19 @@
+# collectors/sync_state.py
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert
+from db import SessionLocal, engine
+from api.models import CollectorState
+
+def load_state(source):
+    """Return the persisted state dict for a source ({} if it never ran)."""
+    session = SessionLocal()
+    try:
+        row = session.get(CollectorState, source)
+        return dict(row.state) if row else {}
+    finally:
+        session.close()
+
+def save_state(source, state):
+    stmt = insert(CollectorState).values(source=source, state=state)
+    with engine.begin() as conn:
+        conn.execute(stmt.on_duplicate_key_update(state=stmt.inserted.state, updated_at=func.now()))
@@ -1,103 +1,206 @@
-# collectors/trends_collector.py
-import os
-import json
-import time
-import random
-from pytrends.request import TrendReq
-from db import SessionLocal
-from api.models import Workflow
-from utils import normalize_title
-
-# pytrends session builder (vary UA slightly to reduce identical fingerprint)
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko)",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko)",
-    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko)"
-]
-
-def build_pytrends_session():
-    ua = random.choice(USER_AGENTS)
-    return TrendReq(hl='en-US', tz=360, requests_args={"headers": {"User-Agent": ua}})
-
-def get_trend(query, geo='US', timeframe='today 3-m', max_retries=5):
-    """
-    Safer pytrends fetch with exponential backoff and jitter.
-    Returns a dict with trend metrics or None if it cannot fetch.
-    """
-    attempt = 0
-    backoff = 1.0
-    while attempt < max_retries:
-        attempt += 1
-        try:
-            pytrends = build_pytrends_session()
-            pytrends.build_payload([query], timeframe=timeframe, geo=geo)
-            df = pytrends.interest_over_time()
-            if df.empty:
-                return None
-            series = df[query].tolist()
-            recent = float(df[query].tail(30).mean()) if len(df) >= 1 else 0.0
-            if len(df) >= 60:
-                previous = float(df[query].head(30).mean())
-            elif len(df) > 30:
-                previous = float(df[query].head(len(df)-30).mean())
-            else:
-                previous = recent
-            change_pct = ((recent - previous) / previous * 100.0) if previous and previous != 0 else 0.0
-            # polite pause
-            time.sleep(0.5 + random.random() * 0.8)
-            return {
-                "query": query,
-                "geo": geo,
-                "timeframe": timeframe,
-                "avg_recent": recent,
-                "change_pct": change_pct,
-                "series": series
-            }
-        except Exception as e:
-            # print error and backoff
-            print(f"pytrends attempt {attempt} error for {query} {geo} : {e}")
-            sleep_time = backoff + random.random() * backoff
-            time.sleep(sleep_time)
-            backoff *= 2
-    print(f"pytrends permanently failed for {query} {geo} after {max_retries} attempts.")
-    return None
-
-def upsert_trend(query, trend_obj, country='US'):
-    """
-    Insert or update a Workflow row for the given query + trend data.
-    Stores trend data in 'evidence' JSON and writes avg_recent into 'views' as a numeric proxy.
-    """
-    session = SessionLocal()
-    try:
-        workflow_name = query
-        normalized = normalize_title(workflow_name)
-        evidence = {"type": "google_trends", "payload": trend_obj}
-
-        wf = session.query(Workflow).filter_by(platform="Google", normalized_name=normalized, country=country).first()
-        if wf:
-            wf.views = max(int(wf.views or 0), int(trend_obj.get("avg_recent", 0)))
-            wf.evidence = evidence
-            wf.workflow_name = workflow_name
-        else:
-            wf = Workflow(
-                workflow_name=workflow_name,
-                normalized_name=normalized,
-                platform="Google",
-                country=country,
-                evidence=evidence,
-                views=int(trend_obj.get("avg_recent", 0)),
-                likes=0,
-                comments=0,
-                replies=0,
-                contributors=0,
-                source_url=None
-            )
-            session.add(wf)
-        session.commit()
-        return True
-    except Exception as e:
-        session.rollback()
-        print("Error in upsert_trend:", e)
-        raise
-    finally:
-        session.close()
+# collectors/trends_collector.py
+import os
+import json
+import time
+import random
+import pandas as pd
+from pytrends.request import TrendReq
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert
+from db import engine
+from api.models import TrendSeries
+from collectors.bulk_upsert import make_record, upsert_records
+from analytics.trend_analytics import TrendMatrix, pack_series
+from collectors.payload_archive import archive_payload
+import metrics
+
+# pytrends session builder (vary UA slightly to reduce identical fingerprint)
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko)",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko)",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko)"
+]
+
+def build_pytrends_session():
+    ua = random.choice(USER_AGENTS)
+    return TrendReq(hl='en-US', tz=360, requests_args={"headers": {"User-Agent": ua}})
+
+# Google Trends accepts up to 5 terms per payload; one slot is the shared anchor
+MAX_KEYWORDS = 5
+# Trends reports integers scaled to each payload's peak, so a broad anchor ("n8n") takes
+# the 100 and squashes long-tail queries to 0-1. Unset, every call picks a mid-volume
+# anchor from its first payload; BROAD_ANCHOR is the fallback when that payload is all zeros.
+ANCHOR_TERM = os.getenv("TRENDS_ANCHOR") or None
+BROAD_ANCHOR = "n8n"
+
+def _series_obj(query, geo, timeframe, df, col, scale=1.0):
+    """Raw interest points for one column plus the time axis; metrics are filled by summarize()."""
+    index = df.index
+    step = int((index[1] - index[0]).total_seconds()) if len(index) > 1 else 0
+    return {
+        "query": query,
+        "geo": geo,
+        "timeframe": timeframe,
+        "scale": scale,
+        "start_ts": int(index[0].timestamp()) if len(index) else None,
+        "step_seconds": step,
+        "series": [int(v) for v in df[col].tolist()]
+    }
+
+def frame_payload(df):
+    """interest_over_time frame as JSON (timestamps as pandas prints them) for the payload archive."""
+    return json.dumps({"index": [str(ts) for ts in df.index],
+                       "columns": {c: [int(v) for v in df[c].tolist()] for c in df.columns if c != "isPartial"}})
+
+def frame_from_payload(body):
+    return pd.DataFrame(body["columns"], index=pd.to_datetime(body["index"]))
+
+def summarize(trend_objs):
+    """Fill avg_recent / change_pct / slope / zscore / anomaly for all objs in one vectorized pass."""
+    trend_objs = list(trend_objs)
+    matrix = TrendMatrix(range(len(trend_objs)), [t["series"] for t in trend_objs],
+                         [t.get("scale", 1.0) for t in trend_objs])
+    res = matrix.analyze()
+    for i, t in enumerate(trend_objs):
+        t["avg_recent"] = float(res["avg_recent"][i])
+        t["change_pct"] = float(res["change_pct"][i])
+        t["slope"] = float(res["slope"][i])
+        t["zscore"] = float(res["zscore"][i])
+        t["anomaly"] = bool(res["anomaly"][i])
+    return trend_objs
+
+def _interest_with_retries(pytrends, keywords, geo, timeframe, max_retries=5):
+    attempt = 0
+    backoff = 1.0
+    while attempt < max_retries:
+        attempt += 1
+        start = time.perf_counter()
+        try:
+            pytrends.build_payload(keywords, timeframe=timeframe, geo=geo)
+            df = pytrends.interest_over_time()
+            metrics.observe_http("trends", "interest_over_time", start, 200)
+            return df
+        except Exception as e:
+            status = getattr(getattr(e, "response", None), "status_code", None) or "error"
+            metrics.observe_http("trends", "interest_over_time", start, status)
+            if attempt < max_retries:
+                metrics.retried("trends", status)
+            print(f"pytrends attempt {attempt} error for {keywords} {geo} : {e}")
+            sleep_time = backoff + random.random() * backoff
+            time.sleep(sleep_time)
+            backoff *= 2
+    print(f"pytrends permanently failed for {keywords} {geo} after {max_retries} attempts.")
+    return None
+
+def get_trend(query, geo='US', timeframe='today 3-m', max_retries=5):
+    """
+    Safer pytrends fetch with exponential backoff and jitter.
+    Returns a dict with trend metrics or None if it cannot fetch.
+    """
+    df = _interest_with_retries(build_pytrends_session(), [query], geo, timeframe, max_retries)
+    if df is None or df.empty:
+        return None
+    archive_payload("trends", "trends", frame_payload(df),
+                    {"geo": geo, "timeframe": timeframe, "queries": [query], "anchor": None, "scale": 1.0})
+    # polite pause
+    time.sleep(0.5 + random.random() * 0.8)
+    return summarize([_series_obj(query, geo, timeframe, df, query)])[0]
+
+def pick_anchor(df, terms):
+    """The median-volume term of a payload, among those with a nonzero mean; None if all are zero."""
+    means = sorted((float(df[t].mean()), t) for t in terms if t in df.columns)
+    means = [m for m in means if m[0] > 0]
+    return means[len(means) // 2][1] if means else None
+
+def get_trends_batched(queries, geo='US', timeframe='today 3-m', anchor=ANCHOR_TERM, pytrends=None, max_retries=5):
+    """
+    Fetch many queries in payloads of the anchor term + 4 queries, over one session.
+    Trends scales every payload to its own peak, so each batch is rescaled until the
+    anchor's mean matches its mean in the first batch; that keeps scores comparable
+    across batches. Without an anchor, the first payload is 5 queries and its
+    median-volume one (pick_anchor) anchors the rest. A batch whose anchor is all zeros
+    cannot be rescaled and is skipped (archived with scale None). Returns
+    {query: trend dict} for the queries that could be fetched.
+    """
+    pytrends = pytrends or build_pytrends_session()
+    queries = list(dict.fromkeys(queries))
+    results = {}
+    reference = None
+    if anchor is None:
+        first = queries[:MAX_KEYWORDS]
+        df = _interest_with_retries(pytrends, first, geo, timeframe, max_retries)
+        if df is None or df.empty:
+            return {}
+        anchor = pick_anchor(df, first)
+        archive_payload("trends", "trends", frame_payload(df),
+                        {"geo": geo, "timeframe": timeframe, "queries": first, "anchor": anchor, "scale": 1.0})
+        for q in first:
+            results[q] = _series_obj(q, geo, timeframe, df, q)
+        if anchor is None:
+            print(f"[trends] {first} are all zeros in {geo}; anchoring on {BROAD_ANCHOR!r}")
+            anchor = BROAD_ANCHOR
+        else:
+            reference = float(df[anchor].mean())
+        time.sleep(0.5 + random.random() * 0.8)
+    others = [q for q in queries if q != anchor and q not in results]
+    for i in range(0, len(others), MAX_KEYWORDS - 1):
+        batch = others[i:i + MAX_KEYWORDS - 1]
+        df = _interest_with_retries(pytrends, [anchor] + batch, geo, timeframe, max_retries)
+        if df is None or df.empty:
+            continue
+        anchor_mean = float(df[anchor].mean())
+        reference = reference or anchor_mean
+        scale = reference / anchor_mean if anchor_mean else None
+        archive_payload("trends", "trends", frame_payload(df),
+                        {"geo": geo, "timeframe": timeframe, "queries": batch, "anchor": anchor, "scale": scale})
+        if scale is None:
+            print(f"[trends] anchor {anchor!r} is all zeros in {geo}; skipping {batch}")
+            continue
+        for q in batch:
+            results[q] = _series_obj(q, geo, timeframe, df, q, scale)
+        if anchor in queries and anchor not in results:
+            results[anchor] = _series_obj(anchor, geo, timeframe, df, anchor, scale)
+        # polite pause
+        time.sleep(0.5 + random.random() * 0.8)
+    summarize(results.values())
+    return results
+
+def trend_record(query, trend_obj, country='US'):
+    """
+    Build the Workflow record for a query + trend data.
+    Stores the trend metrics in 'evidence' JSON (the series itself goes to trend_series,
+    see store_trend_series) and writes avg_recent into 'views' as a numeric proxy.
+    """
+    evidence = {"type": "google_trends", "payload": {k: v for k, v in trend_obj.items() if k != "series"}}
+    return make_record("Google", query, country, evidence, views=trend_obj.get("avg_recent", 0))
+
+def upsert_trend(query, trend_obj, country='US'):
+    """
+    Insert or update a Workflow row for the given query + trend data.
+    """
+    try:
+        upsert_records([trend_record(query, trend_obj, country)])
+        return True
+    except Exception as e:
+        print("Error in upsert_trend:", e)
+        raise
+
+def store_trend_series(trend_objs):
+    """Write raw series as packed uint8 arrays into trend_series (one row per query/geo/timeframe)."""
+    rows = [{
+        "query": t["query"], "geo": t["geo"], "timeframe": t["timeframe"],
+        "start_ts": t.get("start_ts"), "step_seconds": t.get("step_seconds"),
+        "length": len(t["series"]), "scale": t.get("scale", 1.0), "points": pack_series(t["series"]),
+    } for t in trend_objs if t.get("series")]
+    if not rows:
+        return 0
+    start = time.perf_counter()
+    stmt = insert(TrendSeries).values(rows)
+    new = stmt.inserted
+    with engine.begin() as conn:
+        conn.execute(stmt.on_duplicate_key_update(
+            start_ts=new.start_ts, step_seconds=new.step_seconds, length=new.length,
+            scale=new.scale, points=new.points, updated_at=func.now()))
+    metrics.DB_UPSERT_SECONDS.labels("trend_series").observe(time.perf_counter() - start)
+    metrics.DB_UPSERT_ROWS.labels("trend_series").observe(len(rows))
+    return len(rows)
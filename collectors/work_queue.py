@@ -0,0 +1,224 @@
+# collectors/work_queue.py
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from sqlalchemy import select, update, func, case, null, literal_column
+from sqlalchemy.dialects.mysql import insert
+from db import engine
+from api.models import FetchTask
+from collectors.bulk_upsert import BulkWriter
+
+LEASE_SECONDS = int(os.getenv("QUEUE_LEASE_SECONDS", "300"))
+MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = int(os.getenv("QUEUE_RETRY_BASE_SECONDS", "30"))
+RETRY_MAX_SECONDS = 3600
+# a handler still running after this long stops being renewed, so a hung worker's tasks expire
+MAX_HOLD_SECONDS = int(os.getenv("QUEUE_MAX_HOLD_SECONDS", "3600"))
+ENQUEUE_CHUNK = 1000
+
+def worker_id():
+    """Lease owner name, unique per worker process across hosts."""
+    return f"{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def _in_seconds(seconds):
+    # lease and backoff times use the database clock, so hosts need not agree on time
+    return func.timestampadd(literal_column("SECOND"), int(seconds), func.now())
+
+def enqueue(kind, tasks, max_attempts=MAX_ATTEMPTS):
+    """
+    Add tasks [(task_key, payload)] of one kind. Enqueueing a key that already exists
+    is idempotent: a pending or leased task keeps its place (payload refreshed), a done
+    or failed one is reopened as pending with a fresh attempt count.
+    """
+    values = [{"kind": kind, "task_key": str(key)[:191], "payload": payload, "max_attempts": max_attempts}
+              for key, payload in tasks]
+    t = FetchTask
+    reopen = t.status.in_(("done", "failed"))
+    with engine.begin() as conn:
+        for i in range(0, len(values), ENQUEUE_CHUNK):
+            stmt = insert(t).values(values[i:i + ENQUEUE_CHUNK])
+            # MySQL applies these left to right, so `status` must be reassigned last
+            conn.execute(stmt.on_duplicate_key_update([
+                ("payload", stmt.inserted.payload),
+                ("max_attempts", stmt.inserted.max_attempts),
+                ("attempts", case((reopen, 0), else_=t.attempts)),
+                ("available_at", case((reopen, func.now()), else_=t.available_at)),
+                ("last_error", case((reopen, null()), else_=t.last_error)),
+                ("completed_at", case((reopen, null()), else_=t.completed_at)),
+                ("status", case((reopen, "pending"), else_=t.status)),
+            ]))
+    return len(values)
+
+def claim(kind, owner, limit=10, lease_seconds=LEASE_SECONDS):
+    """
+    Lease up to `limit` tasks of `kind` to `owner`: first leases that expired (their
+    worker died or stalled), then pending tasks whose retry backoff has passed. Rows are
+    locked with FOR UPDATE SKIP LOCKED, so concurrent workers skip each other's rows
+    instead of waiting on them. Expired tasks with no attempts left are marked failed.
+    Returns [{"id", "key", "payload", "attempts", "max_attempts"}].
+    """
+    t = FetchTask
+    cols = (t.id, t.task_key, t.payload, t.attempts, t.max_attempts)
+    with engine.begin() as conn:
+        rows = conn.execute(select(*cols).where(
+            t.kind == kind, t.status == "leased", t.lease_expires_at < func.now())
+            .order_by(t.lease_expires_at).limit(limit).with_for_update(skip_locked=True)).all()
+        if len(rows) < limit:
+            rows += conn.execute(select(*cols).where(
+                t.kind == kind, t.status == "pending", t.available_at <= func.now())
+                .order_by(t.available_at).limit(limit - len(rows)).with_for_update(skip_locked=True)).all()
+        exhausted = [r.id for r in rows if r.attempts >= r.max_attempts]
+        live = [r for r in rows if r.attempts < r.max_attempts]
+        if exhausted:
+            conn.execute(update(t).where(t.id.in_(exhausted)).values(
+                status="failed", lease_owner=None, lease_expires_at=None,
+                last_error=func.coalesce(t.last_error, "lease expired")))
+        if live:
+            conn.execute(update(t).where(t.id.in_([r.id for r in live])).values(
+                status="leased", lease_owner=owner, lease_expires_at=_in_seconds(lease_seconds),
+                attempts=t.attempts + 1))
+    return [{"id": r.id, "key": r.task_key, "payload": r.payload,
+             "attempts": r.attempts + 1, "max_attempts": r.max_attempts} for r in live]
+
+def renew(owner, task_ids, lease_seconds=LEASE_SECONDS):
+    """Extend leases `owner` still holds (for handlers that run longer than a lease)."""
+    if not task_ids:
+        return 0
+    t = FetchTask
+    with engine.begin() as conn:
+        return conn.execute(update(t).where(t.id.in_(list(task_ids)), t.status == "leased", t.lease_owner == owner)
+                            .values(lease_expires_at=_in_seconds(lease_seconds))).rowcount
+
+@contextmanager
+def keep_leased(owner, task_ids, lease_seconds=LEASE_SECONDS, max_hold=MAX_HOLD_SECONDS):
+    """
+    Renew the leases on task_ids every third of a lease from a daemon thread while the
+    block runs, so a handler slower than one lease (a long trends batch) is not claimed
+    and run a second time by another worker. Renewal stops after max_hold seconds.
+    """
+    stop = threading.Event()
+
+    def run():
+        deadline = time.monotonic() + max_hold
+        while not stop.wait(lease_seconds / 3) and time.monotonic() < deadline:
+            try:
+                renew(owner, task_ids, lease_seconds)
+            except Exception as e:
+                print("[queue] lease renewal failed:", repr(e))
+
+    thread = threading.Thread(target=run, name="lease-keeper", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def complete(owner, task_ids):
+    """
+    Mark tasks done. Only rows still leased by `owner` change, so completing twice, or
+    after another worker took over an expired lease, is a no-op; the records themselves
+    were written with idempotent upserts. Returns the number of tasks marked done.
+    """
+    if not task_ids:
+        return 0
+    t = FetchTask
+    with engine.begin() as conn:
+        return conn.execute(update(t).where(t.id.in_(list(task_ids)), t.status == "leased", t.lease_owner == owner)
+                            .values(status="done", lease_owner=None, lease_expires_at=None,
+                                    completed_at=func.now())).rowcount
+
+def fail(owner, task, error):
+    """
+    Give a claimed task back after an error: pending again after an exponential backoff,
+    or failed once it has used all its attempts.
+    """
+    t = FetchTask
+    out_of_attempts = task["attempts"] >= task["max_attempts"]
+    delay = min(RETRY_BASE_SECONDS * 2 ** (task["attempts"] - 1), RETRY_MAX_SECONDS)
+    with engine.begin() as conn:
+        return conn.execute(update(t).where(t.id == task["id"], t.status == "leased", t.lease_owner == owner).values(
+            status="failed" if out_of_attempts else "pending",
+            lease_owner=None, lease_expires_at=None,
+            available_at=_in_seconds(delay), last_error=str(error)[:512])).rowcount
+
+def retry_failed(kind=None):
+    """Reopen failed tasks (all kinds, or one) with a fresh attempt count."""
+    t = FetchTask
+    q = update(t).where(t.status == "failed")
+    if kind:
+        q = q.where(t.kind == kind)
+    with engine.begin() as conn:
+        return conn.execute(q.values(status="pending", attempts=0, available_at=func.now())).rowcount
+
+def purge_done(older_than_days=7):
+    """Drop completed tasks; a purged key can simply be enqueued again."""
+    t = FetchTask
+    with engine.begin() as conn:
+        return conn.execute(t.__table__.delete().where(
+            t.status == "done",
+            t.completed_at < func.timestampadd(literal_column("DAY"), -int(older_than_days), func.now()))).rowcount
+
+def queue_stats():
+    """{kind: {status: count}}"""
+    t = FetchTask
+    with engine.connect() as conn:
+        rows = conn.execute(select(t.kind, t.status, func.count()).group_by(t.kind, t.status)).all()
+    stats = {}
+    for kind, status, n in rows:
+        stats.setdefault(kind, {})[status] = n
+    return stats
+
+def run_worker(handlers, batch_size=10, lease_seconds=LEASE_SECONDS, idle_exit=True, poll_seconds=5.0, stop=None):
+    """
+    Claim -> handle -> complete loop over `handlers` ({kind: handler(payload, writer)}).
+    Leases are renewed while a claimed batch is handled (keep_leased).
+    Handlers add their records to one BulkWriter, which is flushed before the claimed
+    batch is completed, so a task is only marked done once its rows are in MySQL; if the
+    write fails the batch's tasks are failed (retried with backoff), and if the process
+    dies first, the lease expires and another worker redoes the task.
+    Exits when the queue is empty (idle_exit) or `stop` (a threading.Event) is set.
+    """
+    owner = worker_id()
+    done = failed = 0
+    with BulkWriter(label=f"worker {owner}") as writer:
+        while not (stop is not None and stop.is_set()):
+            claimed = 0
+            for kind, handler in handlers.items():
+                tasks = claim(kind, owner, batch_size, lease_seconds)
+                if not tasks:
+                    continue
+                claimed += len(tasks)
+                ok = []
+                try:
+                    with keep_leased(owner, [task["id"] for task in tasks], lease_seconds):
+                        for task in tasks:
+                            try:
+                                handler(task["payload"], writer)
+                                ok.append(task)
+                            except Exception as e:
+                                print(f"[queue] {kind} {task['key']} attempt {task['attempts']} failed:", repr(e))
+                                fail(owner, task, repr(e))
+                                failed += 1
+                        writer.flush()
+                except Exception as e:
+                    # none of this batch's records are written: hand every task back for a retry
+                    print(f"[queue] {kind} write of {len(ok)} tasks failed:", repr(e))
+                    for task in ok:
+                        fail(owner, task, f"write failed: {e!r}")
+                    failed += len(ok)
+                    writer.discard()
+                    continue
+                done += complete(owner, [task["id"] for task in ok])
+            if not claimed:
+                if idle_exit:
+                    break
+                if stop is not None:
+                    stop.wait(poll_seconds)
+                else:
+                    time.sleep(poll_seconds)
+    print(f"[queue] worker {owner}: {done} tasks done, {failed} failed attempts.")
+    return done, failed
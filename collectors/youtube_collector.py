@@ -1,78 +1,162 @@
-# collectors/youtube_collector.py
-import os, requests, json, time
-from db import SessionLocal
-from api.models import Workflow
-from utils import normalize_title
-
-YOUTUBE_KEY = os.getenv("YOUTUBE_API_KEY")
-SEARCH_URL = "https://www.googleapis.com/youtube/v3/search"
-VIDEO_URL = "https://www.googleapis.com/youtube/v3/videos"
-
-def search_videos(query, region_code='US', max_results=25):
-    params = {
-        "part": "snippet",
-        "q": query,
-        "type": "video",
-        "maxResults": max_results,
-        "regionCode": region_code,
-        "key": YOUTUBE_KEY
-    }
-    r = requests.get(SEARCH_URL, params=params, timeout=15)
-    r.raise_for_status()
-    items = r.json().get("items", [])
-    return [it["id"]["videoId"] for it in items if it.get("id", {}).get("videoId")]
-
-def fetch_video_stats(video_ids):
-    if not video_ids:
-        return []
-    params = {
-        "part": "statistics,snippet",
-        "id": ",".join(video_ids),
-        "key": YOUTUBE_KEY
-    }
-    r = requests.get(VIDEO_URL, params=params, timeout=15)
-    r.raise_for_status()
-    return r.json().get("items", [])
-
-def upsert_video(item, country='US'):
-    session = SessionLocal()
-    try:
-        vid = item.get("id")
-        stats = item.get("statistics", {})
-        views = int(stats.get("viewCount", 0))
-        likes = int(stats.get("likeCount", 0))
-        comments = int(stats.get("commentCount", 0))
-        title = item.get("snippet", {}).get("title", "Untitled")
-        normalized = normalize_title(title)
-        source_url = f"https://youtube.com/watch?v={vid}"
-
-        wf = session.query(Workflow).filter_by(platform='YouTube', normalized_name=normalized, country=country).first()
-        evidence = {"video_id": vid, "publishedAt": item.get("snippet", {}).get("publishedAt")}
-        if wf:
-            wf.views = max(wf.views or 0, views)
-            wf.likes = max(wf.likes or 0, likes)
-            wf.comments = max(wf.comments or 0, comments)
-            wf.evidence = evidence
-            wf.source_url = source_url
-            wf.workflow_name = title
-        else:
-            wf = Workflow(
-                workflow_name=title,
-                normalized_name=normalized,
-                platform='YouTube',
-                country=country,
-                evidence=evidence,
-                views=views,
-                likes=likes,
-                comments=comments,
-                source_url=source_url
-            )
-            session.add(wf)
-        session.commit()
-        return True
-    except Exception as e:
-        session.rollback()
-        print("Error upserting video:", e)
-        raise
-    finally:
-        session.close()
+# collectors/youtube_collector.py
+import os, requests, json, time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from collectors.bulk_upsert import make_record, make_records, upsert_records
+from collectors.http_cache import cached_get
+from collectors.payload_archive import archive_payload
+from collectors.sync_state import load_state, save_state
+import metrics
+
+YOUTUBE_KEY = os.getenv("YOUTUBE_API_KEY")
+API_BASE = os.getenv("YOUTUBE_API_BASE", "https://www.googleapis.com/youtube/v3")
+SEARCH_URL = f"{API_BASE}/search"
+VIDEO_URL = f"{API_BASE}/videos"
+# serve repeated calls from the on-disk cache for this long without spending quota
+CACHE_FRESH_SECONDS = int(os.getenv("YOUTUBE_CACHE_FRESH_SECONDS", "3600"))
+
+_session = requests.Session()
+
+# YouTube Data API quota units per call
+SEARCH_COST = 100
+VIDEOS_COST = 1
+MAX_IDS_PER_CALL = 50
+DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+
+class QuotaExhausted(RuntimeError):
+    pass
+
+def _quota_day():
+    # the daily quota resets at midnight Pacific time
+    try:
+        return datetime.now(ZoneInfo("America/Los_Angeles")).date().isoformat()
+    except ZoneInfoNotFoundError:
+        return (datetime.now(timezone.utc) - timedelta(hours=8)).date().isoformat()
+
+class QuotaBudget:
+    """
+    Running count of quota units spent today, persisted in collector_state so
+    separate runs on the same day share one budget. `limit` is the ceiling this
+    process may reach, normally the daily quota minus a safety margin.
+    """
+
+    def __init__(self, limit=DAILY_QUOTA, source="youtube_quota"):
+        self.limit = limit
+        self.source = source
+        self.day = _quota_day()
+        state = load_state(source)
+        self.used = int(state.get("used", 0)) if state.get("day") == self.day else 0
+
+    @property
+    def remaining(self):
+        return max(0, self.limit - self.used)
+
+    def can_afford(self, units):
+        return self.used + units <= self.limit
+
+    def require(self, units):
+        if not self.can_afford(units):
+            raise QuotaExhausted(f"YouTube quota: need {units}, {self.remaining} left of {self.limit}")
+
+    def spend(self, units):
+        self.used += units
+        save_state(self.source, {"day": self.day, "used": self.used})
+
+def _timed_get(url, params):
+    start = time.perf_counter()
+    try:
+        r = cached_get(_session.get, url, params=params, timeout=15, fresh_for=CACHE_FRESH_SECONDS)
+    except requests.exceptions.RequestException:
+        metrics.observe_http("youtube", url, start, "error")
+        raise
+    if getattr(r, "from_cache", False):
+        metrics.observe_http("youtube", url, start, "cached")
+    else:
+        metrics.observe_http("youtube", url, start, r.status_code, len(r.content))
+    return r
+
+def search_video_page(query, region_code='US', page_token=None, max_results=50, budget=None):
+    """One search.list page. Returns (video_ids, next_page_token)."""
+    if budget is not None:
+        budget.require(SEARCH_COST)
+    params = {
+        "part": "snippet",
+        "q": query,
+        "type": "video",
+        "maxResults": max_results,
+        "regionCode": region_code,
+        "key": YOUTUBE_KEY
+    }
+    if page_token:
+        params["pageToken"] = page_token
+    r = _timed_get(SEARCH_URL, params)
+    r.raise_for_status()
+    if not getattr(r, "from_cache", False):
+        if budget is not None:
+            budget.spend(SEARCH_COST)
+        archive_payload("youtube", "youtube_search", r.content,
+                        {"query": query, "region": region_code, "page_token": page_token})
+    data = r.json()
+    items = data.get("items", [])
+    return [it["id"]["videoId"] for it in items if it.get("id", {}).get("videoId")], data.get("nextPageToken")
+
+def search_videos(query, region_code='US', max_results=25):
+    return search_video_page(query, region_code=region_code, max_results=max_results)[0]
+
+def fetch_video_stats(video_ids, budget=None, regions=None):
+    """
+    videos.list for any number of IDs, MAX_IDS_PER_CALL per request. With `regions`
+    ({video_id: [region, ...]}, how the caller will write the items) each response
+    fetched from the network is archived with that mapping for offline replay.
+    """
+    items = []
+    video_ids = list(video_ids)
+    for i in range(0, len(video_ids), MAX_IDS_PER_CALL):
+        if budget is not None:
+            budget.require(VIDEOS_COST)
+        params = {
+            "part": "statistics,snippet",
+            "id": ",".join(video_ids[i:i + MAX_IDS_PER_CALL]),
+            "key": YOUTUBE_KEY
+        }
+        r = _timed_get(VIDEO_URL, params)
+        r.raise_for_status()
+        if not getattr(r, "from_cache", False):
+            if budget is not None:
+                budget.spend(VIDEOS_COST)
+            if regions is not None:
+                chunk = video_ids[i:i + MAX_IDS_PER_CALL]
+                archive_payload("youtube", "youtube_videos", r.content,
+                                {"regions": {v: sorted(regions.get(v, ())) for v in chunk}})
+        items.extend(r.json().get("items", []))
+    return items
+
+def _video_fields(item, country):
+    vid = item.get("id")
+    stats = item.get("statistics", {})
+    snippet = item.get("snippet", {})
+    return dict(
+        platform='YouTube',
+        title=snippet.get("title", "Untitled"),
+        country=country,
+        evidence={"video_id": vid, "publishedAt": snippet.get("publishedAt")},
+        source_url=f"https://youtube.com/watch?v={vid}",
+        views=stats.get("viewCount", 0),
+        likes=stats.get("likeCount", 0),
+        comments=stats.get("commentCount", 0)
+    )
+
+def video_record(item, country='US'):
+    return make_record(**_video_fields(item, country))
+
+def video_records(items, regions):
+    """Records for one videos.list page: one per (video, region in regions[id]), titles normalized as a batch."""
+    return make_records(_video_fields(it, region) for it in items for region in regions.get(it.get("id"), ()))
+
+def upsert_video(item, country='US'):
+    try:
+        upsert_records([video_record(item, country)])
+        return True
+    except Exception as e:
+        print("Error upserting video:", e)
+        raise
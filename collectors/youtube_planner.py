@@ -0,0 +1,113 @@
+# collectors/youtube_planner.py
+import math
+import os
+from collectors.youtube_collector import (
+    search_video_page, fetch_video_stats, video_records, QuotaBudget, QuotaExhausted,
+    SEARCH_COST, VIDEOS_COST, MAX_IDS_PER_CALL, DAILY_QUOTA
+)
+from analytics.refresh_planner import plan_refresh, record_refresh
+
+# units kept back from the daily quota for ad-hoc calls / other jobs
+QUOTA_MARGIN = int(os.getenv("YOUTUBE_QUOTA_MARGIN", "500"))
+# max videos.list calls per run spent re-fetching known videos (50 IDs per call)
+REFRESH_CALLS = int(os.getenv("YOUTUBE_REFRESH_CALLS", "20"))
+
+def _stats_cost(n_ids):
+    return math.ceil(n_ids / MAX_IDS_PER_CALL) * VIDEOS_COST
+
+def discover(queries, regions, budget, max_pages=3, per_page=50):
+    """
+    Search every (query, region) pair, page by page with nextPageToken, and union
+    the results. Pages are taken breadth-first (page 0 of every pair before any
+    page 1) so a tight budget still covers every query. A search is only issued
+    if the budget can also pay for the stats of everything found so far plus
+    one more full page. Returns {video_id: set(regions)}.
+    """
+    found = {}
+    tokens = {(q, r): None for r in regions for q in queries}
+    for page in range(max_pages):
+        for (q, region), token in list(tokens.items()):
+            if page > 0 and not token:
+                continue
+            if not budget.can_afford(SEARCH_COST + _stats_cost(len(found) + per_page)):
+                print(f"[youtube plan] stopping search at page {page}: {budget.remaining} units left.")
+                return found
+            try:
+                ids, next_token = search_video_page(q, region_code=region, page_token=token,
+                                                    max_results=per_page, budget=budget)
+            except QuotaExhausted:
+                return found
+            except Exception as e:
+                print("YT search error:", q, region, e)
+                next_token = None
+                ids = []
+            for vid in ids:
+                found.setdefault(vid, set()).add(region)
+            tokens[(q, region)] = next_token
+        tokens = {k: t for k, t in tokens.items() if t}
+        if not tokens:
+            break
+    return found
+
+def refresh_known(writer, budget, max_calls=REFRESH_CALLS, exclude=()):
+    """
+    Spend leftover quota re-fetching stats for already-known videos, stalest and
+    fastest-growing first (see analytics.refresh_planner). Each target is written
+    back for every region it is stored under.
+    """
+    calls = min(max_calls, budget.remaining // VIDEOS_COST)
+    if calls <= 0:
+        return 0
+    targets = plan_refresh("YouTube", calls * MAX_IDS_PER_CALL, exclude=exclude)
+    by_id = {t["source_id"]: t for t in targets}
+    refreshed, start_used = [], budget.used
+    for i in range(0, len(targets), MAX_IDS_PER_CALL):
+        batch = [t["source_id"] for t in targets[i:i + MAX_IDS_PER_CALL]]
+        try:
+            items = fetch_video_stats(batch, budget=budget,
+                                      regions={sid: by_id[sid]["countries"] for sid in batch})
+        except QuotaExhausted as e:
+            print("[youtube refresh]", e)
+            break
+        except Exception as e:
+            print("YT refresh error:", e)
+            continue
+        refreshed += [by_id[it["id"]] for it in items if it.get("id") in by_id]
+        for r in video_records(items, {sid: t["countries"] for sid, t in by_id.items()}):
+            writer.add(r)
+    if targets:
+        record_refresh("YouTube", refreshed, (budget.used - start_used) // VIDEOS_COST)
+    return len(refreshed)
+
+def collect_youtube(queries, regions, writer, budget=None, max_pages=3, refresh_calls=REFRESH_CALLS):
+    """
+    Plan and run one quota-aware YouTube collection: dedup video IDs across
+    queries/regions, fetch statistics in full 50-ID batches once per video and
+    write one record per (video, region it was found in). Leftover quota (up to
+    `refresh_calls` videos.list calls) re-fetches the most stale known videos.
+    """
+    budget = budget or QuotaBudget(limit=DAILY_QUOTA - QUOTA_MARGIN)
+    start_used = budget.used
+    found = discover(queries, regions, budget, max_pages=max_pages)
+    ids = list(found)
+    fetched = 0
+    for i in range(0, len(ids), MAX_IDS_PER_CALL):
+        try:
+            items = fetch_video_stats(ids[i:i + MAX_IDS_PER_CALL], budget=budget, regions=found)
+        except QuotaExhausted as e:
+            print("[youtube plan]", e)
+            break
+        except Exception as e:
+            print("YT stats error:", e)
+            continue
+        fetched += len(items)
+        for r in video_records(items, found):
+            writer.add(r)
+    if refresh_calls:
+        try:
+            fetched += refresh_known(writer, budget, max_calls=refresh_calls, exclude=found)
+        except Exception as e:
+            print("YT refresh planning error:", e)
+    print(f"[youtube plan] {len(ids)} unique videos, {fetched} with stats, "
+          f"{budget.used - start_used} quota units used ({budget.remaining} left).")
+    return fetched
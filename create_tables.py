@@ -1,6 +1,6 @@
-# create_tables.py
-from db import engine, Base
-import api.models  # ensure model imported so metadata is registered
-
-Base.metadata.create_all(bind=engine)
-print("Tables created (if not existed).")
+# create_tables.py
+from db import engine, Base
+import api.models  # ensure model imported so metadata is registered
+
+Base.metadata.create_all(bind=engine)
+print("Tables created (if not existed).")
@@ -1,19 +1,38 @@
-# db.py
-import os
-from dotenv import load_dotenv
-load_dotenv()
-
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-
-DB_USER = os.getenv("DB_USER", "youruser")
-DB_PASS = os.getenv("DB_PASS", "yourpass")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "3306")
-DB_NAME = os.getenv("DB_NAME", "n8n_popularity")
-
-DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
-
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
-Base = declarative_base()
+# db.py
+import os
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+import metrics
+
+DB_USER = os.getenv("DB_USER", "youruser")
+DB_PASS = os.getenv("DB_PASS", "yourpass")
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = os.getenv("DB_PORT", "3306")
+DB_NAME = os.getenv("DB_NAME", "n8n_popularity")
+
+DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            metrics.DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, poolclass=TimedQueuePool)
+event.listen(engine, "checkout", lambda *a: metrics.DB_POOL_CHECKED_OUT.inc())
+event.listen(engine, "checkin", lambda *a: metrics.DB_POOL_CHECKED_OUT.dec())
+SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+Base = declarative_base()
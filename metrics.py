@@ -0,0 +1,94 @@
+# metrics.py
+import os
+import re
+import time
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+load_dotenv()  # PROMETHEUS_MULTIPROC_DIR must be set before prometheus_client is imported
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST,
+    generate_latest, start_http_server, multiprocess
+)
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# set to a shared, empty directory to aggregate forked workers / several collector processes
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+_FAST = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+_SLOW = (.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+HTTP_SECONDS = Histogram("collector_http_request_seconds",
+                         "Outbound request latency per attempt (to the response headers for streamed bodies)",
+                         ["source", "endpoint"], buckets=_SLOW)
+HTTP_RESPONSES = Counter("collector_http_responses_total",
+                         "Outbound responses by status ('cached' = served from the HTTP cache, 'error' = no response)",
+                         ["source", "endpoint", "status"])
+HTTP_RETRIES = Counter("collector_http_retries_total", "Attempts that were retried, by reason",
+                       ["source", "reason"])
+HTTP_BYTES = Counter("collector_http_bytes_total", "Response body bytes downloaded", ["source", "endpoint"])
+
+DB_UPSERT_SECONDS = Histogram("db_upsert_seconds", "Upsert batch latency including derived tables and retries",
+                              ["table"], buckets=_SLOW)
+DB_UPSERT_ROWS = Histogram("db_upsert_batch_rows", "Rows per upsert batch", ["table"],
+                           buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000))
+DB_WRITE_RETRIES = Counter("db_write_retries_total", "Batches retried after a deadlock / lock wait timeout", ["table"])
+DB_POOL_WAIT = Histogram("db_pool_wait_seconds",
+                         "Time to get a pooled connection (waiting for a free one or opening a new one)",
+                         buckets=_FAST)
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Checkouts that gave up waiting for a connection")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool",
+                            multiprocess_mode="livesum")
+
+API_SECONDS = Histogram("api_request_seconds", "API handler latency by filter and response-cache result",
+                        ["endpoint", "filter", "cache"], buckets=_FAST)
+
+# an all-digit path segment (before a "/", a ".json" suffix or the end)
+_ID = re.compile(r"(?<=/)\d+(?=[/.]|$)")
+
+def endpoint_of(url):
+    """Low-cardinality endpoint label: the URL path with ids folded, e.g. /t/{id}/posts.json."""
+    return _ID.sub("{id}", urlsplit(url).path) or url
+
+def observe_http(source, url, started, status, nbytes=0):
+    """
+    Record one request attempt started at perf_counter() `started`; url may be an
+    endpoint name. Cache-served responses are counted but not timed (a fresh entry
+    never reaches the network, so it would only drag the latency buckets down).
+    """
+    endpoint = endpoint_of(url)
+    if status != "cached":
+        HTTP_SECONDS.labels(source, endpoint).observe(time.perf_counter() - started)
+    HTTP_RESPONSES.labels(source, endpoint, str(status)).inc()
+    if nbytes:
+        HTTP_BYTES.labels(source, endpoint).inc(nbytes)
+
+def count_bytes(source, url, nbytes):
+    HTTP_BYTES.labels(source, endpoint_of(url)).inc(nbytes)
+
+def retried(source, reason):
+    HTTP_RETRIES.labels(source, str(reason)).inc()
+
+def _registry():
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+def exposition():
+    """(body, content type) of the Prometheus text format for every metric of this process (or all of them, multiprocess)."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+def serve_from_env():
+    """Collector scripts: expose /metrics on METRICS_PORT when it is set. Returns True if started."""
+    if not METRICS_PORT:
+        return False
+    start_http_server(METRICS_PORT, registry=_registry())
+    print(f"[metrics] serving on :{METRICS_PORT}/metrics")
+    return True
+
+def process_exited(pid):
+    """Multiprocess mode: drop a finished worker's live gauges."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
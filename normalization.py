@@ -0,0 +1,56 @@
+# normalization.py
+import hashlib
+import re
+import unicodedata
+from functools import lru_cache
+
+NORMALIZE_CACHE_SIZE = 65536
+
+def _mark_ranges(limit=0x20000):
+    """Character-class ranges of every combining mark (Mn/Mc/Me) in the BMP and SMP."""
+    ranges, start, prev = [], None, None
+    for cp in range(limit):
+        if unicodedata.category(chr(cp))[0] == "M":
+            if start is None:
+                start = cp
+            prev = cp
+        elif start is not None:
+            ranges.append(f"{re.escape(chr(start))}-{re.escape(chr(prev))}")
+            start = None
+    return "".join(ranges)
+
+# Anything that is not a letter, digit or combining mark, in any script, separates words.
+# \w alone would split Devanagari / Tamil / Thai words at their vowel signs.
+_SEPARATORS = re.compile(rf"(?:[^\w{_mark_ranges()}]|_)+")
+# the same for ASCII-only titles, without the (slow to scan) mark ranges
+_ASCII_SEPARATORS = re.compile(r"[\W_]+", re.ASCII)
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_name(title):
+    """
+    Matching form of a title: NFKC (full-width and compatibility forms fold to plain
+    ones), casefold, punctuation and symbols to single spaces. Letters of every script
+    are kept, so Hindi or Japanese titles get distinct keys instead of collapsing to "".
+    """
+    t = title or ""
+    if t.isascii():
+        # ASCII is already NFKC and casefold() == lower() on it
+        return _ASCII_SEPARATORS.sub(" ", t.lower()).strip()
+    t = unicodedata.normalize("NFKC", t).casefold()
+    # casefold can produce decomposed sequences (e.g. "ǰ"), recompose them
+    t = unicodedata.normalize("NFKC", t)
+    return _SEPARATORS.sub(" ", t).strip()
+
+def normalize_many(titles):
+    """normalize_name over a whole page of titles, each distinct title folded once."""
+    titles = list(titles)
+    folded = {t: normalize_name(t) for t in set(titles)}
+    return [folded[t] for t in titles]
+
+def name_key(platform, country, normalized_name):
+    """
+    Signed 64-bit hash of (platform, country, normalized_name): the fixed-width unique
+    key of a workflows row, so upserts probe a BIGINT index instead of a VARCHAR(512) one.
+    """
+    raw = "\x1f".join((platform, country, normalized_name)).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big", signed=True)
@@ -0,0 +1,88 @@
+# profiler.py
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_ENABLED = os.getenv("PROFILE", "0") == "1"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a daemon thread snapshots the stack of every other thread
+    each `interval` seconds and counts them as collapsed stacks ("a;b;c N", the input
+    of flamegraph.pl and speedscope). The profiled code is not traced, so the cost is
+    one stack walk per thread per sample whatever the code does.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL_MS / 1000.0, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def top(self, n=15):
+        """Functions by self samples (innermost frame): [(function, share of samples)]."""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [(fn, count / total) for fn, count in leaves.most_common(n)]
+
+    def write(self, path):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def profile_run(label, enabled=PROFILE_ENABLED):
+    """
+    Sample a collector run when PROFILE=1: the collapsed stacks go to
+    {PROFILE_DIR}/{label}-{timestamp}.folded and the hottest functions are printed.
+    """
+    if not enabled:
+        yield None
+        return
+    prof = SamplingProfiler().start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
+        path = os.path.join(PROFILE_DIR, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.folded")
+        prof.write(path)
+        print(f"[profile] {label}: {prof.samples} samples -> {path}")
+        for fn, share in prof.top(10):
+            print(f"[profile]   {share:6.1%}  {fn}")
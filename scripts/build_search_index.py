@@ -0,0 +1,6 @@
+# scripts/build_search_index.py — rebuild the /search index snapshot from MySQL
+# usage: python -m scripts.build_search_index   (the scheduler runs it daily; API processes swap the new snapshot in)
+from api.search import build_snapshot
+
+if __name__ == "__main__":
+    build_snapshot()
@@ -0,0 +1,9 @@
+# scripts/compact_history.py — downsample old metrics history into daily/weekly rollups
+# usage: python -m scripts.compact_history [raw_retention_days] [daily_retention_days]
+import sys
+
+from analytics.history import compact_history
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    compact_history(*args)
@@ -0,0 +1,6 @@
+# scripts/rebuild_rankings.py — rescore every workflow and re-base platform scales
+# usage: python -m scripts.rebuild_rankings
+from analytics.rankings import rebuild_rankings
+
+if __name__ == "__main__":
+    rebuild_rankings()
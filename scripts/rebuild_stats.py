@@ -0,0 +1,6 @@
+# scripts/rebuild_stats.py — recompute /stats totals and sketches from the workflows table
+# usage: python -m scripts.rebuild_stats   (with collectors stopped)
+from analytics.stats_rollups import rebuild_stats
+
+if __name__ == "__main__":
+    rebuild_stats()
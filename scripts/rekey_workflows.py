@@ -0,0 +1,11 @@
+# scripts/rekey_workflows.py — recompute normalized names and name_key for existing rows
+# usage: python -m scripts.rekey_workflows
+from collectors.bulk_upsert import rekey_workflows
+from analytics.rankings import rebuild_rankings
+from analytics.stats_rollups import rebuild_stats
+
+if __name__ == "__main__":
+    rekeyed, merged = rekey_workflows()
+    if merged:
+        rebuild_rankings()
+        rebuild_stats()
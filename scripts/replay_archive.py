@@ -0,0 +1,22 @@
+# scripts/replay_archive.py — re-derive workflow metrics from the raw payload archive, offline
+# usage: python -m scripts.replay_archive [forum] [youtube] [trends] [--since YYYY-MM-DD] [--until YYYY-MM-DD]
+#        [--processes N] [--merge replace|max]
+import sys
+
+from collectors.replay import replay
+
+def _option(args, name):
+    if name in args:
+        i = args.index(name)
+        value = args[i + 1]
+        del args[i:i + 2]
+        return value
+    return None
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    since, until = _option(args, "--since"), _option(args, "--until")
+    processes = _option(args, "--processes")
+    merge = _option(args, "--merge") or "replace"
+    replay(sources=args or None, since=since, until=until, processes=int(processes) if processes else None,
+           merge=merge)
@@ -0,0 +1,10 @@
+# scripts/resolve_entities.py — link Workflow rows across platforms
+# usage: python -m scripts.resolve_entities [--full]
+import sys
+
+from analytics.entity_resolution import resolve_entities
+
+if __name__ == "__main__":
+    full = "--full" in sys.argv[1:]
+    print("Resolving workflow entities", "(full rebuild)" if full else "(new rows only)")
+    resolve_entities(incremental=not full)
@@ -1,101 +1,147 @@
-import time
-import random
-
-from collectors.youtube_collector import search_videos, fetch_video_stats, upsert_video
-from collectors.discourse_collector import get_latest_topics, get_topic_details, upsert_topic
-from collectors.trends_collector import get_trend, upsert_trend
-
-# Queries to track across YouTube / Forum / Trends (you can add/remove)
-QUERIES = [
-    "n8n gmail", "n8n slack", "n8n google sheets", 
-    "n8n whatsapp", "n8n airtable",
-    "n8n tutorial", "n8n integration", "n8n automation"
-]
-
-# We disable trends because Google returns 429 errors during heavy scraping
-RUN_TRENDS = False
-
-
-# -----------------------------------------------------------
-# YOUTUBE COLLECTOR
-# -----------------------------------------------------------
-def run_youtube():
-    print("\n--- Running YouTube Collector ---")
-    for geo in ["US", "IN"]:
-        for q in QUERIES:
-            try:
-                print(f"Searching YouTube for '{q}' in {geo}...")
-                vids = search_videos(q, region_code=geo, max_results=10)
-                if not vids:
-                    print(" - No videos found.")
-                    continue
-
-                items = fetch_video_stats(vids)
-                for it in items:
-                    upsert_video(it, country=geo)
-                    time.sleep(0.5)
-            except Exception as e:
-                print("YT error:", q, geo, e)
-                time.sleep(1)
-
-
-# -----------------------------------------------------------
-# FORUM COLLECTOR
-# -----------------------------------------------------------
-def run_forum():
-    print("\n--- Running Forum Collector ---")
-    try:
-        topics = get_latest_topics()
-        print(f"Found {len(topics)} topics.")
-    except Exception as e:
-        print("Forum fetch error (latest):", e)
-        return
-
-    for t in topics[:80]:
-        tid = t.get("id")
-        if not tid:
-            continue
-        try:
-            print(f"Fetching topic {tid}...")
-            td = get_topic_details(tid)
-            upsert_topic(td, country="global")
-            time.sleep(0.8 + random.random())
-        except Exception as ex:
-            print(f"Forum topic error for ID {tid}:", ex)
-            time.sleep(2)
-            continue
-
-
-# -----------------------------------------------------------
-# TRENDS COLLECTOR
-# -----------------------------------------------------------
-def run_trends():
-    print("\n--- Running Trends Collector ---")
-    for q in QUERIES:
-        for geo in ["US", "IN"]:
-            try:
-                print(f"Fetching Google Trends for '{q}' [{geo}]...")
-                tr = get_trend(q, geo=geo)
-                if tr:
-                    upsert_trend(q, tr, country=geo)
-                time.sleep(3 + random.random()*2)
-            except Exception as e:
-                print("Trends error:", q, geo, e)
-                time.sleep(5)
-
-
-# -----------------------------------------------------------
-# MAIN EXECUTION
-# -----------------------------------------------------------
-if __name__ == "__main__":
-    print("Starting collectors...\n")
-
-    run_youtube()
-    run_forum()
-
-    if RUN_TRENDS:
-        run_trends()
-    else:
-        print("\nSkipping Trends Collector (RUN_TRENDS = False).")
-
-    print("\nCollectors finished.")
+import os
+import time
+import random
+
+from collectors.youtube_planner import collect_youtube
+from collectors.discourse_collector import iter_latest_topics, topic_metrics_record
+from collectors.discourse_stream import get_topic_metrics
+from collectors.discourse_async import run_collect_topics
+from collectors.forum_sync import plan_incremental, mark_synced
+from collectors.trends_collector import build_pytrends_session, get_trends_batched, trend_record, store_trend_series
+from collectors.bulk_upsert import BulkWriter
+from analytics.refresh_planner import plan_refresh, record_refresh
+from analytics.entity_resolution import resolve_entities
+from profiler import profile_run
+import metrics
+
+# Queries to track across YouTube / Forum / Trends (you can add/remove)
+QUERIES = [
+    "n8n gmail", "n8n slack", "n8n google sheets", 
+    "n8n whatsapp", "n8n airtable",
+    "n8n tutorial", "n8n integration", "n8n automation"
+]
+
+# Trends are fetched 4 queries + anchor per request over one session (about 5x fewer
+# requests than one query per payload), which keeps us under Google's 429 threshold
+RUN_TRENDS = os.getenv("RUN_TRENDS", "1") != "0"
+
+# YouTube: search pages per (query, region); quota is tracked across runs per day
+YOUTUBE_MAX_PAGES = 3
+
+# Forum: fetch topic details concurrently (rate-limited by DISCOURSE_RPS)
+FORUM_ASYNC = True
+# Forum: page latest.json back to the last run's watermark and only fetch changed topics
+FORUM_INCREMENTAL = True
+FORUM_MAX_PAGES = 50
+# cap used by the non-incremental (page 0 only) mode
+FORUM_MAX_TOPICS = 80
+# Forum: extra known topics re-fetched per run, stalest / fastest-growing first
+FORUM_REFRESH_BUDGET = 40
+
+
+# -----------------------------------------------------------
+# YOUTUBE COLLECTOR
+# -----------------------------------------------------------
+def run_youtube():
+    print("\n--- Running YouTube Collector ---")
+    with BulkWriter(label="youtube") as writer:
+        collect_youtube(QUERIES, ["US", "IN"], writer, max_pages=YOUTUBE_MAX_PAGES)
+
+
+# -----------------------------------------------------------
+# FORUM COLLECTOR
+# -----------------------------------------------------------
+def run_forum():
+    print("\n--- Running Forum Collector ---")
+    try:
+        if FORUM_INCREMENTAL:
+            topic_ids, listed = plan_incremental(max_pages=FORUM_MAX_PAGES)
+        else:
+            topics = list(iter_latest_topics(max_pages=1))
+            print(f"Found {len(topics)} topics.")
+            topic_ids = [t.get("id") for t in topics[:FORUM_MAX_TOPICS] if t.get("id")]
+    except Exception as e:
+        print("Forum fetch error (latest):", e)
+        return
+
+    refresh = []
+    if FORUM_REFRESH_BUDGET:
+        try:
+            refresh = plan_refresh("Forum", FORUM_REFRESH_BUDGET, exclude=topic_ids)
+        except Exception as e:
+            print("Forum refresh planning error:", e)
+    topic_ids = topic_ids + [int(t["source_id"]) for t in refresh]
+
+    try:
+        with BulkWriter(label="forum") as writer:
+            if FORUM_ASYNC:
+                ok, failed = run_collect_topics(topic_ids, lambda m: writer.add(topic_metrics_record(m, country="global")))
+                print(f"Forum: {ok} topics fetched, {len(failed)} failed.")
+            else:
+                failed = []
+                for tid in topic_ids:
+                    try:
+                        print(f"Fetching topic {tid}...")
+                        writer.add(topic_metrics_record(get_topic_metrics(tid), country="global"))
+                    except Exception as ex:
+                        print(f"Forum topic error for ID {tid}:", ex)
+                        failed.append(tid)
+    except Exception as e:
+        # the final flush failed: topics counted as fetched may not be written, so nothing is marked synced
+        print("Forum write error:", e)
+        return
+
+    # only advance fingerprints/watermark once the writer has flushed; a failed mid-run
+    # flush puts its records back in the buffer, so they are in the final flush
+    if FORUM_INCREMENTAL:
+        failed_set = set(failed)
+        mark_synced(listed, [tid for tid in topic_ids if tid not in failed_set], failed_ids=failed)
+    if refresh:
+        failed_set = set(failed)
+        record_refresh("Forum", [t for t in refresh if int(t["source_id"]) not in failed_set], len(refresh))
+
+
+# -----------------------------------------------------------
+# TRENDS COLLECTOR
+# -----------------------------------------------------------
+def run_trends():
+    print("\n--- Running Trends Collector ---")
+    pytrends = build_pytrends_session()
+    with BulkWriter(label="trends") as writer:
+        for geo in ["US", "IN"]:
+            try:
+                print(f"Fetching Google Trends for {len(QUERIES)} queries [{geo}]...")
+                trends = get_trends_batched(QUERIES, geo=geo, pytrends=pytrends)
+                for q, tr in trends.items():
+                    writer.add(trend_record(q, tr, country=geo))
+                store_trend_series(trends.values())
+                time.sleep(3 + random.random()*2)
+            except Exception as e:
+                print("Trends error:", geo, e)
+                time.sleep(5)
+
+
+# -----------------------------------------------------------
+# MAIN EXECUTION
+# -----------------------------------------------------------
+if __name__ == "__main__":
+    print("Starting collectors...\n")
+    metrics.serve_from_env()
+
+    with profile_run("youtube"):
+        run_youtube()
+    with profile_run("forum"):
+        run_forum()
+
+    if RUN_TRENDS:
+        with profile_run("trends"):
+            run_trends()
+    else:
+        print("\nSkipping Trends Collector (RUN_TRENDS = False).")
+
+    try:
+        resolve_entities(incremental=True)
+    except Exception as e:
+        print("Entity resolution error:", e)
+
+    print("\nCollectors finished.")
@@ -0,0 +1,107 @@
+# scripts/scheduler.py — long-running collector scheduler
+# usage: python -m scripts.scheduler
+#
+# Each source runs on its own interval in its own worker thread, so YouTube, forum
+# and trends network waits overlap instead of queueing behind each other.
+import os
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+from db import engine
+from collectors.sync_state import load_state, save_state
+from analytics.entity_resolution import resolve_entities
+from analytics.history import compact_history
+from api.search import build_snapshot
+from scripts.run_all_collectors import run_youtube, run_forum, run_trends, RUN_TRENDS
+
+def _minutes(name, default):
+    return int(os.getenv(f"SCHEDULE_{name.upper()}_MINUTES", str(default))) * 60
+
+# source -> (job, interval in seconds)
+JOBS = {
+    "youtube": (run_youtube, _minutes("youtube", 360)),
+    "forum": (run_forum, _minutes("forum", 15)),
+    "entities": (lambda: resolve_entities(incremental=True), _minutes("entities", 30)),
+    "history": (compact_history, _minutes("history", 24 * 60)),
+    # re-sorted /search snapshot; API processes sharing SEARCH_SNAPSHOT_PATH swap it in
+    "search_index": (build_snapshot, _minutes("search_index", 24 * 60)),
+}
+if RUN_TRENDS:
+    JOBS["trends"] = (run_trends, _minutes("trends", 12 * 60))
+
+# +/- share of the interval added to every next run, so sources drift apart
+JITTER = float(os.getenv("SCHEDULE_JITTER", "0.1"))
+
+def _state_key(name):
+    return f"scheduler:{name}"
+
+def run_job(name, fn):
+    """
+    Run one source under a MySQL named lock so a second scheduler (or a manual run
+    using the same lock) never overlaps it, and persist start/end/outcome.
+    """
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT GET_LOCK(:n, 0)"), {"n": f"collector:{name}"}).scalar():
+            print(f"[scheduler] {name}: already running elsewhere, skipping.")
+            return False
+        state = load_state(_state_key(name))
+        state["last_start"] = time.time()
+        save_state(_state_key(name), state)
+        ok = False
+        try:
+            print(f"[scheduler] {name}: starting.")
+            fn()
+            ok = True
+        except Exception as e:
+            print(f"[scheduler] {name} failed:", repr(e))
+        finally:
+            state["last_end"] = time.time()
+            state["last_ok"] = ok
+            save_state(_state_key(name), state)
+            conn.execute(text("SELECT RELEASE_LOCK(:n)"), {"n": f"collector:{name}"})
+            print(f"[scheduler] {name}: finished in {state['last_end'] - state['last_start']:.1f}s (ok={ok}).")
+    return ok
+
+def _next_after(start, interval):
+    return start + interval * (1 + random.uniform(-JITTER, JITTER))
+
+def main():
+    stop = threading.Event()
+
+    def _shutdown(signum, frame):
+        print(f"\n[scheduler] signal {signum}: finishing running collectors, then exiting.")
+        stop.set()
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+
+    now = time.time()
+    next_run = {}
+    for name, (_, interval) in JOBS.items():
+        last = load_state(_state_key(name)).get("last_start")
+        # resume the previous schedule after a restart instead of running everything at once
+        next_run[name] = _next_after(last, interval) if last else now
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=len(JOBS), thread_name_prefix="collector") as pool:
+        while not stop.is_set():
+            now = time.time()
+            for name, (fn, interval) in JOBS.items():
+                fut = running.get(name)
+                if fut is not None and not fut.done():
+                    continue
+                if now >= next_run[name]:
+                    running[name] = pool.submit(run_job, name, fn)
+                    next_run[name] = _next_after(now, interval)
+            wait = min(next_run.values()) - time.time()
+            stop.wait(timeout=min(max(wait, 1.0), 30.0))
+        print("[scheduler] waiting for running collectors...")
+    print("[scheduler] stopped.")
+
+if __name__ == "__main__":
+    main()
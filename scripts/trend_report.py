@@ -0,0 +1,18 @@
+# scripts/trend_report.py — trend analytics for every stored Google Trends series
+# usage: python -m scripts.trend_report [geo]
+import sys
+import time
+
+from analytics.trend_analytics import TrendMatrix
+
+if __name__ == "__main__":
+    geo = sys.argv[1] if len(sys.argv) > 1 else None
+    start = time.perf_counter()
+    matrix = TrendMatrix.load(geo=geo)
+    summaries = matrix.summaries()
+    elapsed = (time.perf_counter() - start) * 1000
+    for (query, g), m in sorted(summaries.items(), key=lambda kv: -kv[1]["change_pct"]):
+        flag = " ANOMALY" if m["anomaly"] else ""
+        print(f"{g:>3} {query[:40]:<40} avg={m['avg_recent']:7.2f} change={m['change_pct']:8.2f}% "
+              f"slope={m['slope']:+.3f} z={m['zscore']:+.2f}{flag}")
+    print(f"{len(summaries)} series analysed in {elapsed:.1f} ms")
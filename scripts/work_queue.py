@@ -0,0 +1,65 @@
+# scripts/work_queue.py — shared fetch queue for running collectors on several processes / hosts
+# usage: python -m scripts.work_queue enqueue [forum] [youtube] [trends]
+#        python -m scripts.work_queue work [--processes N] [--forever] [forum_topic youtube_videos trends]
+#        python -m scripts.work_queue stats | retry-failed [kind] | purge [days]
+#
+# `enqueue` plans one run (forum watermark, YouTube search, trends batches) and queues
+# the fetches; `work` claims tasks with leases, so any number of workers on any number
+# of hosts can drain the same queue without fetching a task twice.
+import sys
+from multiprocessing import Process
+
+from collectors.work_queue import run_worker, queue_stats, retry_failed, purge_done
+from collectors.queue_tasks import HANDLERS, enqueue_forum, enqueue_youtube, enqueue_trends
+from profiler import profile_run
+import metrics
+from scripts.run_all_collectors import (
+    QUERIES, RUN_TRENDS, YOUTUBE_MAX_PAGES, FORUM_MAX_PAGES, FORUM_REFRESH_BUDGET
+)
+
+def _work(kinds, forever):
+    with profile_run("worker"):
+        run_worker({k: HANDLERS[k] for k in kinds}, idle_exit=not forever)
+
+def _option(args, name, default):
+    if name in args:
+        i = args.index(name)
+        value = args[i + 1]
+        del args[i:i + 2]
+        return value
+    return default
+
+def main(args):
+    cmd = args.pop(0) if args else "stats"
+    if cmd == "enqueue":
+        sources = args or ["forum", "youtube"] + (["trends"] if RUN_TRENDS else [])
+        if "forum" in sources:
+            print("forum tasks queued:", enqueue_forum(max_pages=FORUM_MAX_PAGES, refresh_budget=FORUM_REFRESH_BUDGET))
+        if "youtube" in sources:
+            print("youtube tasks queued:", enqueue_youtube(QUERIES, ["US", "IN"], max_pages=YOUTUBE_MAX_PAGES))
+        if "trends" in sources:
+            print("trends tasks queued:", enqueue_trends(QUERIES, ["US", "IN"]))
+    elif cmd == "work":
+        processes = int(_option(args, "--processes", "1"))
+        forever = "--forever" in args
+        kinds = [a for a in args if a != "--forever"] or list(HANDLERS)
+        metrics.serve_from_env()
+        if processes == 1:
+            _work(kinds, forever)
+        else:
+            procs = [Process(target=_work, args=(kinds, forever)) for _ in range(processes)]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+                metrics.process_exited(p.pid)
+    elif cmd == "retry-failed":
+        print("tasks reopened:", retry_failed(args[0] if args else None))
+    elif cmd == "purge":
+        print("done tasks purged:", purge_done(*[int(a) for a in args[:1]]))
+    else:
+        for kind, counts in sorted(queue_stats().items()):
+            print(f"{kind:16} " + "  ".join(f"{s}={n}" for s, n in sorted(counts.items())))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,18 @@
+# tests/conftest.py
+import os
+import pytest
+from sqlalchemy import create_engine
+from db import Base
+import api.models  # noqa: F401 (registers the tables)
+
+# tests that need InnoDB locking (SKIP LOCKED, concurrent upserts) run against a real MySQL 8 (see README)
+MYSQL_URL = os.getenv("TEST_MYSQL_URL")
+
+@pytest.fixture
+def mysql_engine():
+    if not MYSQL_URL:
+        pytest.skip("TEST_MYSQL_URL is not set")
+    engine = create_engine(MYSQL_URL, pool_pre_ping=True, pool_size=10)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
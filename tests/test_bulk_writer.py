@@ -0,0 +1,46 @@
+# tests/test_bulk_writer.py
+import pytest
+from collectors import bulk_upsert
+from collectors.bulk_upsert import BulkWriter
+
+@pytest.fixture
+def upserts(monkeypatch):
+    """Record upsert_records batches; set `fail` to make the next call raise."""
+    calls = {"batches": [], "fail": False}
+
+    def fake(records, history_snapshots=True, merge="max"):
+        if calls["fail"]:
+            calls["fail"] = False
+            raise RuntimeError("lock wait timeout")
+        calls["batches"].append([r["name_key"] for r in records])
+        return len(records)
+
+    monkeypatch.setattr(bulk_upsert, "upsert_records", fake)
+    return calls
+
+def test_failed_flush_keeps_the_batch(upserts):
+    w = BulkWriter(batch_size=2)
+    w.add({"name_key": 1})
+    upserts["fail"] = True
+    with pytest.raises(RuntimeError):
+        w.add({"name_key": 2})
+    w.add({"name_key": 3})
+    assert upserts["batches"] == [[1, 2, 3]]
+    assert w.rows == 3 and w.flush() == 0
+
+def test_discard_drops_the_buffer(upserts):
+    w = BulkWriter(batch_size=10)
+    w.add({"name_key": 1})
+    upserts["fail"] = True
+    with pytest.raises(RuntimeError):
+        w.flush()
+    assert w.discard() == 1
+    assert w.flush() == 0 and upserts["batches"] == []
+
+def test_replace_merge_reaches_the_upsert(upserts, monkeypatch):
+    seen = []
+    monkeypatch.setattr(bulk_upsert, "upsert_records", lambda records, history_snapshots=True, merge="max":
+                        seen.append(merge) or len(records))
+    with BulkWriter(label="replay", merge="replace") as w:
+        w.add({"name_key": 1})
+    assert seen == ["replace"]
@@ -0,0 +1,24 @@
+# tests/test_http_cache.py
+import os
+from collectors.http_cache import HttpCache
+
+def _total(cache):
+    return cache._conn().execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+def test_store_never_leaves_the_file_over_budget(tmp_path):
+    cache = HttpCache(path=str(tmp_path / "c.sqlite"), max_bytes=50_000)
+    for i in range(40):
+        # random bytes do not compress: each entry is ~4 KB on disk
+        cache.store(f"k{i}", "u", {"ETag": f'"{i}"'}, os.urandom(4096))
+        assert _total(cache) <= 50_000
+    assert cache.lookup("k39") is not None and cache.lookup("k0") is None
+
+def test_opening_an_oversized_file_evicts(tmp_path):
+    path = str(tmp_path / "c.sqlite")
+    big = HttpCache(path=path, max_bytes=10 ** 9)
+    for i in range(20):
+        big.store(f"k{i}", "u", {}, os.urandom(4096))
+    assert _total(big) > 40_000
+    small = HttpCache(path=path, max_bytes=20_000)
+    assert small.lookup("k19") is not None
+    assert _total(small) <= 20_000
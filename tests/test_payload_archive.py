@@ -0,0 +1,14 @@
+# tests/test_payload_archive.py
+from collectors.payload_archive import ArchiveWriter, iter_segment, list_segments
+
+def test_corrupt_record_is_skipped_and_counted(tmp_path):
+    w = ArchiveWriter(root=str(tmp_path))
+    w.write("forum", "forum_latest", b'{"page": 0}', {"page": 0})
+    # bodies are spliced in unchanged, so a non-JSON body makes its line undecodable
+    w.write("forum", "forum_latest", b"<html>502 Bad Gateway</html>", {"page": 1})
+    w.write("forum", "forum_latest", b'{"page": 2}', {"page": 2})
+    w.close()
+    [path] = list_segments(root=str(tmp_path))
+    errors = {}
+    assert [e["meta"]["page"] for e in iter_segment(path, errors)] == [0, 2]
+    assert errors == {"corrupt": 1}
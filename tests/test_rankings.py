@@ -0,0 +1,26 @@
+# tests/test_rankings.py
+from sqlalchemy import select
+from api.models import WorkflowRanking
+from analytics import rankings
+from collectors import bulk_upsert
+from collectors.bulk_upsert import make_record, upsert_records
+
+def _scores(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(select(WorkflowRanking.workflow_name, WorkflowRanking.score)).all())
+
+def test_a_new_platform_maximum_rescores_earlier_rows(mysql_engine, monkeypatch):
+    with mysql_engine.begin() as conn:
+        for table in ("workflows", "workflow_rankings", "platform_score_stats", "workflow_snapshots",
+                      "workflow_rollups", "stats_rollups", "stats_totals", "stats_sketches", "data_versions"):
+            conn.exec_driver_sql(f"DELETE FROM {table}")
+    monkeypatch.setattr(bulk_upsert, "engine", mysql_engine)
+    monkeypatch.setattr(rankings, "engine", mysql_engine)
+    upsert_records([make_record("Forum", "gmail to slack", "global", {}, views=100, comments=3)])
+    upsert_records([make_record("Forum", "notion backup", "global", {}, views=100_000, comments=40)])
+    incremental = _scores(mysql_engine)
+    rankings.rebuild_rankings()
+    rebuilt = _scores(mysql_engine)
+    assert incremental.keys() == rebuilt.keys() == {"gmail to slack", "notion backup"}
+    for name, score in rebuilt.items():
+        assert abs(incremental[name] - score) < 1e-9
@@ -0,0 +1,25 @@
+# tests/test_rate_limiter.py
+import pytest
+from collectors import rate_limiter
+from collectors.rate_limiter import TokenBucket
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    return now
+
+def test_waiters_queued_during_a_pause_leave_it_spaced_out(clock):
+    bucket = TokenBucket(rate=2, capacity=1)
+    assert bucket._reserve() == 0.0
+    bucket.penalize(10)
+    waits = [bucket._reserve() for _ in range(4)]
+    assert waits == pytest.approx([10.5, 11.0, 11.5, 12.0])
+
+def test_no_tokens_refill_during_the_pause(clock):
+    bucket = TokenBucket(rate=2, capacity=4)
+    for _ in range(4):
+        assert bucket._reserve() == 0.0
+    bucket.penalize(10)
+    clock[0] += 10
+    assert bucket._reserve() == pytest.approx(0.5)
@@ -0,0 +1,33 @@
+# tests/test_replay.py
+import json
+from collectors.payload_archive import ArchiveWriter, list_segments
+from collectors.replay import extract_segment, _forum_records
+
+TOPIC = {"id": 7, "title": "Gmail to Slack", "slug": "gmail-to-slack", "views": 50, "posts_count": 2,
+         "post_stream": {"posts": [{"id": 11, "like_count": 1}], "stream": [11, 12]}}
+POSTS = {"post_stream": {"posts": [{"id": 12, "like_count": 4}]}}
+
+def _likes(tmp_path, records):
+    w = ArchiveWriter(root=str(tmp_path))
+    for ts, kind, body, meta in records:
+        w.write("forum", kind, json.dumps(body), meta, ts=ts)
+    w.close()
+    [path] = list_segments(root=str(tmp_path))
+    _, parts, _ = extract_segment(path)
+    return sorted(r["likes"] for _, r in _forum_records(parts))
+
+def test_a_304_part_replays_from_the_body_it_refers_to(tmp_path):
+    stale = {"topic": {}, "likes": 2, "posts": 1, "posters": 0, "ref": ["a", 1]}
+    assert _likes(tmp_path, [
+        (1.0, "forum_topic", TOPIC, {"fetch": "a", "topic_id": 7, "parts": 1}),
+        (1.0, "forum_posts", POSTS, {"fetch": "a", "topic_id": 7, "part": 1}),
+        (2.0, "forum_topic", TOPIC, {"fetch": "b", "topic_id": 7, "parts": 1}),
+        (2.0, "forum_posts_cached", stale, {"fetch": "b", "topic_id": 7, "part": 1}),
+    ]) == [5, 5]
+
+def test_a_304_part_without_its_body_uses_the_cached_counters(tmp_path):
+    cached = {"topic": {}, "likes": 4, "posts": 1, "posters": 0, "ref": ["older", 1]}
+    assert _likes(tmp_path, [
+        (2.0, "forum_topic", TOPIC, {"fetch": "b", "topic_id": 7, "parts": 1}),
+        (2.0, "forum_posts_cached", cached, {"fetch": "b", "topic_id": 7, "part": 1}),
+    ]) == [5]
@@ -0,0 +1,83 @@
+# tests/test_search.py
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+import pytest
+from api import search
+from api.search import SearchIndex
+
+Row = namedtuple("Row", "id normalized_name workflow_name platform country views source_url score updated_at")
+WORDS = ["gmail", "slack", "sync", "sheets", "notion", "webhook", "telegram", "backup"]
+TARGET_ID = 10 ** 6
+
+@pytest.fixture(scope="module")
+def index():
+    """60k popular rows made of the same few words (every gram is common), plus one unpopular Forum row."""
+    rnd = random.Random(1)
+    rows = []
+    while len(rows) < 60000:
+        words = rnd.sample(WORDS, rnd.randint(2, 4))
+        if {"gmail", "slack", "sync"} <= set(words):
+            continue
+        name = " ".join(words)
+        rows.append(Row(len(rows) + 1, name, name, rnd.choice(["YouTube", "Google"]), "US", 1000, None,
+                        0.2 + 0.8 * rnd.random(), None))
+    rows.append(Row(TARGET_ID, "gmail slack sync", "Gmail Slack Sync", "Forum", "US", 0, None, 0.0, None))
+    return SearchIndex.from_rows(rows)
+
+def _ids(index, hits):
+    return [int(index.ids.data[pos]) for pos, _, _ in hits]
+
+# the default budget reads the shortest lists in full; 0 forces every gram through the common-list walk
+@pytest.fixture(params=[search.SCAN_POSTINGS, 0], ids=["scan", "walk"])
+def scan_postings(request, monkeypatch):
+    monkeypatch.setattr(search, "SCAN_POSTINGS", request.param)
+
+def test_filter_applies_before_the_candidate_cut(index, scan_postings):
+    assert _ids(index, index.search("gmail slack sync", platform="Forum")) == [TARGET_ID]
+    assert index.search("gmail slack sync", platform="Forum", country="IN") == []
+
+def test_unpopular_exact_title_is_a_candidate(index, scan_postings, monkeypatch):
+    # popularity out of the rank: only recall decides whether the row comes back
+    monkeypatch.setattr(search, "POPULARITY_WEIGHT", 0.0)
+    hits = index.search("gmail slack sync", limit=3)
+    assert _ids(index, hits)[0] == TARGET_ID
+    assert hits[0][1] == 100.0
+
+@pytest.fixture
+def db(monkeypatch):
+    """The workflows / rankings tables in in-memory SQLite, wired into api.search."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+    from api.models import Workflow, WorkflowRanking
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Workflow.__table__.create(engine)
+    WorkflowRanking.__table__.create(engine)
+    monkeypatch.setattr(search, "engine", engine)
+    return engine, Workflow.__table__, WorkflowRanking.__table__
+
+def test_refresh_applies_rescoring_and_prune_drops_deleted_rows(db):
+    engine, workflows, rankings = db
+    t0 = datetime(2026, 1, 1)
+    names = ["gmail slack sync", "notion backup", "telegram webhook"]
+    with engine.begin() as conn:
+        conn.execute(workflows.insert(), [
+            dict(id=i, workflow_name=n, normalized_name=n, name_key=i, platform="Forum", country="US",
+                 evidence={}, views=10, updated_at=t0) for i, n in enumerate(names, start=1)])
+        conn.execute(rankings.insert(), [
+            dict(workflow_id=i, platform="Forum", country="US", workflow_name=n, score=0.1, updated_at=t0)
+            for i, n in enumerate(names, start=1)])
+    index = SearchIndex.build()
+    assert index.rank_watermark == t0
+
+    # rebuild_rankings rescores without touching workflows.updated_at; rekey_workflows deletes a merged row
+    with engine.begin() as conn:
+        conn.execute(rankings.update().where(rankings.c.workflow_id == 2)
+                     .values(score=0.9, updated_at=t0 + timedelta(hours=1)))
+        conn.execute(workflows.delete().where(workflows.c.id == 3))
+        conn.execute(rankings.delete().where(rankings.c.workflow_id == 3))
+    index.refresh()
+    assert index.scores.data[index.position(2)] == pytest.approx(0.9)
+    assert index.prune() == 1
+    assert index.search("telegram webhook") == []
+    assert _ids(index, index.search("notion")) == [2]
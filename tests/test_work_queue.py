@@ -0,0 +1,96 @@
+# tests/test_work_queue.py
+import threading
+import time
+import pytest
+from sqlalchemy import select
+from api.models import FetchTask
+from collectors import bulk_upsert
+from collectors import work_queue as wq
+
+@pytest.fixture
+def queue(mysql_engine, monkeypatch):
+    with mysql_engine.begin() as conn:
+        conn.execute(FetchTask.__table__.delete())
+    monkeypatch.setattr(wq, "engine", mysql_engine)
+    return mysql_engine
+
+def _status(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(select(FetchTask.task_key, FetchTask.status)).all())
+
+def test_claim_then_complete(queue):
+    wq.enqueue("t", [("a", {"n": 1}), ("b", {"n": 2})])
+    tasks = wq.claim("t", "w1", limit=10)
+    assert sorted(t["key"] for t in tasks) == ["a", "b"]
+    assert wq.claim("t", "w2") == []
+    ids = [t["id"] for t in tasks]
+    assert wq.complete("w2", ids) == 0
+    assert wq.complete("w1", ids) == 2
+    assert _status(queue) == {"a": "done", "b": "done"}
+
+def test_claim_skips_rows_locked_by_another_transaction(queue):
+    wq.enqueue("t", [("a", None), ("b", None)])
+    with queue.connect() as conn:
+        a = conn.execute(select(FetchTask.id).where(FetchTask.task_key == "a")).scalar_one()
+    with queue.connect() as other:
+        tx = other.begin()
+        other.execute(select(FetchTask.id).where(FetchTask.id == a).with_for_update())
+        start = time.monotonic()
+        tasks = wq.claim("t", "w1", limit=10)
+        assert time.monotonic() - start < 1
+        assert [t["key"] for t in tasks] == ["b"]
+        tx.rollback()
+    assert [t["key"] for t in wq.claim("t", "w2", limit=10)] == ["a"]
+
+def test_concurrent_workers_never_share_a_task(queue):
+    keys = [str(i) for i in range(60)]
+    wq.enqueue("t", [(k, None) for k in keys])
+    got = []
+
+    def worker(owner):
+        while True:
+            tasks = wq.claim("t", owner, limit=3)
+            if not tasks:
+                return
+            got.extend(t["key"] for t in tasks)
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(got) == sorted(keys)
+
+def test_expired_lease_moves_to_another_worker(queue):
+    wq.enqueue("t", [("a", None)])
+    [task] = wq.claim("t", "w1", lease_seconds=1)
+    time.sleep(2.1)
+    [again] = wq.claim("t", "w2")
+    assert again["id"] == task["id"] and again["attempts"] == 2
+    assert wq.complete("w1", [task["id"]]) == 0
+    assert wq.complete("w2", [task["id"]]) == 1
+
+def test_expired_lease_without_attempts_left_fails(queue):
+    wq.enqueue("t", [("a", None)], max_attempts=1)
+    wq.claim("t", "w1", lease_seconds=1)
+    time.sleep(2.1)
+    assert wq.claim("t", "w2") == []
+    assert _status(queue) == {"a": "failed"}
+
+def test_keep_leased_renews_while_the_handler_runs(queue):
+    wq.enqueue("t", [("a", None)])
+    [task] = wq.claim("t", "w1", lease_seconds=2)
+    with wq.keep_leased("w1", [task["id"]], lease_seconds=2):
+        time.sleep(3.5)
+        assert wq.claim("t", "w2") == []
+    assert wq.complete("w1", [task["id"]]) == 1
+
+def test_failed_write_hands_the_batch_back(queue, monkeypatch):
+    def down(records, history_snapshots=True, merge="max"):
+        raise RuntimeError("mysql down")
+
+    monkeypatch.setattr(bulk_upsert, "upsert_records", down)
+    wq.enqueue("t", [("a", None)])
+    done, failed = wq.run_worker({"t": lambda payload, writer: writer.add({"name_key": 1})})
+    assert (done, failed) == (0, 1)
+    assert _status(queue) == {"a": "pending"}
@@ -0,0 +1,38 @@
+# tests/test_workflows_api.py
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from api import main
+from api.models import Workflow
+
+@pytest.fixture
+def client(monkeypatch):
+    """/workflows over in-memory SQLite: views tie across pages, so the cursor has to break ties on id."""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Workflow.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(Workflow.__table__.insert(), [
+            dict(id=i, workflow_name=f"w{i}", normalized_name=f"w{i}", name_key=i, platform="Forum",
+                 country="US", evidence={}, views=(0 if i % 3 else 100)) for i in range(1, 12)])
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(main, "current_data_version", lambda: 0)
+    monkeypatch.setattr(main, "_workflows_cache", main.ResponseCache(max_entries=0, ttl=0))
+    return TestClient(main.app)
+
+def test_cursor_pages_through_ties_once(client):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/workflows", params=params).json()
+        seen += [d["workflow"] for d in body["data"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(f"w{i}" for i in range(1, 12))
+    assert len(seen) == len(set(seen))
+    assert seen[:3] == ["w9", "w6", "w3"]
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": 501}, {"offset": -1}])
+def test_limit_and_offset_are_bounded(client, params):
+    assert client.get("/workflows", params=params).status_code == 422